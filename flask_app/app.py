@@ -1,17 +1,145 @@
+import time
+
+# Desde acá se mide cuánto tarda en importarse la app (ver STARTUP_TIMINGS)
+_import_started = time.perf_counter()
+
 import os
+import io
+import re
+import csv
 import json
+import gzip
+import mimetypes
+import bisect
+import copy
+import sqlite3
+import hashlib
+import heapq
+import itertools
+import threading
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
+from urllib.parse import urlsplit
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, make_response
-from functools import wraps
-from dotenv import load_dotenv
-import requests
+import click
+from flask import Flask, abort, g, render_template, request, jsonify, redirect, url_for, send_file, make_response, stream_with_context
+from functools import partial
+from jinja2 import meta as jinja2_meta
+from werkzeug.http import unquote_etag
+from werkzeug.security import safe_join
 
-# Load environment variables from .env if present
-load_dotenv()
+from metrics import (
+    CallbackMetric,
+    http_request_duration,
+    metrics,
+    observe_upstream,
+    upstream_status,
+    upstream_timer,
+)
+from json_store import (
+    CONFIG_RECHECK_SECONDS,
+    OPTIMISTIC_WRITE_RETRIES,
+    WriteConflict,
+    bytes_etag,
+    commit_json_file,
+    content_etag,
+    dump_json_bytes,
+    ensure_parent_dir,
+    etag_matches,
+    file_lock,
+    file_stat_key,
+    load_json_file,
+    stat_etag,
+)
+from collection_store import (
+    CollectionQuery,
+    CollectionSchema,
+    Field,
+    JsonCollectionBackend,
+    SqliteCollectionBackend,
+    decode_cursor,
+    dump_collection_bytes,
+    encode_cursor,
+    item_etag,
+    text_tokens,
+)
+
+# requests (herramientas) y openai/httpx (chat y sesiones) se importan en el
+# primer uso o en el warm-up (ver "Arranque"), no al importar la app. dotenv
+# solo si el .env usa algo que parse_env_file no lee.
+STARTUP_TIMINGS = {"imports_ms": round((time.perf_counter() - _import_started) * 1000, 1)}
 
 BASE_DIR = Path(__file__).parent
-DATA_DIR = BASE_DIR / "data"
+
+
+def find_env_file():
+    """El .env más cercano subiendo desde flask_app (como find_dotenv), o None"""
+    for directory in (BASE_DIR, *BASE_DIR.parents):
+        candidate = directory / ".env"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+# KEY=valor, opcionalmente con "export " delante (el subconjunto de .env que se lee sin dotenv)
+_ENV_LINE = re.compile(r"\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_.]*)\s*=\s*(.*?)\s*")
+
+
+def parse_env_file(path):
+    """
+    {clave: valor} de un .env simple: comentarios, KEY=valor, valores entre
+    comillas simples o dobles y comentarios al final de un valor sin comillas.
+    Devuelve None si el archivo usa algo más (interpolación ${VAR}, valores
+    multilínea, escapes), y entonces lo lee python-dotenv.
+    """
+    values = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stripped = line.strip()
+            if not stripped or stripped.startswith("#"):
+                continue
+            match = _ENV_LINE.fullmatch(line.rstrip("\r\n"))
+            if match is None:
+                return None
+            key, raw = match.groups()
+            if "${" in raw:
+                return None
+            if raw[:1] in ("'", '"'):
+                end = raw.find(raw[0], 1)
+                rest = raw[end + 1:].strip() if end != -1 else ""
+                if end == -1 or "\\" in raw[:end] or (rest and not rest.startswith("#")):
+                    return None
+                values[key] = raw[1:end]
+            else:
+                values[key] = re.sub(r"\s+#.*", "", raw).rstrip()
+    return values
+
+
+def load_env_file(path, override=False):
+    """Carga el .env en os.environ; python-dotenv se importa solo si el archivo no es simple"""
+    values = parse_env_file(path)
+    if values is None:
+        from dotenv import load_dotenv
+
+        load_dotenv(path, override=override)
+        return
+    for key, value in values.items():
+        if override or key not in os.environ:
+            os.environ[key] = value
+
+
+# Load environment variables from .env if present
+DOTENV_PATH = find_env_file()
+if DOTENV_PATH is not None:
+    load_env_file(DOTENV_PATH)
+DOTENV_PATH = str(DOTENV_PATH or BASE_DIR / ".env")
+
+# FLASK_DATA_DIR permite apuntar a otro directorio (p. ej. datos temporales de bench/run.py)
+DATA_DIR = Path(os.getenv("FLASK_DATA_DIR", str(BASE_DIR / "data")))
+# Bases SQLite y demás archivos privados: fuera de DATA_DIR, que se publica en /data/
+INSTANCE_DIR = Path(os.getenv("FLASK_INSTANCE_DIR", str(BASE_DIR / "instance")))
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 SETTINGS_PATH = DATA_DIR / "settings.json"
@@ -21,15 +149,50 @@ GASTOS_PATH = DATA_DIR / "gastos.json"
 
 app = Flask(__name__, template_folder=str(TEMPLATES_DIR), static_folder=str(STATIC_DIR))
 
+# ============================================================================
+# Métricas por request (registro y primitivas en metrics.py, ver GET /metrics)
+# ============================================================================
+
+def route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+def observe_request(response):
+    """Registra la duración al cerrar la respuesta, así cuenta también el streaming"""
+    started = g.get("request_started")
+    if started is None:
+        return
+    labels = (request.method, route_label(), response.status_code)
+    response.call_on_close(
+        lambda: http_request_duration.observe(time.perf_counter() - started, *labels)
+    )
+
+
+# Headers CORS para embeber el widget en otros sitios (asgi.py manda los mismos)
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type, Authorization',
+    'Access-Control-Expose-Headers': 'X-Total-Count, ETag',
+}
+
+
 # Custom CORS decorator to allow cross-origin widget embedding
 def add_cors_headers(response):
-    response.headers['Access-Control-Allow-Origin'] = '*'
-    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
-    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
+    response.headers.update(CORS_HEADERS)
     return response
 
 @app.after_request
 def after_request(response):
+    # 304 antes de comprimir: una respuesta vacía no se comprime
+    response = compress_response(conditional_response(response))
+    observe_request(response)
     return add_cors_headers(response)
 
 @app.route('/api/<path:path>', methods=['OPTIONS'])
@@ -47,88 +210,195 @@ DEFAULT_SETTINGS = {
     "voice": "verse",
 }
 
+# Módulos de la SPA que se pueden cargar/abrir
+ALLOWED_MODULES = ['system', 'tools', 'demo', 'tablas']
+
+
+_dirs_ready = False
+
 
 def ensure_dirs():
+    # Solo la primera llamada toca el disco; las siguientes son un no-op
+    global _dirs_ready
+    if _dirs_ready:
+        return
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
     (STATIC_DIR / "css").mkdir(parents=True, exist_ok=True)
     (STATIC_DIR / "js").mkdir(parents=True, exist_ok=True)
+    _dirs_ready = True
+
+
+# ============================================================================
+# Config store: caché en memoria de settings.json y tools.json
+# (escrituras atómicas y CONFIG_RECHECK_SECONDS en json_store.py)
+# ============================================================================
+
+_ConfigSnapshot = namedtuple("_ConfigSnapshot", "data version stat_key checked_at")
+
+
+class ConfigStore:
+    """
+    Mantiene en memoria el contenido parseado de un archivo JSON.
+
+    Los lectores obtienen un snapshot compartido (no deben mutarlo) sin tomar
+    ningún lock: el snapshot se reemplaza de forma atómica por asignación.
+    Los escritores publican el snapshot nuevo con el lock del archivo tomado.
+    El snapshot se invalida cuando cambian el mtime, el tamaño o el inode del
+    archivo.
+    """
+
+    def __init__(self, path, default_factory):
+        self.path = path
+        self._default_factory = default_factory
+        self._snapshot = None
+        self._versions = itertools.count(1)
+        # Lecturas servidas desde memoria / que tuvieron que releer el archivo
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        """Versión del snapshot actual; cambia en cada recarga o escritura"""
+        return self.snapshot_info().version
+
+    @property
+    def etag(self):
+        """ETag del archivo en disco (el mismo en todos los workers)"""
+        return stat_etag(self.snapshot_info().stat_key)
+
+    def _publish(self, data, stat_key):
+        snap = _ConfigSnapshot(data, next(self._versions), stat_key, time.monotonic())
+        self._snapshot = snap
+        return snap
+
+    def snapshot_info(self, fresh=False):
+        """Snapshot actual; fresh=True ignora CONFIG_RECHECK_SECONDS y mira el disco ya"""
+        snap = self._snapshot
+        now = time.monotonic()
+        if not fresh and snap is not None and now - snap.checked_at < CONFIG_RECHECK_SECONDS:
+            self.hits += 1
+            return snap
+        stat_key = file_stat_key(self.path)
+        if snap is not None and stat_key is not None and stat_key == snap.stat_key:
+            # Sin cambios: solo renovar la marca de verificación
+            snap = snap._replace(checked_at=now)
+            self._snapshot = snap
+            self.hits += 1
+            return snap
+        self.misses += 1
+        return self._reload()
+
+    def snapshot(self):
+        """Devuelve los datos actuales (compartidos, de solo lectura)"""
+        return self.snapshot_info().data
+
+    def read(self):
+        """Devuelve una copia mutable de los datos actuales"""
+        return copy.deepcopy(self.snapshot())
+
+    def _reload(self):
+        # Un archivo dañado se recupera de la copia .bak en lugar de vaciarse
+        data, stat_key = load_json_file(self.path, self._default_factory)
+        return self._publish(data, stat_key)
+
+    def _commit(self, data, expected=False):
+        payload = dump_json_bytes(data)
+        published = []
+        commit_json_file(
+            self.path, payload, expected,
+            on_commit=lambda stat_key: published.append(self._publish(data, stat_key)),
+        )
+        return published[0]
+
+    def _checked_snapshot(self, if_match):
+        snap = self.snapshot_info(fresh=True)
+        if not etag_matches(if_match, stat_etag(snap.stat_key)):
+            raise WriteConflict(f"{self.path.name} fue modificado por otra persona")
+        return snap
+
+    def write(self, data, if_match=None):
+        """Reemplaza el contenido; con if_match solo si el ETag sigue coincidiendo"""
+        # Copia propia para que el llamador pueda seguir mutando su dict
+        data = copy.deepcopy(data)
+        if if_match is None:
+            return self._commit(data)
+        return self._commit(data, self._checked_snapshot(if_match).stat_key)
+
+    def update(self, mutate, if_match=None):
+        """
+        Lee-modifica-escribe sin pisar cambios de otros procesos: aplica
+        mutate(data) sobre una copia de lo que hay en disco y solo guarda si
+        el archivo no cambió entretanto; si cambió, vuelve a empezar (el
+        último intento, con el lock del archivo tomado). Con if_match falla
+        con WriteConflict en cuanto el ETag deja de coincidir. Devuelve lo que
+        devuelva mutate.
+        """
+        for attempt in range(OPTIMISTIC_WRITE_RETRIES + 1):
+            last = attempt == OPTIMISTIC_WRITE_RETRIES
+            with file_lock(self.path) if last else nullcontext():
+                snap = self._checked_snapshot(if_match)
+                data = copy.deepcopy(snap.data)
+                result = mutate(data)
+                try:
+                    self._commit(data, snap.stat_key)
+                except WriteConflict:
+                    if last:
+                        raise
+                    continue
+                return result
+
+
+settings_store = ConfigStore(SETTINGS_PATH, lambda: dict(DEFAULT_SETTINGS))
+tools_store = ConfigStore(TOOLS_PATH, lambda: {"tools": []})
 
 
 def read_settings():
-    ensure_dirs()
-    if not SETTINGS_PATH.exists():
-        write_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
-    try:
-        with open(SETTINGS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        # If the file is corrupted, reset to defaults
-        write_settings(DEFAULT_SETTINGS)
-        return DEFAULT_SETTINGS
+    return settings_store.read()
 
 
-def write_settings(settings: dict):
-    ensure_dirs()
-    with open(SETTINGS_PATH, "w", encoding="utf-8") as f:
-        json.dump(settings, f, ensure_ascii=False, indent=2)
+def write_settings(settings: dict, if_match=None):
+    settings_store.write(settings, if_match)
+    realtime_session_pool.flush()
 
 
 def read_tools():
-    ensure_dirs()
-    if not TOOLS_PATH.exists():
-        default_tools = {"tools": []}
-        write_tools(default_tools)
-        return default_tools
-    try:
-        with open(TOOLS_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        default_tools = {"tools": []}
-        write_tools(default_tools)
-        return default_tools
+    return tools_store.read()
 
 
 def write_tools(tools_data: dict):
-    ensure_dirs()
-    with open(TOOLS_PATH, "w", encoding="utf-8") as f:
-        json.dump(tools_data, f, ensure_ascii=False, indent=2)
+    tools_store.write(tools_data)
+    rebuild_tool_registry()
+    realtime_session_pool.flush()
+
+
+def update_tools(mutate, if_match=None):
+    """Aplica mutate(tools_data) de forma segura entre workers; ver ConfigStore.update"""
+    result = tools_store.update(mutate, if_match)
+    rebuild_tool_registry()
+    realtime_session_pool.flush()
+    return result
+
+
+def precondition_failed(error):
+    return jsonify({"error": str(error)}), 412
 
 
 def read_collection(filepath):
     """Lee una colección JSON (personas o gastos)"""
-    ensure_dirs()
-    if not filepath.exists():
-        default_data = {"items": []}
-        write_collection(filepath, default_data)
-        return default_data
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        default_data = {"items": []}
-        write_collection(filepath, default_data)
-        return default_data
+    return load_json_file(filepath, lambda: {"items": []})[0]
 
 
 def write_collection(filepath, data: dict):
-    """Escribe una colección JSON"""
-    ensure_dirs()
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-
-def gen_id():
-    """Genera un ID único corto"""
-    import uuid
-    return str(uuid.uuid4())[:8]
+    """Escribe una colección JSON (de forma atómica)"""
+    commit_json_file(filepath, dump_collection_bytes(data.get("items", [])))
 
 
 @app.route("/")
 def index():
-    # Redirigir a la SPA
-    return render_template("spa.html")
+    # SPA (pre-renderizada por host, ver render_page)
+    server_url = request.host_url.rstrip("/")
+    return rendered_page_response(render_page("spa.html", server_url=server_url))
 
 
 @app.get("/system")
@@ -154,17 +424,28 @@ def system_post():
         "realtime_model": (form.get("realtime_model", DEFAULT_SETTINGS["realtime_model"]).strip() or DEFAULT_SETTINGS["realtime_model"]),
         "voice": (form.get("voice", DEFAULT_SETTINGS["voice"]).strip() or DEFAULT_SETTINGS["voice"]),
     }
-    write_settings(settings)
+    try:
+        write_settings(settings, settings_if_match(request.headers.get("If-Match")))
+    except WriteConflict as e:
+        return precondition_failed(e)
     return redirect(url_for("system_get"))
 
 
-def replace_date_placeholders(text):
+DATE_PLACEHOLDERS = ("{{FECHA_HOY}}", "{{now}}")
+
+_fecha_cache = (None, "")
+
+
+def fecha_actual_texto():
     """
-    Reemplaza marcadores de fecha con la fecha y hora actual en español
-    Soporta tanto {{FECHA_HOY}} como {{now}}
+    Fecha y hora actual en español, p. ej. "Lunes, 3 de noviembre del 2025 02:25 PM".
+    Tiene resolución de minutos, así que se calcula una sola vez por minuto.
     """
-    # Obtener fecha actual
+    global _fecha_cache
     now = datetime.now()
+    minute = (now.year, now.month, now.day, now.hour, now.minute)
+    if _fecha_cache[0] == minute:
+        return _fecha_cache[1]
     
     # Nombres de días y meses en español
     dias = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
@@ -181,22 +462,34 @@ def replace_date_placeholders(text):
     hora_formateada = now.strftime("%I:%M %p")
     
     fecha_formateada = f"{dia_semana}, {dia} de {mes} del {año} {hora_formateada}"
+    _fecha_cache = (minute, fecha_formateada)
+    return fecha_formateada
+
+
+def replace_date_placeholders(text):
+    """
+    Reemplaza marcadores de fecha con la fecha y hora actual en español
+    Soporta tanto {{FECHA_HOY}} como {{now}}
+    """
+    if not any(marker in text for marker in DATE_PLACEHOLDERS):
+        return text
+    fecha_formateada = fecha_actual_texto()
     
     # Reemplazar ambos marcadores
-    text = text.replace("{{FECHA_HOY}}", fecha_formateada)
-    text = text.replace("{{now}}", fecha_formateada)
+    for marker in DATE_PLACEHOLDERS:
+        text = text.replace(marker, fecha_formateada)
     
     return text
 
 
 @app.get("/chatbot")
 def chatbot():
-    return render_template("chatbot.html")
+    return rendered_page_response(render_page("chatbot.html"))
 
 
 @app.get("/ui")
 def ui():
-    return render_template("ui.html")
+    return rendered_page_response(render_page("ui.html"))
 
 @app.get("/modules/<module_name>")
 def get_module(module_name):
@@ -204,13 +497,22 @@ def get_module(module_name):
     Devuelve el HTML parcial de un módulo para la SPA
     """
     # Lista blanca de módulos permitidos
-    allowed_modules = ['system', 'tools', 'demo', 'tablas']
-    
-    if module_name not in allowed_modules:
+    if module_name not in ALLOWED_MODULES:
         return jsonify({"error": "Module not found"}), 404
     
     try:
-        return render_template(f"modules/{module_name}.html")
+        return rendered_page_response(render_module(module_name))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.get("/modules")
+def get_module_bundle():
+    """
+    Todos los módulos de la SPA en una sola respuesta, para precargarlos
+    """
+    try:
+        return rendered_page_response(render_module_bundle())
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -224,17 +526,30 @@ def demo():
 def demo_all_in_one():
     # Demo page for the all-in-one widget
     server_url = request.host_url.rstrip("/")
-    return render_template("demo-all-in-one.html", server_url=server_url)
+    return rendered_page_response(render_page("demo-all-in-one.html", server_url=server_url))
+
+
+def public_data_files():
+    """
+    Archivos que /data/ publica: settings.json, tools.json y el .json de cada
+    colección. Lo demás de DATA_DIR (bases, locks, .bak, .corrupt-*) no sale.
+    """
+    names = {SETTINGS_PATH.name, TOOLS_PATH.name}
+    names.update(schema.path.name for schema in COLLECTIONS.values() if schema.path.parent == DATA_DIR)
+    return names
 
 
 @app.route('/data/<path:filename>')
 def serve_data_file(filename):
-    return send_from_directory(DATA_DIR, filename)
+    if filename not in public_data_files():
+        abort(404)
+    # Revalida siempre (no-cache) contra el ETag de la versión en disco
+    return send_cached_file(DATA_DIR, filename)
 
 
 @app.get("/tools")
 def tools_get():
-    tools_data = read_tools()
+    tools_data = tools_store.snapshot()
     return render_template(
         "tools.html", 
         tools=tools_data.get("tools", []),
@@ -244,17 +559,19 @@ def tools_get():
 
 @app.get("/tools/get/<tool_id>")
 def tools_get_one(tool_id):
-    tools_data = read_tools()
+    tools_data = tools_store.snapshot()
     tool = next((t for t in tools_data.get("tools", []) if t.get("id") == tool_id), None)
     if tool:
-        return jsonify(tool)
+        response = jsonify(tool)
+        # Para editar con If-Match sin pisar cambios hechos desde otra pestaña
+        response.headers["ETag"] = content_etag(tool)
+        return response
     return jsonify({"error": "Tool not found"}), 404
 
 
 @app.post("/tools/add")
 def tools_add():
     form = request.form
-    tools_data = read_tools()
     
     # Generate unique ID
     import uuid
@@ -285,8 +602,10 @@ def tools_add():
         "parameters": parameters
     }
     
-    tools_data["tools"].append(new_tool)
-    write_tools(tools_data)
+    try:
+        update_tools(lambda tools_data: tools_data["tools"].append(new_tool))
+    except WriteConflict as e:
+        return precondition_failed(e)
     
     return redirect(url_for("tools_get"))
 
@@ -298,20 +617,24 @@ def tools_edit(tool_id):
         if not updated_tool_data:
             return jsonify({"error": "Invalid JSON"}), 400
 
-        tools_data = read_tools()
+        if_match = request.headers.get("If-Match")
         
-        # Find and update the tool
-        tool_found = False
-        for i, tool in enumerate(tools_data.get("tools", [])):
-            if tool.get("id") == tool_id:
-                tools_data["tools"][i] = updated_tool_data
-                tool_found = True
-                break
+        def replace_tool(tools_data):
+            # Find and update the tool
+            for i, tool in enumerate(tools_data.get("tools", [])):
+                if tool.get("id") == tool_id:
+                    if not etag_matches(if_match, content_etag(tool)):
+                        raise WriteConflict("La herramienta fue modificada por otra persona")
+                    tools_data["tools"][i] = updated_tool_data
+                    return
+            raise LookupError(tool_id)
         
-        if not tool_found:
+        try:
+            update_tools(replace_tool)
+        except LookupError:
             return jsonify({"error": "Tool not found"}), 404
-            
-        write_tools(tools_data)
+        except WriteConflict as e:
+            return precondition_failed(e)
         return jsonify({"success": True, "message": "Tool updated successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -319,22 +642,28 @@ def tools_edit(tool_id):
 
 @app.post("/tools/delete/<tool_id>")
 def tools_delete(tool_id):
-    tools_data = read_tools()
-    tools_data["tools"] = [t for t in tools_data["tools"] if t["id"] != tool_id]
-    write_tools(tools_data)
+    def remove_tool(tools_data):
+        tools_data["tools"] = [t for t in tools_data["tools"] if t["id"] != tool_id]
+    
+    try:
+        update_tools(remove_tool)
+    except WriteConflict as e:
+        return precondition_failed(e)
     return redirect(url_for("tools_get"))
 
 
 @app.post("/tools/toggle/<tool_id>")
 def tools_toggle(tool_id):
-    tools_data = read_tools()
-    
-    for tool in tools_data["tools"]:
-        if tool["id"] == tool_id:
-            tool["enabled"] = not tool.get("enabled", False)
-            break
+    def toggle_tool(tools_data):
+        for tool in tools_data["tools"]:
+            if tool["id"] == tool_id:
+                tool["enabled"] = not tool.get("enabled", False)
+                break
     
-    write_tools(tools_data)
+    try:
+        update_tools(toggle_tool)
+    except WriteConflict as e:
+        return precondition_failed(e)
     return redirect(url_for("tools_get"))
 
 
@@ -344,18 +673,21 @@ def tools_edit_system(tool_id):
     Edita una herramienta del sistema (solo nombre y descripción)
     """
     form = request.form
-    tools_data = read_tools()
     
-    # Buscar y actualizar la herramienta del sistema
-    system_tools = tools_data.get("system_tools", [])
-    for tool in system_tools:
-        if tool["id"] == tool_id:
-            # Solo permitir editar nombre y descripción
-            tool["name"] = form.get("name", tool["name"]).strip()
-            tool["description"] = form.get("description", tool["description"]).strip()
-            break
+    def edit_system_tool(tools_data):
+        # Buscar y actualizar la herramienta del sistema
+        system_tools = tools_data.get("system_tools", [])
+        for tool in system_tools:
+            if tool["id"] == tool_id:
+                # Solo permitir editar nombre y descripción
+                tool["name"] = form.get("name", tool["name"]).strip()
+                tool["description"] = form.get("description", tool["description"]).strip()
+                break
     
-    write_tools(tools_data)
+    try:
+        update_tools(edit_system_tool)
+    except WriteConflict as e:
+        return precondition_failed(e)
     return redirect(url_for("tools_get"))
 
 
@@ -379,7 +711,6 @@ def parse_curl_command(curl_command):
     """
     Parsea un comando cURL y extrae URL, método, headers y body
     """
-    import re
     import shlex
     
     # Limpiar el comando
@@ -470,435 +801,2588 @@ def parse_curl_command(curl_command):
     }
 
 
-@app.post("/api/execute_tool")
-def api_execute_tool():
+# ============================================================================
+# Caché de respuestas de herramientas idempotentes
+# ============================================================================
+
+TOOL_CACHE_DEFAULT_TTL = float(os.getenv("TOOL_CACHE_DEFAULT_TTL", "60"))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1000"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+def tool_cache_ttl(endpoint):
     """
-    Ejecuta una herramienta configurada
-    Body JSON:
-    {
-      "tool_name": "nombreHerramienta",
-      "arguments": {"param1": "value1", ...}
-    }
+    TTL en segundos declarado en endpoint["cache"], o None si la herramienta
+    no usa caché. Acepta true, un número o {"ttl": segundos}.
     """
-    try:
-        data = request.get_json(silent=True) or {}
-        tool_name = data.get("tool_name")
-        arguments = data.get("arguments", {})
-        
-        if not tool_name:
-            return jsonify({"error": "tool_name is required"}), 400
-        
-        # Buscar la herramienta (primero en system_tools, luego en tools)
-        tools_data = read_tools()
-        tool = None
-        is_system_tool = False
-        
-        # Buscar en herramientas del sistema
-        for t in tools_data.get("system_tools", []):
-            if t["name"] == tool_name and t.get("enabled", False):
-                tool = t
-                is_system_tool = True
-                break
-        
-        # Si no se encontró, buscar en herramientas personalizadas
-        if not tool:
-            for t in tools_data.get("tools", []):
-                if t["name"] == tool_name and t.get("enabled", False):
-                    tool = t
-                    break
-        
-        if not tool:
-            return jsonify({"error": f"Tool '{tool_name}' not found or disabled"}), 404
-        
-        # Manejar herramientas del sistema
-        if is_system_tool:
-            tool_type = tool.get("type")
-            
-            if tool_type == "disconnect":
-                # La desconexión se maneja en el cliente
-                return jsonify({
-                    "success": True,
-                    "system_action": "disconnect",
-                    "result": {"message": "Desconectando llamada..."}
-                })
-            
-            elif tool_type == "open_url":
-                url = arguments.get("url", "").strip()
-                if not url:
-                    return jsonify({"error": "URL is required"}), 400
-                
-                # Validar que la URL tenga protocolo
-                if not url.startswith(("http://", "https://")):
-                    url = "https://" + url
-                
-                # La apertura de URL se maneja en el cliente
-                return jsonify({
-                    "success": True,
-                    "system_action": "open_url",
-                    "url": url,
-                    "result": {"message": f"Abriendo {url}..."}
-                })
-            
-            elif tool_type == "open_module":
-                module = arguments.get("module", "").strip().lower()
-                allowed_modules = ['system', 'tools', 'demo', 'tablas']
-                
-                if not module:
-                    return jsonify({"error": "module is required"}), 400
-                
-                if module not in allowed_modules:
-                    return jsonify({"error": f"Module '{module}' not found. Available: {', '.join(allowed_modules)}"}), 400
-                
-                # La navegación interna se maneja en el cliente
-                return jsonify({
-                    "success": True,
-                    "system_action": "open_module",
-                    "module": module,
-                    "result": {"message": f"Abriendo módulo {module}..."}
-                })
-            
-            else:
-                return jsonify({"error": f"Unknown system tool type: {tool_type}"}), 400
-        
-        # Ejecutar herramienta personalizada
-        endpoint = tool.get("endpoint", {})
-        url = endpoint.get("url")
-        method = endpoint.get("method", "GET").upper()
-        headers = endpoint.get("headers", {})
-        
-        # Preparar la request
-        if method == "GET":
-            # Para GET, los argumentos van en query params
-            response = requests.get(url, params=arguments, headers=headers, timeout=30)
-        elif method == "POST":
-            # Para POST, los argumentos van en el body
-            response = requests.post(url, json=arguments, headers=headers, timeout=30)
-        elif method == "PUT":
-            response = requests.put(url, json=arguments, headers=headers, timeout=30)
-        elif method == "DELETE":
-            response = requests.delete(url, params=arguments, headers=headers, timeout=30)
-        else:
-            return jsonify({"error": f"Unsupported method: {method}"}), 400
-        
-        # Devolver la respuesta
-        try:
-            result = response.json()
-        except:
-            result = {"text": response.text}
-        
-        return jsonify({
-            "success": True,
-            "status_code": response.status_code,
-            "result": result
-        })
-        
-    except requests.RequestException as e:
-        return jsonify({
-            "success": False,
-            "error": f"Request failed: {str(e)}"
-        }), 500
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+    cache = endpoint.get("cache")
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return TOOL_CACHE_DEFAULT_TTL
+    if isinstance(cache, dict):
+        cache = cache.get("ttl", TOOL_CACHE_DEFAULT_TTL)
+    ttl = float(cache)
+    if ttl <= 0:
+        raise ValueError("cache.ttl debe ser positivo")
+    return ttl
 
 
-@app.get("/api/settings")
-def api_settings():
-    settings = read_settings()
-    # Reemplazar marcadores de fecha en el system_prompt
-    settings["system_prompt"] = replace_date_placeholders(settings["system_prompt"])
-    return jsonify(settings)
+def tool_cache_key(compiled, arguments):
+    """
+    (nombre, revisión, argumentos): la revisión cambia al editar la
+    herramienta, así una respuesta de la configuración anterior no se sirve.
+    """
+    canonical = json.dumps(arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return (compiled.name, compiled.revision, canonical)
 
 
-@app.get("/api/tools")
-def api_tools():
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class ToolResponseCache:
     """
-    Devuelve las herramientas activas en el formato esperado por OpenAI Realtime API
+    LRU acotado por número de entradas y bytes, con TTL por entrada.
+    Las misses concurrentes de una misma clave se unen a la request que ya
+    está en vuelo (single-flight) en lugar de repetir la llamada al backend.
+    invalidate() y clear() suben `generation`: una carga que empezó antes no
+    se guarda al terminar.
     """
-    tools_data = read_tools()
-    active_tools = [
-        {
-            "type": "function",
-            "name": tool["name"],
-            "description": tool["description"],
-            "parameters": tool["parameters"]
-        }
-        for tool in tools_data.get("tools", [])
-        if tool.get("enabled", False)
-    ]
-    return jsonify({"tools": active_tools})
 
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (expires_at, payload, size)
+        self._keys_by_tool = {}
+        self._inflight = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
 
-# ============================================================================
-# API CRUD: Personas
-# ============================================================================
+    def lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+            self.misses += 1
+            return None
 
-@app.get("/api/personas")
-def api_personas_list():
-    """Lista todas las personas"""
-    data = read_collection(PERSONAS_PATH)
-    return jsonify(data)
+    def store(self, key, payload, ttl, generation=None):
+        """
+        Guarda solo respuestas exitosas (2xx) del backend. Con generation (la
+        leída al empezar la carga) descarta la respuesta si hubo una
+        invalidación entretanto.
+        """
+        if not (200 <= payload.get("status_code", 0) < 300):
+            return
+        size = len(json.dumps(payload, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, payload, size)
+            self._keys_by_tool.setdefault(key[0], set()).add(key)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
 
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        keys = self._keys_by_tool.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_tool[key[0]]
 
-@app.post("/api/personas")
-def api_personas_create():
-    """Crea una nueva persona"""
-    try:
-        body = request.get_json() or {}
-        nombre = body.get("nombre", "").strip()
-        apellido = body.get("apellido", "").strip()
-        telefono = body.get("telefono", "").strip()
-        
-        if not nombre or not apellido or not telefono:
-            return jsonify({"error": "nombre, apellido y telefono son requeridos"}), 400
-        
-        data = read_collection(PERSONAS_PATH)
-        new_item = {
-            "id": gen_id(),
-            "nombre": nombre,
-            "apellido": apellido,
-            "telefono": telefono
+    def get_or_load(self, key, ttl, loader):
+        """Devuelve el payload cacheado o llama a loader() una sola vez por clave"""
+        payload = self.lookup(key)
+        if payload is not None:
+            return payload
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+                generation = self.generation
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.result is not None:
+                return flight.result
+            # La request líder falló: intentar por cuenta propia
+            return loader()
+        try:
+            flight.result = loader()
+            self.store(key, flight.result, ttl, generation)
+            return flight.result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def note_coalesced(self):
+        """Cuenta una miss unida a una carga en vuelo (single-flight del modo ASGI)"""
+        with self._lock:
+            self.coalesced += 1
+
+    def invalidate(self, tool_name):
+        with self._lock:
+            self.generation += 1
+            for key in list(self._keys_by_tool.get(tool_name, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._keys_by_tool.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
         }
-        data["items"].append(new_item)
-        write_collection(PERSONAS_PATH, data)
-        
-        return jsonify({"created": new_item}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/personas/<item_id>", methods=["PUT"])
-@app.route("/api/personas", methods=["PUT"])
-def api_personas_update(item_id=None):
-    """Actualiza una persona existente"""
-    try:
-        body = request.get_json() or {}
-        # Obtener ID desde URL o desde body
-        if not item_id:
-            item_id = body.get("id")
-        
-        if not item_id:
-            return jsonify({"error": "ID es requerido"}), 400
-        
-        data = read_collection(PERSONAS_PATH)
-        
-        item = next((p for p in data["items"] if p["id"] == item_id), None)
-        if not item:
-            return jsonify({"error": "Persona no encontrada"}), 404
-        
-        # Actualizar campos si se proporcionan
-        if "nombre" in body:
-            item["nombre"] = body["nombre"].strip()
-        if "apellido" in body:
-            item["apellido"] = body["apellido"].strip()
-        if "telefono" in body:
-            item["telefono"] = body["telefono"].strip()
-        
-        write_collection(PERSONAS_PATH, data)
-        return jsonify({"updated": item})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+tool_response_cache = ToolResponseCache(TOOL_CACHE_MAX_ENTRIES, TOOL_CACHE_MAX_BYTES)
 
 
-@app.route("/api/personas/<item_id>", methods=["DELETE"])
-@app.route("/api/personas", methods=["DELETE"])
-def api_personas_delete(item_id=None):
-    """Elimina una persona"""
-    try:
-        # Obtener ID desde URL o desde query params o body
-        if not item_id:
-            item_id = request.args.get("id") or (request.get_json() or {}).get("id")
-        
-        if not item_id:
-            return jsonify({"error": "ID es requerido"}), 400
-        
-        data = read_collection(PERSONAS_PATH)
-        original_count = len(data["items"])
-        data["items"] = [p for p in data["items"] if p["id"] != item_id]
-        
-        if len(data["items"]) == original_count:
-            return jsonify({"error": "Persona no encontrada"}), 404
-        
-        write_collection(PERSONAS_PATH, data)
-        return jsonify({"deleted": item_id})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.get("/api/tools/cache")
+def api_tools_cache():
+    """Estadísticas de la caché de respuestas de herramientas"""
+    return jsonify(tool_response_cache.stats())
+
+
+@app.delete("/api/tools/cache")
+def api_tools_cache_clear():
+    tool_response_cache.clear()
+    return jsonify(tool_response_cache.stats())
 
 
 # ============================================================================
-# API CRUD: Gastos
+# Cliente HTTP con pool de conexiones para herramientas personalizadas
 # ============================================================================
 
-@app.get("/api/gastos")
-def api_gastos_list():
-    """Lista todos los gastos"""
-    data = read_collection(GASTOS_PATH)
-    return jsonify(data)
+# Valores por defecto; cada herramienta puede sobrescribir timeout,
+# connect_timeout, retries y retry_backoff dentro de su "endpoint".
+TOOL_POOL_MAXSIZE = int(os.getenv("TOOL_POOL_MAXSIZE", "20"))
+TOOL_KEEPALIVE = os.getenv("TOOL_KEEPALIVE", "1") != "0"
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+TOOL_CONNECT_TIMEOUT = float(os.getenv("TOOL_CONNECT_TIMEOUT", "5"))
+TOOL_RETRIES = int(os.getenv("TOOL_RETRIES", "2"))
+TOOL_RETRY_BACKOFF = float(os.getenv("TOOL_RETRY_BACKOFF", "0.2"))
 
+IDEMPOTENT_TOOL_METHODS = ("GET", "PUT", "DELETE")
+RETRY_STATUS_CODES = (502, 503, 504)
 
-@app.post("/api/gastos")
-def api_gastos_create():
-    """Crea un nuevo gasto"""
-    try:
-        body = request.get_json() or {}
-        descripcion = body.get("descripcion", "").strip()
-        gasto = body.get("gasto")
-        
-        if not descripcion:
-            return jsonify({"error": "descripcion es requerida"}), 400
-        
-        try:
-            gasto = float(gasto)
-        except (TypeError, ValueError):
-            return jsonify({"error": "gasto debe ser un número válido"}), 400
-        
-        data = read_collection(GASTOS_PATH)
-        new_item = {
-            "id": gen_id(),
-            "descripcion": descripcion,
-            "gasto": gasto
+ToolRequestOptions = namedtuple("ToolRequestOptions", "timeout retries retry_backoff cache_ttl")
+
+
+def tool_request_options(endpoint):
+    """Lee los overrides de conexión y caché de un endpoint (lanza ValueError si son inválidos)"""
+    timeout = float(endpoint.get("timeout", TOOL_TIMEOUT))
+    connect_timeout = float(endpoint.get("connect_timeout", min(TOOL_CONNECT_TIMEOUT, timeout)))
+    retries = int(endpoint.get("retries", TOOL_RETRIES))
+    retry_backoff = float(endpoint.get("retry_backoff", TOOL_RETRY_BACKOFF))
+    if timeout <= 0 or connect_timeout <= 0 or retries < 0 or retry_backoff < 0:
+        raise ValueError("timeout, connect_timeout, retries y retry_backoff deben ser positivos")
+    return ToolRequestOptions((connect_timeout, timeout), retries, retry_backoff, tool_cache_ttl(endpoint))
+
+
+DEFAULT_TOOL_REQUEST_OPTIONS = tool_request_options({})
+
+
+class HostPool:
+    """Sesión de requests con keep-alive reutilizada para un único host"""
+
+    def __init__(self, origin):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.origin = origin
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TOOL_POOL_MAXSIZE, max_retries=0)
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        if not TOOL_KEEPALIVE:
+            self.session.headers["Connection"] = "close"
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+
+    def stats(self):
+        created = served = idle = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            created += pool.num_connections
+            served += pool.num_requests
+            idle += pool.pool.qsize() if pool.pool else 0
+        return {
+            "origin": self.origin,
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "connections_created": created,
+            "pool_requests": served,
+            "pool_slots_available": idle,
+            "pool_maxsize": TOOL_POOL_MAXSIZE,
         }
-        data["items"].append(new_item)
-        write_collection(GASTOS_PATH, data)
-        
-        return jsonify({"created": new_item}), 201
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
 
-@app.route("/api/gastos/<item_id>", methods=["PUT"])
-@app.route("/api/gastos", methods=["PUT"])
-def api_gastos_update(item_id=None):
-    """Actualiza un gasto existente"""
-    try:
-        body = request.get_json() or {}
-        # Obtener ID desde URL o desde body
-        if not item_id:
-            item_id = body.get("id")
-        
-        if not item_id:
-            return jsonify({"error": "ID es requerido"}), 400
-        
-        data = read_collection(GASTOS_PATH)
-        
-        item = next((g for g in data["items"] if g["id"] == item_id), None)
-        if not item:
-            return jsonify({"error": "Gasto no encontrado"}), 404
-        
-        # Actualizar campos si se proporcionan
-        if "descripcion" in body:
-            item["descripcion"] = body["descripcion"].strip()
-        if "gasto" in body:
-            try:
-                item["gasto"] = float(body["gasto"])
-            except (TypeError, ValueError):
-                return jsonify({"error": "gasto debe ser un número válido"}), 400
-        
-        write_collection(GASTOS_PATH, data)
-        return jsonify({"updated": item})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+_host_pools = {}
+_host_pools_lock = threading.Lock()
 
 
-@app.route("/api/gastos/<item_id>", methods=["DELETE"])
-@app.route("/api/gastos", methods=["DELETE"])
-def api_gastos_delete(item_id=None):
-    """Elimina un gasto"""
-    try:
+def get_host_pool(url):
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    pool = _host_pools.get(origin)
+    if pool is None:
+        with _host_pools_lock:
+            pool = _host_pools.get(origin)
+            if pool is None:
+                pool = _host_pools[origin] = HostPool(origin)
+    return pool
+
+
+def _is_connect_error(exc):
+    """True si la conexión falló antes de enviar la request (seguro reintentar)"""
+    import requests
+
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], "reason", None) if exc.args else None
+    return type(reason).__name__ == "NewConnectionError"
+
+
+def send_tool_request(method, url, options=None, **kwargs):
+    """
+    Envía la request de una herramienta por el pool de su host, con
+    reintentos y backoff exponencial. Los métodos no idempotentes (POST)
+    solo se reintentan si la conexión nunca llegó a establecerse.
+    """
+    import requests
+
+    options = options or DEFAULT_TOOL_REQUEST_OPTIONS
+    pool = get_host_pool(url)
+    idempotent = method in IDEMPOTENT_TOOL_METHODS
+    attempt = 0
+    while True:
+        pool.requests += 1
+        try:
+            response = pool.session.request(method, url, timeout=options.timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            retryable = idempotent or _is_connect_error(e)
+            if not retryable or attempt >= options.retries:
+                pool.errors += 1
+                raise
+        else:
+            if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt < options.retries):
+                return response
+            response.close()
+        attempt += 1
+        pool.retries += 1
+        time.sleep(options.retry_backoff * (2 ** (attempt - 1)))
+
+
+def tool_http_pool_stats():
+    return [pool.stats() for pool in list(_host_pools.values())]
+
+
+@app.get("/api/tools/pool")
+def api_tools_pool():
+    """Estadísticas de los pools de conexiones hacia los backends de herramientas"""
+    return jsonify({
+        "pool_maxsize": TOOL_POOL_MAXSIZE,
+        "keepalive": TOOL_KEEPALIVE,
+        "hosts": tool_http_pool_stats(),
+    })
+
+
+# ============================================================================
+# Registro compilado de herramientas
+# ============================================================================
+
+SUPPORTED_TOOL_METHODS = ("GET", "POST", "PUT", "DELETE")
+
+# revision: versión de tools.json en la que se compiló por última vez (se
+# conserva mientras la herramienta no cambie; forma parte de la clave de caché)
+CompiledTool = namedtuple(
+    "CompiledTool", "name tool is_system type method url headers error options revision"
+)
+_ToolRegistry = namedtuple("_ToolRegistry", "version by_name")
+
+_tool_registry = _ToolRegistry(None, {})
+_tool_registry_lock = threading.Lock()
+
+
+def compile_tool(tool, is_system, revision=None):
+    """Resuelve y valida de antemano lo necesario para ejecutar una herramienta"""
+    if is_system:
+        return CompiledTool(tool["name"], tool, True, tool.get("type"), None, None, None, None, None, revision)
+
+    endpoint = tool.get("endpoint") or {}
+    method = (endpoint.get("method") or "GET").upper()
+    url = (endpoint.get("url") or "").strip()
+    error = None
+    if method not in SUPPORTED_TOOL_METHODS:
+        error = f"Unsupported method: {method}"
+    elif not url.startswith(("http://", "https://")):
+        error = f"Invalid endpoint URL for tool '{tool['name']}'"
+    try:
+        options = tool_request_options(endpoint)
+    except (TypeError, ValueError) as e:
+        options = None
+        error = error or f"Invalid endpoint options for tool '{tool['name']}': {e}"
+    return CompiledTool(
+        tool["name"], tool, False, None, method, url, dict(endpoint.get("headers") or {}), error, options, revision
+    )
+
+
+def rebuild_tool_registry():
+    """
+    Construye el índice nombre -> herramienta habilitada para la versión
+    actual de tools.json y lo publica con una sola asignación.
+    """
+    global _tool_registry
+    with _tool_registry_lock:
+        snap = tools_store.snapshot_info()
+        if _tool_registry.version == snap.version:
+            return _tool_registry
+        by_name = {}
+        previous = _tool_registry.by_name
+        # Las herramientas del sistema tienen prioridad sobre las personalizadas
+        for key, is_system in (("system_tools", True), ("tools", False)):
+            for tool in snap.data.get(key, []):
+                name = tool.get("name")
+                if name and tool.get("enabled", False) and name not in by_name:
+                    old = previous.get(name)
+                    if old is not None and old.is_system == is_system and old.tool == tool:
+                        # Sin cambios: conserva la revisión y con ella sus entradas en caché
+                        by_name[name] = old
+                    else:
+                        by_name[name] = compile_tool(tool, is_system, snap.version)
+        # Invalidar la caché de las herramientas editadas, desactivadas o borradas
+        for name, old in previous.items():
+            if by_name.get(name) is not old:
+                tool_response_cache.invalidate(name)
+        _tool_registry = _ToolRegistry(snap.version, by_name)
+        return _tool_registry
+
+
+def get_tool_registry():
+    registry = _tool_registry
+    if registry.version != tools_store.version:
+        registry = rebuild_tool_registry()
+    return registry
+
+
+def run_system_tool(compiled, arguments):
+    """Resuelve una herramienta del sistema; la acción la ejecuta el cliente"""
+    tool_type = compiled.type
+    
+    if tool_type == "disconnect":
+        # La desconexión se maneja en el cliente
+        return {
+            "success": True,
+            "system_action": "disconnect",
+            "result": {"message": "Desconectando llamada..."}
+        }, 200
+    
+    elif tool_type == "open_url":
+        url = arguments.get("url", "").strip()
+        if not url:
+            return {"error": "URL is required"}, 400
+        
+        # Validar que la URL tenga protocolo
+        if not url.startswith(("http://", "https://")):
+            url = "https://" + url
+        
+        # La apertura de URL se maneja en el cliente
+        return {
+            "success": True,
+            "system_action": "open_url",
+            "url": url,
+            "result": {"message": f"Abriendo {url}..."}
+        }, 200
+    
+    elif tool_type == "open_module":
+        module = arguments.get("module", "").strip().lower()
+        
+        if not module:
+            return {"error": "module is required"}, 400
+        
+        if module not in ALLOWED_MODULES:
+            return {"error": f"Module '{module}' not found. Available: {', '.join(ALLOWED_MODULES)}"}, 400
+        
+        # La navegación interna se maneja en el cliente
+        return {
+            "success": True,
+            "system_action": "open_module",
+            "module": module,
+            "result": {"message": f"Abriendo módulo {module}..."}
+        }, 200
+    
+    else:
+        return {"error": f"Unknown system tool type: {tool_type}"}, 400
+
+
+def prepare_tool_call(tool_name, arguments):
+    """
+    Resuelve todo lo que no requiere red. Devuelve (payload, status, None)
+    si la llamada ya tiene respuesta, o (None, None, compiled) si hay que
+    hacer la request HTTP de una herramienta personalizada.
+    """
+    if not tool_name:
+        return {"error": "tool_name is required"}, 400, None
+    
+    # Buscar la herramienta habilitada (system_tools tiene prioridad)
+    compiled = get_tool_registry().by_name.get(tool_name)
+    if not compiled:
+        return {"error": f"Tool '{tool_name}' not found or disabled"}, 404, None
+    
+    if compiled.is_system:
+        payload, status = run_system_tool(compiled, arguments)
+        return payload, status, None
+    
+    if compiled.error:
+        return {"error": compiled.error}, 400, None
+    return None, None, compiled
+
+
+def tool_request_kwargs(compiled, arguments):
+    """Argumentos de la request (válidos tanto para requests como para httpx)"""
+    if compiled.method in ("GET", "DELETE"):
+        # Para GET/DELETE, los argumentos van en query params
+        return {"params": arguments, "headers": compiled.headers}
+    # Para POST/PUT, los argumentos van en el body
+    return {"json": arguments, "headers": compiled.headers}
+
+
+def tool_response_payload(status_code, parse_json, text):
+    try:
+        result = parse_json()
+    except Exception:
+        result = {"text": text}
+    return {
+        "success": True,
+        "status_code": status_code,
+        "result": result
+    }
+
+
+def execute_tool_call(tool_name, arguments):
+    """Ejecuta una herramienta y devuelve (payload, status) listos para jsonify"""
+    import requests
+
+    try:
+        payload, status, compiled = prepare_tool_call(tool_name, arguments)
+        if compiled is None:
+            return payload, status
+        
+        def load():
+            with upstream_timer("tool", compiled.name) as call:
+                response = send_tool_request(
+                    compiled.method, compiled.url, compiled.options, **tool_request_kwargs(compiled, arguments)
+                )
+                call["status"] = response.status_code
+            return tool_response_payload(response.status_code, response.json, response.text)
+
+        ttl = compiled.options.cache_ttl
+        if ttl is None:
+            return load(), 200
+        return tool_response_cache.get_or_load(tool_cache_key(compiled, arguments), ttl, load), 200
+        
+    except requests.RequestException as e:
+        return {
+            "success": False,
+            "error": f"Request failed: {str(e)}"
+        }, 500
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }, 500
+
+
+@app.post("/api/execute_tool")
+def api_execute_tool():
+    """
+    Ejecuta una herramienta configurada
+    Body JSON:
+    {
+      "tool_name": "nombreHerramienta",
+      "arguments": {"param1": "value1", ...}
+    }
+    """
+    data = request.get_json(silent=True) or {}
+    payload, status = execute_tool_call(data.get("tool_name"), data.get("arguments", {}))
+    return jsonify(payload), status
+
+
+# ============================================================================
+# Ejecución en lote de herramientas
+# ============================================================================
+
+TOOL_BATCH_WORKERS = int(os.getenv("TOOL_BATCH_WORKERS", "16"))
+TOOL_BATCH_MAX_CALLS = int(os.getenv("TOOL_BATCH_MAX_CALLS", "32"))
+TOOL_BATCH_DEADLINE = float(os.getenv("TOOL_BATCH_DEADLINE", "30"))
+
+_tool_batch_executor = ThreadPoolExecutor(max_workers=TOOL_BATCH_WORKERS, thread_name_prefix="tool-batch")
+
+
+def parse_tool_batch(data):
+    """
+    Valida el body de /api/execute_tools y devuelve (calls, deadline_s).
+    Lanza ValueError con un mensaje para el cliente si es inválido.
+    """
+    calls = data.get("calls")
+    if not isinstance(calls, list) or not calls:
+        raise ValueError("calls must be a non-empty list")
+    if len(calls) > TOOL_BATCH_MAX_CALLS:
+        raise ValueError(f"Too many calls in batch (max {TOOL_BATCH_MAX_CALLS})")
+    for call in calls:
+        if not isinstance(call, dict):
+            raise ValueError("each call must be an object with tool_name and arguments")
+
+    deadline = TOOL_BATCH_DEADLINE
+    if data.get("deadline_ms") is not None:
+        try:
+            deadline = min(float(data["deadline_ms"]) / 1000.0, TOOL_BATCH_DEADLINE)
+        except (TypeError, ValueError):
+            raise ValueError("deadline_ms must be a number")
+        if deadline <= 0:
+            raise ValueError("deadline_ms must be positive")
+    return calls, deadline
+
+
+def batch_call_result(call, payload, status, elapsed):
+    """Resultado de una llamada del lote: el payload de /api/execute_tool más metadatos"""
+    result = dict(payload)
+    result["call_id"] = call.get("call_id")
+    result["tool_name"] = call.get("tool_name")
+    result["status"] = status
+    result["elapsed_ms"] = round(elapsed * 1000, 2)
+    return result
+
+
+def batch_deadline_payload(deadline):
+    return {"success": False, "error": f"Deadline exceeded ({deadline:g}s)"}
+
+
+def _timed_tool_call(call):
+    started = time.perf_counter()
+    payload, status = execute_tool_call(call.get("tool_name"), call.get("arguments", {}))
+    return payload, status, time.perf_counter() - started
+
+
+@app.post("/api/execute_tools")
+def api_execute_tools():
+    """
+    Ejecuta varias herramientas en paralelo (p. ej. todas las function calls
+    de una misma respuesta del Realtime API).
+    Body JSON:
+    {
+      "calls": [{"call_id": "opcional", "tool_name": "...", "arguments": {...}}, ...],
+      "deadline_ms": 10000   // opcional, acotado por TOOL_BATCH_DEADLINE
+    }
+    Los resultados vuelven en el mismo orden. Las llamadas que no terminan
+    antes del deadline se reportan con status 504 (siguen ejecutándose en
+    segundo plano, pero su resultado se descarta).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        calls, deadline = parse_tool_batch(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    futures = [_tool_batch_executor.submit(_timed_tool_call, call) for call in calls]
+    wait_futures(futures, timeout=deadline)
+
+    results = []
+    for call, future in zip(calls, futures):
+        if future.done():
+            payload, status, elapsed = future.result()
+        else:
+            future.cancel()
+            payload, status, elapsed = batch_deadline_payload(deadline), 504, time.perf_counter() - started
+        results.append(batch_call_result(call, payload, status, elapsed))
+
+    return jsonify({
+        "results": results,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+
+
+# ============================================================================
+# Configuración compilada del agente (compartida por /api/session, /api/tools
+# y /api/settings)
+# ============================================================================
+
+def realtime_tool_payload(tool):
+    """Proyección de una herramienta al formato del Realtime API"""
+    return {
+        "type": "function",
+        "name": tool["name"],
+        "description": tool["description"],
+        "parameters": tool["parameters"]
+    }
+
+
+class AgentConfig:
+    """
+    Todo lo que se deriva de una versión concreta de settings.json y
+    tools.json. Solo la sustitución de la fecha se hace por request, y su
+    resultado se reutiliza durante el minuto en curso.
+    """
+
+    def __init__(self, key, settings, tools_data):
+        self.key = key
+        self.settings = settings
+        self.system_prompt = settings.get("system_prompt", DEFAULT_SETTINGS["system_prompt"])
+
+        # Herramientas del sistema activas + herramientas personalizadas activas
+        system_tools = [
+            realtime_tool_payload(tool)
+            for tool in tools_data.get("system_tools", [])
+            if tool.get("enabled", False)
+        ]
+        custom_tools = [
+            realtime_tool_payload(tool)
+            for tool in tools_data.get("tools", [])
+            if tool.get("enabled", False)
+        ]
+        self.realtime_tools = system_tools + custom_tools
+        # /api/tools solo expone las personalizadas
+        self.tools_json = app.json.dumps({"tools": custom_tools}).encode("utf-8")
+        self.tools_etag = bytes_etag(self.tools_json)
+
+        self.session_template = {
+            "model": settings.get("realtime_model", DEFAULT_SETTINGS["realtime_model"]),
+            "voice": settings.get("voice", DEFAULT_SETTINGS["voice"]),
+            "instructions": self.system_prompt,
+            "turn_detection": {"type": "server_vad"},
+            "modalities": ["audio", "text"],
+            "input_audio_transcription": {"model": "gpt-4o-mini-transcribe"}
+        }
+        # Agregar herramientas solo si hay alguna activa
+        if self.realtime_tools:
+            self.session_template["tools"] = self.realtime_tools
+
+        self._rendered = (None, None, None)  # (fecha, instructions, settings_json)
+
+    def _render(self):
+        fecha = fecha_actual_texto()
+        rendered = self._rendered
+        if rendered[0] != fecha:
+            instructions = replace_date_placeholders(self.system_prompt)
+            settings = dict(self.settings, system_prompt=instructions)
+            rendered = (fecha, instructions, app.json.dumps(settings).encode("utf-8"))
+            self._rendered = rendered
+        return rendered
+
+    def instructions(self):
+        """System prompt con los marcadores de fecha ya reemplazados"""
+        return self._render()[1]
+
+    def settings_json(self):
+        return self._render()[2]
+
+    def session_config(self):
+        session_config = dict(self.session_template)
+        session_config["instructions"] = self.instructions()
+        return session_config
+
+
+_agent_config = None
+_agent_config_lock = threading.Lock()
+
+
+def get_agent_config():
+    global _agent_config
+    key = realtime_config_key()
+    config = _agent_config
+    if config is None or config.key != key:
+        with _agent_config_lock:
+            config = _agent_config
+            if config is None or config.key != key:
+                config = AgentConfig(key, settings_store.snapshot(), tools_store.snapshot())
+                _agent_config = config
+    return config
+
+
+def json_bytes_response(body):
+    return app.response_class(body, mimetype=app.json.mimetype)
+
+
+def settings_etag(body):
+    """
+    ETag de /api/settings: "<versión de settings.json>.<hash del body>". El
+    hash cubre lo que el archivo no dice: el prompt se sirve con la fecha ya
+    reemplazada, así que el body cambia solo aunque el archivo no cambie.
+    """
+    version = (settings_store.etag or '""')[1:-1]
+    return f'"{version}.{hashlib.sha1(body).hexdigest()[:12]}"'
+
+
+def settings_if_match(if_match):
+    """If-Match de /system: de un ETag de /api/settings solo cuenta la versión del archivo"""
+    if not if_match:
+        return if_match
+    tags = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        version, dot, _ = tag.rpartition(".")
+        tags.append(f'{version}"' if dot and tag.endswith('"') else tag)
+    return ", ".join(tags)
+
+
+@app.get("/api/settings")
+def api_settings():
+    # System prompt con los marcadores de fecha reemplazados
+    body = get_agent_config().settings_json()
+    # Sirve para GET condicional y para guardar /system con If-Match
+    etag = settings_etag(body)
+    response = not_modified(etag) or json_bytes_response(body)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+@app.get("/api/tools")
+def api_tools():
+    """
+    Devuelve las herramientas activas en el formato esperado por OpenAI Realtime API
+    """
+    config = get_agent_config()
+    response = not_modified(config.tools_etag) or json_bytes_response(config.tools_json)
+    response.headers["ETag"] = config.tools_etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+# ============================================================================
+# Caché HTTP y compresión
+# ============================================================================
+
+# Respuestas más chicas no se comprimen: el ahorro no compensa
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Nivel para respuestas dinámicas; los estáticos se comprimen al máximo una sola vez
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSIBLE_MIMETYPES = frozenset((
+    "application/json", "application/javascript", "text/javascript", "text/css",
+    "text/html", "text/plain", "text/csv", "text/markdown", "image/svg+xml",
+))
+# Estáticos pedidos sin huella (p. ej. el widget embebido en otros sitios):
+# se reusan este tiempo y luego se revalidan con el ETag
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "300"))
+# Con la huella vigente (?v=) la URL cambia con el contenido: caché de un año
+STATIC_IMMUTABLE = "public, max-age=31536000, immutable"
+# Variantes comprimidas de estáticos y /data que se guardan en memoria (por worker)
+COMPRESSED_CACHE_MAX_BYTES = int(os.getenv("COMPRESSED_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+_brotli = None
+_brotli_checked = False
+
+
+def brotli_module():
+    """Módulo brotli, o None si no está instalado (entonces solo se ofrece gzip)"""
+    global _brotli, _brotli_checked
+    if not _brotli_checked:
+        try:
+            import brotli
+        except ImportError:
+            brotli = None
+        _brotli = brotli
+        _brotli_checked = True
+    return _brotli
+
+
+def accepted_encoding():
+    """"br" o "gzip" según el Accept-Encoding de la request (br gana si empatan), o None"""
+    accept = request.accept_encodings
+    options = [("gzip", accept.quality("gzip"))]
+    if brotli_module() is not None:
+        options.insert(0, ("br", accept.quality("br")))
+    encoding, quality = max(options, key=lambda option: option[1])
+    return encoding if quality > 0 else None
+
+
+def compress_bytes(data, encoding, best=False):
+    if encoding == "br":
+        return brotli_module().compress(data, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if best else COMPRESS_LEVEL, mtime=0)
+
+
+def weak_etag(etag):
+    """La variante comprimida no es idéntica byte a byte: su ETag pasa a ser débil"""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+def not_modified(etag):
+    """
+    Respuesta 304 si el If-None-Match de la request ya tiene `etag`, o None.
+    Permite cortar antes de armar el body cuando el ETag sale barato.
+    """
+    if not etag or request.method not in ("GET", "HEAD"):
+        return None
+    tag, _ = unquote_etag(etag)
+    if not request.if_none_match.contains_weak(tag):
+        return None
+    response = app.response_class(status=304)
+    response.headers["ETag"] = etag
+    return response
+
+
+def conditional_response(response):
+    """GET condicional genérico: 304 si el ETag o Last-Modified de la respuesta coinciden"""
+    if (request.method in ("GET", "HEAD") and response.status_code == 200
+            and not response.is_streamed
+            and ("ETag" in response.headers or "Last-Modified" in response.headers)):
+        response.make_conditional(request)
+    return response
+
+
+def compress_response(response):
+    """gzip/brotli para respuestas en memoria de tipo texto; no toca streams ni archivos"""
+    if (response.status_code != 200 or request.method == "HEAD"
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+    response.set_data(compress_bytes(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    if "ETag" in response.headers:
+        response.headers["ETag"] = weak_etag(response.headers["ETag"])
+    return response
+
+
+_compressed_files = OrderedDict()  # (ruta, stat_key, encoding) -> bytes
+_compressed_files_bytes = 0
+_compressed_files_lock = threading.Lock()
+
+
+def compressed_file(path, stat_key, encoding):
+    """
+    Contenido de `path` comprimido: el .br/.gz de al lado si es al menos tan
+    nuevo como el original (ver compress-static); si no, se comprime una vez
+    y queda en un LRU en memoria mientras el archivo no cambie.
+    """
+    global _compressed_files_bytes
+    key = (path, stat_key, encoding)
+    with _compressed_files_lock:
+        data = _compressed_files.get(key)
+        if data is not None:
+            _compressed_files.move_to_end(key)
+            return data
+
+    data = None
+    precompressed = path + (".br" if encoding == "br" else ".gz")
+    try:
+        if os.stat(precompressed).st_mtime_ns >= stat_key[0]:
+            with open(precompressed, "rb") as f:
+                data = f.read()
+    except FileNotFoundError:
+        pass
+    if data is None:
+        with open(path, "rb") as f:
+            data = compress_bytes(f.read(), encoding, best=True)
+
+    if len(data) <= COMPRESSED_CACHE_MAX_BYTES // 4:
+        with _compressed_files_lock:
+            if key not in _compressed_files:
+                _compressed_files[key] = data
+                _compressed_files_bytes += len(data)
+            while _compressed_files_bytes > COMPRESSED_CACHE_MAX_BYTES:
+                _, evicted = _compressed_files.popitem(last=False)
+                _compressed_files_bytes -= len(evicted)
+    return data
+
+
+def send_cached_file(directory, filename, etag=None, cache_control="no-cache"):
+    """
+    Archivo con ETag (el dado o la versión en disco), Last-Modified,
+    Cache-Control y, si el cliente acepta, la variante gzip/brotli.
+    """
+    path = safe_join(str(directory), filename)
+    stat_key = file_stat_key(path) if path else None
+    if stat_key is None or not os.path.isfile(path):
+        abort(404)
+    etag = etag or stat_etag(stat_key)
+    cached = not_modified(etag)
+    if cached is not None:
+        cached.headers["Cache-Control"] = cache_control
+        return cached
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    compressible = mimetype in COMPRESSIBLE_MIMETYPES and stat_key[1] >= COMPRESS_MIN_BYTES
+    encoding = accepted_encoding() if compressible else None
+    if encoding:
+        response = app.response_class(compressed_file(path, stat_key, encoding), mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+        response.headers["ETag"] = weak_etag(etag)
+    else:
+        response = send_file(path, mimetype=mimetype, conditional=False, etag=False)
+        response.headers["ETag"] = etag
+    if compressible:
+        response.vary.add("Accept-Encoding")
+    response.last_modified = stat_key[0] // 1_000_000_000
+    response.headers["Cache-Control"] = cache_control
+    return response
+
+
+_static_fingerprints = {}  # ruta -> (stat_key, huella)
+
+
+def static_fingerprint(filename):
+    """Hash corto del contenido de un estático (None si no existe o es un directorio); se recalcula solo si cambia"""
+    path = safe_join(str(STATIC_DIR), filename)
+    stat_key = file_stat_key(path) if path else None
+    if stat_key is None or not os.path.isfile(path):
+        return None
+    cached = _static_fingerprints.get(path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+    with open(path, "rb") as f:
+        fingerprint = hashlib.sha1(f.read()).hexdigest()[:12]
+    _static_fingerprints[path] = (stat_key, fingerprint)
+    return fingerprint
+
+
+def static_fingerprint_matches(filename, fingerprint):
+    return static_fingerprint(filename) == fingerprint
+
+
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    """url_for('static', ...) agrega ?v=<huella>: la URL cambia cuando cambia el archivo"""
+    if endpoint == "static" and "v" not in values:
+        filename = values.get("filename") or ""
+        fingerprint = static_fingerprint(filename)
+        if fingerprint:
+            values["v"] = fingerprint
+        # Una página pre-renderizada se invalida si cambia la huella (ver render_page)
+        page_static_deps = g.get("page_static_deps")
+        if page_static_deps is not None:
+            page_static_deps.append(partial(static_fingerprint_matches, filename, fingerprint))
+
+
+@app.endpoint("static")
+def serve_static(filename):
+    """
+    Estáticos con ETag por contenido y gzip/brotli. Con la huella vigente en
+    ?v= se cachean como inmutables; sin ella (el snippet del widget que se
+    pega en otros sitios) se reusan STATIC_MAX_AGE segundos y se revalidan.
+    """
+    fingerprint = static_fingerprint(filename)
+    if fingerprint is None:
+        abort(404)
+    if request.args.get("v") == fingerprint:
+        cache_control = STATIC_IMMUTABLE
+    else:
+        cache_control = f"public, max-age={STATIC_MAX_AGE}"
+    return send_cached_file(STATIC_DIR, filename, etag=f'"{fingerprint}"', cache_control=cache_control)
+
+
+@app.cli.command("compress-static")
+def compress_static_command():
+    """Genera los .gz (y .br si brotli está instalado) de los estáticos de texto"""
+    encodings = ["gzip"] + (["br"] if brotli_module() is not None else [])
+    for path in sorted(STATIC_DIR.rglob("*")):
+        mimetype = mimetypes.guess_type(str(path))[0]
+        if not path.is_file() or mimetype not in COMPRESSIBLE_MIMETYPES:
+            continue
+        data = path.read_bytes()
+        if len(data) < COMPRESS_MIN_BYTES:
+            continue
+        for encoding in encodings:
+            target = Path(str(path) + (".br" if encoding == "br" else ".gz"))
+            compressed = compress_bytes(data, encoding, best=True)
+            target.write_bytes(compressed)
+            click.echo(f"{target.relative_to(STATIC_DIR)}: {len(data)} -> {len(compressed)} bytes")
+
+
+# ============================================================================
+# Páginas y módulos de la SPA pre-renderizados
+# ============================================================================
+
+# Páginas distintas que se guardan (por worker); el host entra en la clave de
+# "/" y "/demo-all-in-one", así que un Host arbitrario no puede crecerla sin tope
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "64"))
+# Cada cuánto se revisa si cambiaron las plantillas o los estáticos que usa una página
+PAGE_RECHECK_SECONDS = float(os.getenv("PAGE_RECHECK_SECONDS", str(CONFIG_RECHECK_SECONDS)))
+# Pre-renderizar módulos y páginas al arrancar (0 = en el primer pedido)
+PAGE_CACHE_WARM = os.getenv("PAGE_CACHE_WARM", "1") != "0"
+
+
+class RenderedPage:
+    """
+    Body ya renderizado de una plantilla, con su ETag y las variantes
+    gzip/brotli (comprimidas al máximo una sola vez, al pedirlas).
+
+    `version` son los ETags de settings.json y tools.json con los que se
+    renderizó; `deps` son funciones que dicen si una plantilla o un estático
+    referenciado sigue igual (se consultan cada PAGE_RECHECK_SECONDS).
+    """
+
+    def __init__(self, body, mimetype, version, deps):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = bytes_etag(body)
+        self.version = version
+        self.deps = deps
+        self.checked_at = time.monotonic()
+        self.compressible = len(body) >= COMPRESS_MIN_BYTES
+        self._encoded = {}
+
+    def is_current(self):
+        return all(dep() for dep in self.deps)
+
+    def is_fresh(self, version):
+        if version != self.version:
+            return False
+        now = time.monotonic()
+        if now - self.checked_at < PAGE_RECHECK_SECONDS:
+            return True
+        if not self.is_current():
+            return False
+        self.checked_at = now
+        return True
+
+    def encoded(self, encoding):
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress_bytes(self.body, encoding, best=True)
+        return data
+
+
+_rendered_pages = OrderedDict()  # clave -> RenderedPage
+_rendered_pages_lock = threading.Lock()
+page_cache_hits = 0
+page_cache_misses = 0
+
+
+def config_version():
+    return (settings_store.etag, tools_store.etag)
+
+
+def template_dependencies(name, seen=None):
+    """
+    Funciones "uptodate" de Jinja para la plantilla y las que extiende o
+    incluye. Sin auto_reload Jinja no relee las plantillas, así que no hay
+    nada que vigilar.
+    """
+    env = app.jinja_env
+    if not env.auto_reload:
+        return []
+    seen = set() if seen is None else seen
+    seen.add(name)
+    source, _, uptodate = env.loader.get_source(env, name)
+    deps = [uptodate] if uptodate is not None else []
+    for referenced in jinja2_meta.find_referenced_templates(env.parse(source)):
+        if referenced and referenced not in seen:
+            deps += template_dependencies(referenced, seen)
+    return deps
+
+
+def get_rendered_page(key, render, mimetype="text/html"):
+    """
+    Página de la caché para `key`, o render() -> (body, deps) si no está o
+    cambió algo de lo que depende: la configuración, una plantilla o un
+    estático referenciado (la huella ?v= de url_for quedaría vieja).
+    """
+    global page_cache_hits, page_cache_misses
+    version = config_version()
+    with _rendered_pages_lock:
+        page = _rendered_pages.get(key)
+        if page is not None:
+            _rendered_pages.move_to_end(key)
+    if page is not None and page.is_fresh(version):
+        page_cache_hits += 1
+        return page
+
+    page_cache_misses += 1
+    body, deps = render()
+    page = RenderedPage(body, mimetype, version, deps)
+    with _rendered_pages_lock:
+        _rendered_pages[key] = page
+        _rendered_pages.move_to_end(key)
+        while len(_rendered_pages) > PAGE_CACHE_MAX_ENTRIES:
+            _rendered_pages.popitem(last=False)
+    return page
+
+
+def render_page(template, **context):
+    """RenderedPage de una plantilla; el contexto debe ser todo lo que varía entre requests"""
+    def render():
+        g.page_static_deps = static_deps = []
+        try:
+            html = render_template(template, **context)
+        finally:
+            g.pop("page_static_deps", None)
+        return html.encode("utf-8"), template_dependencies(template) + static_deps
+
+    return get_rendered_page((template, tuple(sorted(context.items()))), render)
+
+
+def rendered_page_response(page):
+    """200 con el body (o su variante gzip/brotli) o 304 si el cliente ya lo tiene"""
+    response = not_modified(page.etag)
+    if response is None:
+        encoding = accepted_encoding() if page.compressible else None
+        if encoding:
+            response = app.response_class(page.encoded(encoding), mimetype=page.mimetype)
+            response.headers["Content-Encoding"] = encoding
+            response.headers["ETag"] = weak_etag(page.etag)
+        else:
+            response = app.response_class(page.body, mimetype=page.mimetype)
+            response.headers["ETag"] = page.etag
+    if page.compressible:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def render_module(module_name):
+    return render_page(f"modules/{module_name}.html")
+
+
+def render_module_bundle():
+    """Los módulos de ALLOWED_MODULES en un solo JSON: {"modules": {nombre: html}}"""
+    def render():
+        pages = {name: render_module(name) for name in ALLOWED_MODULES}
+        body = json.dumps(
+            {"modules": {name: page.body.decode("utf-8") for name, page in pages.items()}},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        return body, [page.is_current for page in pages.values()]
+
+    return get_rendered_page(("modules",), render, mimetype="application/json")
+
+
+def warm_page_cache():
+    """
+    Renderiza los módulos, el bundle, /chatbot y /ui antes del primer pedido.
+    "/" y "/demo-all-in-one" dependen del host, así que se renderizan en el
+    primer pedido de cada host.
+    """
+    with app.test_request_context("/modules"):
+        render_module_bundle().encoded("gzip")
+    for path, template in (("/chatbot", "chatbot.html"), ("/ui", "ui.html")):
+        with app.test_request_context(path):
+            render_page(template).encoded("gzip")
+
+
+# ============================================================================
+# Almacenamiento de colecciones (personas, gastos)
+# (esquemas, filas y backends en collection_store.py; acá la configuración)
+# ============================================================================
+
+# "json" (por defecto) mantiene data/<coleccion>.json como fuente de verdad;
+# "sqlite" usa una base SQLite en modo WAL con escrituras por fila.
+COLLECTION_BACKEND = os.getenv("COLLECTION_BACKEND", "json").strip().lower()
+COLLECTION_DB_PATH = Path(os.getenv("COLLECTION_DB_PATH", str(INSTANCE_DIR / "collections.sqlite3")))
+
+COLLECTION_MAX_LIMIT = int(os.getenv("COLLECTION_MAX_LIMIT", "1000"))
+
+# Colecciones declaradas con register_collection(), por nombre
+COLLECTIONS = {}
+
+
+def parse_collection_query(name, args):
+    """Convierte los query params de un listado en un CollectionQuery (ValueError si son inválidos)"""
+    schema = COLLECTIONS[name]
+    filters = []
+    for param, (op, field) in schema.filters.items():
+        raw = (args.get(param) or "").strip()
+        if not raw:
+            continue
+        if op in ("min", "max"):
+            try:
+                value = float(raw)
+            except ValueError:
+                raise ValueError(f"{param} debe ser un número válido")
+        else:
+            value = raw.casefold()
+        filters.append((op, field, value))
+
+    sort = (args.get("sort") or "").strip()
+    desc = sort.startswith("-")
+    sort_field = sort.lstrip("-") or None
+    if sort_field and sort_field not in schema.sort_fields:
+        raise ValueError(f"sort debe ser uno de: {', '.join(schema.sort_fields)}")
+
+    limit = None
+    if args.get("limit"):
+        try:
+            limit = int(args["limit"])
+        except ValueError:
+            raise ValueError("limit debe ser un entero")
+        if not 1 <= limit <= COLLECTION_MAX_LIMIT:
+            raise ValueError(f"limit debe estar entre 1 y {COLLECTION_MAX_LIMIT}")
+
+    cursor = decode_cursor(args["cursor"], sort_field, desc) if args.get("cursor") else None
+    return CollectionQuery(filters, sort_field, desc, limit, cursor)
+
+
+def collection_list_response(name):
+    """
+    Listado de una colección. Sin parámetros devuelve todo ({"items": [...]})
+    como siempre; con limit/cursor/sort/filtros devuelve solo la página
+    pedida y, si hay más, "next_cursor". El total filtrado va en X-Total-Count
+    y en X-Collection-Version la versión desde la que seguir los cambios
+    (/api/<coleccion>/changes?since=...).
+    """
+    collection = get_collection(name)
+    # Se lee antes que las filas: a lo sumo se repite algún cambio, nunca se pierde
+    version = str(get_change_feed(name).version)
+    # Con el backend json el ETag sale de la versión del archivo y la query,
+    # así que un GET condicional responde 304 sin armar el listado
+    tag = collection.version_tag()
+    etag = f'"{tag[1:-1]}.{hashlib.sha1(request.query_string).hexdigest()[:8]}"' if tag else None
+    response = not_modified(etag)
+    if response is None:
+        response = collection_list_body(name, collection)
+        if response.status_code != 200:
+            return response
+    response.headers["ETag"] = etag or bytes_etag(response.get_data())
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Collection-Version"] = version
+    return response
+
+
+def collection_list_body(name, collection):
+    """Body del listado (completo o paginado) para collection_list_response"""
+    params = set(COLLECTIONS[name].filters) | {"sort", "limit", "cursor"}
+    if not params.intersection(request.args):
+        items = [item.to_dict() for item in collection.list_items()]
+        response = jsonify({"items": items})
+        response.headers["X-Total-Count"] = str(len(items))
+        return response
+
+    try:
+        q = parse_collection_query(name, request.args)
+    except ValueError as e:
+        return make_response(jsonify({"error": str(e)}), 400)
+    items, total, next_key = collection.query(q)
+    body = {"items": [item.to_dict() for item in items]}
+    if next_key is not None:
+        body["next_cursor"] = encode_cursor(q, next_key)
+    response = jsonify(body)
+    response.headers["X-Total-Count"] = str(total)
+    return response
+
+
+def item_response(body, item, status=200):
+    """Respuesta JSON con el ETag de la fila, para editarla luego con If-Match"""
+    response = jsonify(body)
+    response.status_code = status
+    response.headers["ETag"] = item_etag(item)
+    return response
+
+
+_collections = {}
+_collections_lock = threading.Lock()
+
+
+def get_collection(name):
+    """Backend configurado para la colección `name` (creado una sola vez)"""
+    backend = _collections.get(name)
+    if backend is None:
+        with _collections_lock:
+            backend = _collections.get(name)
+            if backend is None:
+                schema = COLLECTIONS[name]
+                if COLLECTION_BACKEND == "sqlite":
+                    backend = SqliteCollectionBackend(schema, COLLECTION_DB_PATH, legacy_path=schema.path)
+                elif COLLECTION_BACKEND == "json":
+                    backend = JsonCollectionBackend(schema)
+                else:
+                    raise RuntimeError(f"COLLECTION_BACKEND desconocido: {COLLECTION_BACKEND}")
+                _collections[name] = backend
+    return backend
+
+
+@app.cli.command("migrate-collections")
+@click.option("--force", is_flag=True, help="Reimportar aunque ya se haya migrado")
+def migrate_collections_command(force):
+    """Importa el .json de cada colección (data/personas.json, data/gastos.json) a la base SQLite"""
+    for name, schema in COLLECTIONS.items():
+        backend = SqliteCollectionBackend(schema, COLLECTION_DB_PATH)
+        rows = backend.migrate_from_json(schema.path, force=force)
+        click.echo(f"{name}: {rows} filas importadas a {COLLECTION_DB_PATH}")
+
+
+# ============================================================================
+# API de colecciones (generada a partir del esquema)
+# ============================================================================
+
+def collection_not_found(name):
+    return jsonify({"error": COLLECTIONS[name].not_found}), 404
+
+
+def collection_create_response(name):
+    """Crea una fila validada según el esquema de la colección"""
+    try:
+        body = request.get_json() or {}
+        try:
+            new_item = COLLECTIONS[name].validate(body)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        get_collection(name).insert(new_item)
+
+        return item_response({"created": new_item.to_dict()}, new_item, 201)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def collection_get_response(name, item_id):
+    """Una fila por id, con su ETag"""
+    try:
+        item = get_collection(name).get(item_id)
+        if item is None:
+            return collection_not_found(name)
+        return item_response(item.to_dict(), item)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def collection_update_response(name, item_id=None):
+    """Actualiza los campos que trae el body (id en la URL o en el body)"""
+    try:
+        body = request.get_json() or {}
+        # Obtener ID desde URL o desde body
+        if not item_id:
+            item_id = body.get("id")
+
+        if not item_id:
+            return jsonify({"error": "ID es requerido"}), 400
+
+        collection = get_collection(name)
+        if collection.get(item_id) is None:
+            return collection_not_found(name)
+
+        try:
+            changes = COLLECTIONS[name].validate_changes(body)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            item = collection.update(item_id, changes, request.headers.get("If-Match"))
+        except WriteConflict as e:
+            return precondition_failed(e)
+        if item is None:
+            return collection_not_found(name)
+        return item_response({"updated": item.to_dict()}, item)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def collection_delete_response(name, item_id=None):
+    """Elimina una fila (id en la URL, en la query o en el body)"""
+    try:
         # Obtener ID desde URL o desde query params o body
         if not item_id:
-            item_id = request.args.get("id") or (request.get_json() or {}).get("id")
-        
+            item_id = request.args.get("id") or (request.get_json(silent=True) or {}).get("id")
+
         if not item_id:
             return jsonify({"error": "ID es requerido"}), 400
-        
-        data = read_collection(GASTOS_PATH)
-        original_count = len(data["items"])
-        data["items"] = [g for g in data["items"] if g["id"] != item_id]
-        
-        if len(data["items"]) == original_count:
-            return jsonify({"error": "Gasto no encontrado"}), 404
-        
-        write_collection(GASTOS_PATH, data)
+
+        try:
+            deleted = get_collection(name).delete(item_id, request.headers.get("If-Match"))
+        except WriteConflict as e:
+            return precondition_failed(e)
+        if not deleted:
+            return collection_not_found(name)
+
         return jsonify({"deleted": item_id})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def register_collection(schema):
+    """
+    Declara una colección y le genera las rutas bajo /api/<nombre>:
+    GET (listado paginado), POST, GET/PUT/DELETE /<item_id> (PUT y DELETE
+    también sin id en la URL), POST /import, GET /export, GET /changes y,
+    si tiene campos de búsqueda, GET /search. Devuelve el esquema.
+    """
+    name = schema.name
+    if name in COLLECTIONS:
+        raise ValueError(f"La colección {name} ya está registrada")
+    if schema.path is None:
+        schema.path = DATA_DIR / f"{name}.json"
+    COLLECTIONS[name] = schema
+
+    base = f"/api/{name}"
+    routes = [
+        ("list", [base], "GET", collection_list_response),
+        ("create", [base], "POST", collection_create_response),
+        ("get", [f"{base}/<item_id>"], "GET", collection_get_response),
+        ("update", [f"{base}/<item_id>", base], "PUT", collection_update_response),
+        ("delete", [f"{base}/<item_id>", base], "DELETE", collection_delete_response),
+        ("import", [f"{base}/import"], "POST", collection_import_response),
+        ("export", [f"{base}/export"], "GET", collection_export_response),
+        ("changes", [f"{base}/changes"], "GET", collection_changes_response),
+    ]
+    if schema.searchable:
+        routes.append(("search", [f"{base}/search"], "GET", collection_search_response))
+    for action, rules, method, handler in routes:
+        # Una sola vista por endpoint: Flask no admite dos funciones con el mismo nombre
+        view = partial(handler, name)
+        for rule in rules:
+            app.add_url_rule(rule, f"api_{name}_{action}", view, methods=[method])
+    return schema
+
+
+# ============================================================================
+# Búsqueda en colecciones (/api/<coleccion>/search)
+# ============================================================================
+
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Similitud mínima (0-1) para que una palabra cuente como coincidencia.
+# PERSONAS_SEARCH_MIN_SIMILARITY es el nombre anterior de la variable.
+SEARCH_MIN_SIMILARITY = float(os.getenv(
+    "SEARCH_MIN_SIMILARITY", os.getenv("PERSONAS_SEARCH_MIN_SIMILARITY", "0.35")
+))
+PHONETIC_SIMILARITY = 0.9
+
+
+def digits_only(text):
+    return "".join(c for c in str(text or "") if c.isdigit())
+
+
+def trigrams(token):
+    """Trigramas con relleno: 'ana' -> {' an', 'ana', 'na '}"""
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def phonetic_key(token):
+    """
+    Clave fonética aproximada para español: iguala b/v, s/z/c(e,i), j/g(e,i),
+    k/c/qu, y/ll, ignora la h y las letras repetidas ('Vásquez' == 'Basques').
+    """
+    token = token.replace("ch", "X").replace("qu", "k").replace("ll", "y")
+    key = []
+    for i, c in enumerate(token):
+        nxt = token[i + 1:i + 2]
+        if c == "h":
+            continue
+        if c == "v" or c == "w":
+            c = "b"
+        elif c == "z":
+            c = "s"
+        elif c == "c":
+            c = "s" if nxt in ("e", "i") else "k"
+        elif c == "g" and nxt in ("e", "i"):
+            c = "j"
+        elif c == "y" and not nxt:
+            c = "i"
+        if not key or key[-1] != c:
+            key.append(c)
+    return "".join(key)
+
+
+class CollectionSearchIndex:
+    """
+    Índice invertido en memoria sobre los campos search="text" del esquema
+    (en personas, nombre y apellido) y su campo search="phone" (telefono).
+    Las palabras se normalizan sin acentos; cada palabra distinta se indexa
+    por sus trigramas y su clave fonética, y el teléfono por los trigramas
+    de sus dígitos. Se suscribe a la colección y aplica cada cambio sin
+    reconstruirse.
+    """
+
+    def __init__(self, schema):
+        self.text_fields = schema.search_fields
+        self.phone_field = schema.phone_field
+        self._lock = threading.Lock()
+        self.reset([])
+
+    def reset(self, items):
+        with self._lock:
+            self._items = {}
+            self._postings = {}     # palabra -> {id: veces}
+            self._grams = {}        # trigrama -> {palabras}
+            self._phonetic = {}     # clave fonética -> {palabras}
+            self._phones = {}       # id -> dígitos del teléfono
+            self._phone_grams = {}  # trigrama de dígitos -> {ids}
+            for item in items:
+                self._add(item)
+
+    def apply(self, op, old, new):
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add(new)
+
+    def _words(self, item):
+        words = []
+        for field in self.text_fields:
+            words.extend(text_tokens(item.get(field), min_length=1))
+        return words
+
+    def _add(self, item):
+        item_id = item["id"]
+        self._items[item_id] = item
+        for word in self._words(item):
+            ids = self._postings.get(word)
+            if ids is None:
+                ids = self._postings[word] = {}
+                for gram in trigrams(word):
+                    self._grams.setdefault(gram, set()).add(word)
+                if word.isalpha():
+                    self._phonetic.setdefault(phonetic_key(word), set()).add(word)
+            ids[item_id] = ids.get(item_id, 0) + 1
+
+        phone = digits_only(item.get(self.phone_field)) if self.phone_field else ""
+        if phone:
+            self._phones[item_id] = phone
+            for gram in trigrams(phone):
+                self._phone_grams.setdefault(gram, set()).add(item_id)
+
+    def _remove(self, item):
+        item_id = item["id"]
+        self._items.pop(item_id, None)
+        for word in self._words(item):
+            ids = self._postings.get(word)
+            if ids is None or item_id not in ids:
+                continue
+            ids[item_id] -= 1
+            if ids[item_id] <= 0:
+                del ids[item_id]
+            if not ids:
+                del self._postings[word]
+                for gram in trigrams(word):
+                    self._discard(self._grams, gram, word)
+                if word.isalpha():
+                    self._discard(self._phonetic, phonetic_key(word), word)
+
+        phone = self._phones.pop(item_id, None)
+        if phone:
+            for gram in trigrams(phone):
+                self._discard(self._phone_grams, gram, item_id)
+
+    @staticmethod
+    def _discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def _similar_words(self, token):
+        """Palabras del vocabulario parecidas a token -> similitud (0-1)"""
+        grams = trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for word in self._grams.get(gram, ()):
+                overlap[word] = overlap.get(word, 0) + 1
+
+        matches = {}
+        for word, shared in overlap.items():
+            score = 2.0 * shared / (len(grams) + len(word))
+            if len(token) >= 2 and word.startswith(token):
+                # Palabra cortada por el reconocimiento de voz ("Berm")
+                score = max(score, 0.8 + 0.2 * len(token) / len(word))
+            if word != token:
+                # Solo la palabra exacta llega a 1
+                score = min(score, PHONETIC_SIMILARITY)
+            if score >= SEARCH_MIN_SIMILARITY:
+                matches[word] = score
+        if token.isalpha():
+            for word in self._phonetic.get(phonetic_key(token), ()):
+                if matches.get(word, 0) < PHONETIC_SIMILARITY:
+                    matches[word] = 1.0 if word == token else PHONETIC_SIMILARITY
+        return matches
+
+    def _similar_phones(self, digits):
+        """Ids de las filas cuyo teléfono contiene digits -> similitud (0-1)"""
+        candidates = None
+        for gram in trigrams(digits) if len(digits) >= 3 else ():
+            if gram[0] == " " or gram[-1] == " ":
+                continue
+            ids = self._phone_grams.get(gram, set())
+            candidates = set(ids) if candidates is None else candidates & ids
+            if not candidates:
+                return {}
+        if candidates is None:
+            return {}
+        matches = {}
+        for item_id in candidates:
+            phone = self._phones[item_id]
+            if digits in phone:
+                matches[item_id] = 1.0 if phone.endswith(digits) or phone == digits else 0.9
+        return matches
+
+    def search(self, query, limit=SEARCH_DEFAULT_LIMIT):
+        """Top-k filas para query como [(score, fila)], de mayor a menor"""
+        tokens = text_tokens(query, min_length=1)
+        if self.phone_field:
+            words = [token for token in tokens if not token.isdigit()]
+            # Los dígitos se buscan juntos: "55 1234" es un solo teléfono
+            digits = "".join(token for token in tokens if token.isdigit())
+        else:
+            words, digits = tokens, ""
+        terms = len(words) + (1 if digits else 0)
+        if not terms:
+            return []
+        with self._lock:
+            scores = {}
+            if digits:
+                scores.update(self._similar_phones(digits))
+            for token in words:
+                best = {}
+                for word, similarity in self._similar_words(token).items():
+                    for item_id in self._postings[word]:
+                        if similarity > best.get(item_id, 0):
+                            best[item_id] = similarity
+                for item_id, similarity in best.items():
+                    scores[item_id] = scores.get(item_id, 0) + similarity
+
+            top = heapq.nsmallest(limit, scores.items(), key=lambda row: (-row[1], row[0]))
+            return [(score / terms, self._items[item_id]) for item_id, score in top]
+
+
+_search_indexes = {}
+_search_indexes_lock = threading.Lock()
+
+
+def get_collection_search(name):
+    """
+    Índice de búsqueda de la colección, creado y poblado en la primera
+    consulta. Antes de cada consulta se revisa si otro worker cambió la
+    colección (ver refresh); si cambió, el índice se reconstruye.
+    """
+    index = _search_indexes.get(name)
+    if index is None:
+        with _search_indexes_lock:
+            index = _search_indexes.get(name)
+            if index is None:
+                index = get_collection(name).subscribe(CollectionSearchIndex(COLLECTIONS[name]))
+                _search_indexes[name] = index
+    get_collection(name).refresh()
+    return index
+
+
+def collection_search_response(name):
+    """
+    Busca en los campos de búsqueda de la colección tolerando acentos y
+    errores de transcripción: /api/personas/search?q=arturo bermudes&limit=5
+    """
+    try:
+        q = (request.args.get("q") or "").strip()
+        if not q:
+            return jsonify({"error": "q es requerido"}), 400
+        try:
+            limit = int(request.args.get("limit", SEARCH_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({"error": "limit debe ser un entero"}), 400
+        if not 1 <= limit <= SEARCH_MAX_LIMIT:
+            return jsonify({"error": f"limit debe estar entre 1 y {SEARCH_MAX_LIMIT}"}), 400
+
+        results = get_collection_search(name).search(q, limit)
+        return jsonify({
+            "query": q,
+            "items": [dict(item, score=round(score, 3)) for score, item in results],
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ============================================================================
+# Feed de cambios de colecciones (/api/<coleccion>/changes)
+# ============================================================================
+
+# Cambios que se recuerdan por colección; un cliente más atrasado recibe "reset"
+CHANGES_BUFFER_SIZE = int(os.getenv("CHANGES_BUFFER_SIZE", "1000"))
+# Long-poll: espera por defecto y máxima (segundos)
+CHANGES_POLL_TIMEOUT = 25
+CHANGES_POLL_MAX_TIMEOUT = 60
+# Con Flask, un stream SSE ocupa un hilo del worker: se corta a los
+# CHANGES_STREAM_SECONDS y el navegador reconecta solo, con Last-Event-ID.
+# asgi.py sirve /changes sin hilos y no tiene este límite.
+CHANGES_STREAM_SECONDS = float(os.getenv("CHANGES_STREAM_SECONDS", "25"))
+CHANGES_HEARTBEAT_SECONDS = 15
+# Cada cuánto se revisa si otro proceso cambió la colección mientras se espera
+CHANGES_RECHECK_SECONDS = 5
+CHANGES_RETRY_MS = 3000
+
+
+class ChangeFeed:
+    """
+    Últimos insert/update/delete de una colección en un buffer circular,
+    numerados con una versión que solo crece. Es un observador más de la
+    colección, así que registra cualquier escritura (API, importaciones,
+    herramientas del agente). Las versiones arrancan en el reloj del
+    proceso (ms) para que sigan creciendo tras un reinicio; pedir desde una
+    versión que ya salió del buffer, que es de otro proceso o anterior a una
+    recarga desde disco devuelve None: el cliente debe recargar el listado.
+    """
+
+    # No necesita las filas al suscribirse (ver CollectionEvents.subscribe)
+    needs_items = False
+
+    def __init__(self, size=CHANGES_BUFFER_SIZE):
+        self._changes = deque(maxlen=size)
+        self._cond = threading.Condition()
+        self.version = int(time.time() * 1000)
+        self._subscribed = False
+        # Callbacks sin argumentos que se llaman con cada cambio (ver asgi.py)
+        self._listeners = set()
+
+    def _notify(self):
+        self._cond.notify_all()
+        for listener in self._listeners:
+            listener()
+
+    def add_listener(self, listener):
+        with self._cond:
+            self._listeners.add(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            self._listeners.discard(listener)
+
+    def reset(self, items):
+        with self._cond:
+            if self._subscribed:
+                # La colección se recargó (la cambió otro proceso): no hay deltas
+                self.version += 1
+                self._changes.clear()
+                self._notify()
+            self._subscribed = True
+
+    def apply(self, op, old, new):
+        item = new if new is not None else old
+        with self._cond:
+            self.version += 1
+            self._changes.append({
+                "version": self.version,
+                "op": op,
+                "id": item["id"],
+                "item": new.to_dict() if new is not None else None,
+            })
+            self._notify()
+
+    def _since(self, version):
+        if version > self.version:
+            return None
+        # Las versiones del buffer son consecutivas y terminan en self.version
+        start = len(self._changes) - (self.version - version)
+        if start < 0:
+            return None
+        return list(itertools.islice(self._changes, start, None))
+
+    def since(self, version):
+        """Cambios posteriores a version ([] si no hay) o None si hay que recargar"""
+        with self._cond:
+            return self._since(version)
+
+    def wait(self, version, timeout):
+        """Como since(), pero espera hasta timeout segundos a que haya algún cambio"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                changes = self._since(version)
+                remaining = deadline - time.monotonic()
+                if changes != [] or remaining <= 0:
+                    return changes
+                self._cond.wait(remaining)
+
+
+_change_feeds = {}
+_change_feeds_lock = threading.Lock()
+
+
+def get_change_feed(name):
+    """Feed de cambios de la colección, suscrito en el primer uso"""
+    feed = _change_feeds.get(name)
+    if feed is None:
+        with _change_feeds_lock:
+            feed = _change_feeds.get(name)
+            if feed is None:
+                feed = get_collection(name).subscribe(ChangeFeed())
+                _change_feeds[name] = feed
+    return feed
+
+
+def wait_for_changes(name, feed, version, timeout):
+    """
+    feed.wait() en tramos de CHANGES_RECHECK_SECONDS; entre tramos revisa
+    si otro worker cambió la colección (lo que llega al feed como un reset).
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        changes = feed.wait(version, max(0.0, min(CHANGES_RECHECK_SECONDS, remaining)))
+        if changes != [] or time.monotonic() >= deadline:
+            return changes
+        get_collection(name).refresh()
+
+
+def parse_changes_since(raw):
+    """Versión de ?since= o Last-Event-ID (None si no vino)"""
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        raise ValueError("since debe ser un entero") from None
+
+
+def parse_changes_timeout(raw):
+    """Espera del long-poll en segundos (?timeout=)"""
+    try:
+        timeout = float(raw) if raw is not None else CHANGES_POLL_TIMEOUT
+    except ValueError:
+        raise ValueError("timeout debe ser un número") from None
+    if not 0 <= timeout <= CHANGES_POLL_MAX_TIMEOUT:
+        raise ValueError(f"timeout debe estar entre 0 y {CHANGES_POLL_MAX_TIMEOUT}")
+    return timeout
+
+
+def changes_poll_payload(feed, since, changes):
+    """Respuesta del long-poll para un resultado de feed.since()/wait()"""
+    if changes is None:
+        return {"version": feed.version, "reset": True, "changes": []}
+    return {"version": changes[-1]["version"] if changes else since, "changes": changes}
+
+
+def change_events(feed, version, changes):
+    """
+    Eventos SSE para un resultado de feed.since()/wait(): un "change" por
+    cambio (id = su versión) o "reset" si el cliente quedó demasiado
+    atrasado. Devuelve (texto, versión desde la que seguir).
+    """
+    if changes is None:
+        version = feed.version
+        return f"id: {version}\n" + sse_event("reset", {"version": version}), version
+    text = "".join(f"id: {change['version']}\n" + sse_event("change", change) for change in changes)
+    return text, changes[-1]["version"] if changes else version
+
+
+def iter_change_events(name, feed, version):
+    """
+    Stream SSE (ver change_events). Comentarios periódicos mantienen viva
+    la conexión a través de proxies.
+    """
+    yield f"retry: {CHANGES_RETRY_MS}\n\n"
+    deadline = time.monotonic() + CHANGES_STREAM_SECONDS
+    last_sent = time.monotonic()
+    while time.monotonic() < deadline:
+        changes = wait_for_changes(name, feed, version, min(CHANGES_RECHECK_SECONDS, deadline - time.monotonic()))
+        if changes != []:
+            text, version = change_events(feed, version, changes)
+            yield text
+        elif time.monotonic() - last_sent >= CHANGES_HEARTBEAT_SECONDS:
+            yield ": ping\n\n"
+        else:
+            continue
+        last_sent = time.monotonic()
+
+
+def collection_changes_response(name):
+    """
+    Cambios de la colección posteriores a ?since=<versión> (el listado la
+    informa en X-Collection-Version).
+    - Con Accept: text/event-stream: stream SSE (ver iter_change_events);
+      al reconectar, Last-Event-ID tiene prioridad sobre since.
+    - Si no, long-poll: espera hasta ?timeout= segundos (25 por defecto) y
+      responde {"version", "changes": [...]}, o {"version", "reset": true}
+      si hay que recargar el listado. Sin since devuelve la versión actual.
+    """
+    try:
+        feed = get_change_feed(name)
+        try:
+            since = parse_changes_since(request.headers.get("Last-Event-ID") or request.args.get("since"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if "text/event-stream" in (request.headers.get("Accept") or ""):
+            start = feed.version if since is None else since
+            return app.response_class(
+                stream_with_context(iter_change_events(name, feed, start)),
+                mimetype="text/event-stream",
+                headers=SSE_HEADERS,
+            )
+
+        if since is None:
+            return jsonify({"version": feed.version, "changes": []})
+        try:
+            timeout = parse_changes_timeout(request.args.get("timeout"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(changes_poll_payload(feed, since, wait_for_changes(name, feed, since, timeout)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ============================================================================
+# Estadísticas de gastos
+# ============================================================================
+
+# Palabras que no forman grupo en group_by=keyword
+GASTOS_STOPWORDS = frozenset(
+    "con del las los para por una uno unos unas que sin sobre entre "
+    "the and for".split()
+)
+GASTOS_GROUP_BY = ("keyword", "day", "month")
+SIN_FECHA = "sin_fecha"
+
+
+def gasto_groups(item):
+    """Claves de grupo (dimensión, valor) a las que aporta un gasto"""
+    fecha = item.get("fecha") or ""
+    keys = [("keyword", token) for token in text_tokens(item.get("descripcion"))
+            if token not in GASTOS_STOPWORDS]
+    keys.append(("day", fecha[:10] or SIN_FECHA))
+    keys.append(("month", fecha[:7] or SIN_FECHA))
+    return keys
+
+
+def _money(value):
+    return round(value, 2)
+
+
+class GastosStats:
+    """
+    Totales de gastos mantenidos de forma incremental: se suscribe a la
+    colección y aplica cada insert/update/delete como un delta, así que
+    leerlos nunca recorre la colección. min/max usan un conteo por valor más
+    la lista ordenada de valores distintos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset([])
+
+    @staticmethod
+    def _amount(item):
+        try:
+            return float(item.get("gasto") or 0)
+        except (TypeError, ValueError):
+            return 0.0
+
+    def reset(self, items):
+        with self._lock:
+            self.count = 0
+            self.total = 0.0
+            self._value_counts = {}
+            self._values = []
+            self._groups = {dim: {} for dim in GASTOS_GROUP_BY}
+            for item in items:
+                self._add(item, 1)
+
+    def apply(self, op, old, new):
+        with self._lock:
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, 1)
+
+    def _add(self, item, sign):
+        amount = self._amount(item)
+        self.count += sign
+        self.total += sign * amount
+
+        seen = self._value_counts.get(amount, 0) + sign
+        if seen <= 0:
+            self._value_counts.pop(amount, None)
+            index = bisect.bisect_left(self._values, amount)
+            if index < len(self._values) and self._values[index] == amount:
+                del self._values[index]
+        else:
+            if seen == 1 and sign > 0:
+                bisect.insort(self._values, amount)
+            self._value_counts[amount] = seen
+
+        for dim, key in gasto_groups(item):
+            groups = self._groups[dim]
+            count, total = groups.get(key, (0, 0.0))
+            count += sign
+            if count <= 0:
+                groups.pop(key, None)
+            else:
+                groups[key] = (count, total + sign * amount)
+
+    @staticmethod
+    def _summary(count, total):
+        return {
+            "count": count,
+            "total": _money(total),
+            "avg": _money(total / count) if count else None,
+        }
+
+    def totals(self):
+        with self._lock:
+            summary = self._summary(self.count, self.total)
+            summary["min"] = self._values[0] if self._values else None
+            summary["max"] = self._values[-1] if self._values else None
+        return summary
+
+    def group(self, dim, key):
+        with self._lock:
+            count, total = self._groups[dim].get(key, (0, 0.0))
+        return self._summary(count, total)
+
+    def groups(self, dim):
+        with self._lock:
+            rows = list(self._groups[dim].items())
+        rows.sort(key=lambda row: (-row[1][1], row[0]))
+        return [dict(self._summary(count, total), key=key) for key, (count, total) in rows]
+
+
+_gastos_stats = None
+_gastos_stats_lock = threading.Lock()
+
+
+def get_gastos_stats():
+    """
+    Agregador de gastos, creado y poblado en la primera consulta. Antes de
+    devolverlo se revisa si otro worker cambió la colección (ver refresh).
+    """
+    global _gastos_stats
+    if _gastos_stats is None:
+        with _gastos_stats_lock:
+            if _gastos_stats is None:
+                _gastos_stats = get_collection("gastos").subscribe(GastosStats())
+    get_collection("gastos").refresh()
+    return _gastos_stats
+
+
+@app.get("/api/gastos/stats")
+def api_gastos_stats():
+    """
+    Totales de gastos: count, total, min, max y avg.
+    ?keyword=cafe  -> totales de los gastos cuya descripción contiene esa palabra
+    ?group_by=keyword|day|month -> además, los grupos ordenados por total
+    """
+    try:
+        stats = get_gastos_stats()
+        body = stats.totals()
+
+        keyword = (request.args.get("keyword") or "").strip()
+        if keyword:
+            tokens = text_tokens(keyword, min_length=1)
+            if len(tokens) != 1:
+                return jsonify({"error": "keyword debe ser una sola palabra"}), 400
+            body["keyword"] = dict(stats.group("keyword", tokens[0]), key=tokens[0])
+
+        group_by = request.args.get("group_by")
+        if group_by:
+            if group_by not in GASTOS_GROUP_BY:
+                return jsonify({
+                    "error": f"group_by debe ser uno de: {', '.join(GASTOS_GROUP_BY)}"
+                }), 400
+            body["group_by"] = group_by
+            body["groups"] = stats.groups(group_by)
+
+        return jsonify(body)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ============================================================================
+# Importación y exportación en lote (NDJSON / CSV)
+# ============================================================================
+
+# Filas por escritura a la colección durante una importación
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+# Errores por fila que se devuelven (el resto solo se cuenta)
+BULK_MAX_ERRORS = 100
+# Filas por chunk de la respuesta de exportación
+BULK_EXPORT_CHUNK = 500
+
+BULK_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+# Content-Type genéricos (o el que manda curl --data-binary sin -H): se leen como NDJSON
+BULK_GENERIC_TYPES = ("", "application/octet-stream", "application/x-www-form-urlencoded")
+
+
+def bulk_import_format():
+    """
+    Formato del body: ?format= o, si no viene, el Content-Type. Devuelve
+    None si el Content-Type no es uno de BULK_FORMATS ni genérico.
+    """
+    fmt = request.args.get("format")
+    if fmt:
+        return fmt.lower()
+    mimetype = request.mimetype or ""
+    for name, content_type in BULK_FORMATS.items():
+        if mimetype == content_type:
+            return name
+    return "ndjson" if mimetype in BULK_GENERIC_TYPES else None
+
+
+def iter_bulk_rows(fmt, stream):
+    """Recorre el body fila a fila como (número de línea, dict o ValueError)"""
+    if fmt == "json":
+        data = json.load(stream)
+        rows = data.get("items", []) if isinstance(data, dict) else data
+        for index, row in enumerate(rows, 1):
+            yield index, row if isinstance(row, dict) else ValueError("cada fila debe ser un objeto")
+    elif fmt == "csv":
+        lines = (line.decode("utf-8-sig") for line in stream)
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_no, raw in enumerate(stream, 1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                yield line_no, ValueError("JSON inválido")
+                continue
+            yield line_no, row if isinstance(row, dict) else ValueError("cada fila debe ser un objeto")
+
+
+def collection_import_response(name):
+    """
+    Valida cada fila con las mismas reglas que el POST individual y guarda
+    las válidas de a BULK_BATCH_SIZE. Las filas inválidas no frenan la
+    importación: se informan con su número de línea.
+    """
+    fmt = bulk_import_format()
+    if fmt is None:
+        return jsonify({
+            "error": f"Content-Type no soportado: {request.mimetype}; se acepta {', '.join(BULK_FORMATS.values())} o ?format="
+        }), 415
+    if fmt not in BULK_FORMATS:
+        return jsonify({"error": f"format debe ser uno de: {', '.join(BULK_FORMATS)}"}), 400
+
+    collection = get_collection(name)
+    validate = COLLECTIONS[name].validate
+    batch, errors = [], []
+    rows = inserted = error_count = 0
+    try:
+        # Con buffer: leer línea a línea del stream crudo va casi de a byte
+        stream = io.BufferedReader(request.stream, 1 << 16)
+        for line, row in iter_bulk_rows(fmt, stream):
+            rows += 1
+            try:
+                if isinstance(row, ValueError):
+                    raise row
+                batch.append(validate(row))
+            except ValueError as e:
+                error_count += 1
+                if len(errors) < BULK_MAX_ERRORS:
+                    errors.append({"line": line, "error": str(e)})
+                continue
+            if len(batch) >= BULK_BATCH_SIZE:
+                collection.insert_many(batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            collection.insert_many(batch)
+            inserted += len(batch)
+    except (ValueError, csv.Error) as e:
+        # Body ilegible (JSON o CSV roto): lo ya guardado se mantiene
+        return jsonify({
+            "error": f"No se pudo leer el body: {e}",
+            "rows": rows,
+            "inserted": inserted,
+        }), 400
+    except Exception as e:
+        return jsonify({"error": str(e), "rows": rows, "inserted": inserted}), 500
+
+    return jsonify({
+        "rows": rows,
+        "inserted": inserted,
+        "error_count": error_count,
+        "errors": errors,
+    })
+
+
+def iter_export_chunks(name, fmt, items):
+    """Genera la exportación de a BULK_EXPORT_CHUNK filas sin armarla entera en memoria"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLLECTIONS[name].export_fields, extrasaction="ignore")
+        writer.writeheader()
+        for count, item in enumerate(items, 1):
+            writer.writerow(item)
+            if count % BULK_EXPORT_CHUNK == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        chunk = []
+        for item in items:
+            chunk.append(json.dumps(item.to_dict(), ensure_ascii=False))
+            if len(chunk) >= BULK_EXPORT_CHUNK:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+
+def collection_export_response(name):
+    fmt = (request.args.get("format") or "ndjson").lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format debe ser ndjson o csv"}), 400
+
+    items = get_collection(name).iter_items()
+    response = app.response_class(
+        stream_with_context(iter_export_chunks(name, fmt, items)),
+        mimetype=BULK_FORMATS[fmt],
+    )
+    response.headers["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+
+# ============================================================================
+# Colecciones: personas y gastos
+# ============================================================================
+
+PERSONAS = register_collection(CollectionSchema(
+    "personas",
+    fields=[
+        Field("nombre", required=True, filter="prefix", sortable=True, search="text"),
+        Field("apellido", required=True, filter="prefix", sortable=True, search="text"),
+        Field("telefono", required=True, filter="prefix", sortable=True, search="phone"),
+    ],
+    path=PERSONAS_PATH,
+    not_found="Persona no encontrada",
+    required_message="nombre, apellido y telefono son requeridos",
+))
+
+GASTOS = register_collection(CollectionSchema(
+    "gastos",
+    fields=[
+        Field("descripcion", required="descripcion es requerida", filter="contains",
+              sortable=True, search="text"),
+        Field("gasto", "number", filters={"gasto_min": "min", "gasto_max": "max"}, sortable=True),
+        Field("fecha", "date", default=lambda: datetime.now().strftime("%Y-%m-%d")),
+    ],
+    path=GASTOS_PATH,
+    not_found="Gasto no encontrado",
+))
+
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+REALTIME_SESSIONS_URL = f"{OPENAI_BASE_URL}/realtime/sessions"
+
+
+def build_session_config():
+    """Arma el cuerpo para POST /v1/realtime/sessions a partir de settings y tools"""
+    return get_agent_config().session_config()
+
+
+def realtime_session_headers(api_key):
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "OpenAI-Beta": "realtime=v1",
+    }
+
+
+# ============================================================================
+# Cliente OpenAI compartido
+# ============================================================================
+
+# Un solo cliente (y pool de conexiones) por worker para /api/chat y /api/session
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+OPENAI_POOL_MAXSIZE = int(os.getenv("OPENAI_POOL_MAXSIZE", "20"))
+OPENAI_KEEPALIVE = int(os.getenv("OPENAI_KEEPALIVE", "10"))
+REALTIME_SESSION_TIMEOUT = 15
+
+_OpenAIHandle = namedtuple("_OpenAIHandle", "key client http")
+_openai_handle = None
+_openai_lock = threading.Lock()
+_dotenv_state = [file_stat_key(DOTENV_PATH), time.monotonic()]
+
+
+def openai_api_key():
+    """
+    OPENAI_API_KEY actual. Si el .env cambió (se rotó la clave) se vuelve a
+    cargar sin reiniciar; se revisa como mucho cada CONFIG_RECHECK_SECONDS.
+    """
+    now = time.monotonic()
+    if now - _dotenv_state[1] >= CONFIG_RECHECK_SECONDS:
+        stat_key = file_stat_key(DOTENV_PATH)
+        if stat_key != _dotenv_state[0]:
+            if stat_key is not None:
+                load_env_file(DOTENV_PATH, override=True)
+            _dotenv_state[0] = stat_key
+        _dotenv_state[1] = now
+    return os.getenv("OPENAI_API_KEY")
+
+
+def openai_timeout():
+    import httpx
+
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+def get_openai_handle():
+    """
+    Cliente OpenAI + cliente httpx que comparten el pool de conexiones. Se
+    crean en el primer uso y se rehacen si cambian la API key o la base URL;
+    en ese caso también se descartan las sesiones Realtime pre-creadas.
+    """
+    global _openai_handle
+    key = (openai_api_key(), OPENAI_BASE_URL)
+    handle = _openai_handle
+    if handle is not None and handle.key == key:
+        return handle
+    with _openai_lock:
+        handle = _openai_handle
+        if handle is not None and handle.key == key:
+            return handle
+        import httpx
+        from openai import OpenAI
+
+        http = httpx.Client(
+            timeout=openai_timeout(),
+            limits=httpx.Limits(
+                max_connections=OPENAI_POOL_MAXSIZE,
+                max_keepalive_connections=OPENAI_KEEPALIVE,
+            ),
+        )
+        client = OpenAI(
+            api_key=key[0],
+            base_url=OPENAI_BASE_URL,
+            http_client=http,
+            timeout=openai_timeout(),
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+        rotated = handle is not None
+        # El cliente anterior no se cierra: puede tener requests en vuelo
+        _openai_handle = handle = _OpenAIHandle(key, client, http)
+    if rotated:
+        app.logger.info("OPENAI_API_KEY u OPENAI_BASE_URL cambió; se renueva el cliente")
+        realtime_session_pool.flush()
+    return handle
+
+
+def get_openai_client():
+    return get_openai_handle().client
+
+
+def mint_realtime_session(api_key):
+    """POST /v1/realtime/sessions; lanza httpx.HTTPStatusError si OpenAI responde con error"""
+    with upstream_timer("openai_session") as call:
+        r = get_openai_handle().http.post(
+            REALTIME_SESSIONS_URL,
+            headers=realtime_session_headers(api_key),
+            json=build_session_config(),
+            timeout=REALTIME_SESSION_TIMEOUT,
+        )
+        call["status"] = r.status_code
+    r.raise_for_status()
+    return r.json()
+
+
+# ============================================================================
+# Pool de sesiones Realtime pre-creadas
+# ============================================================================
+
+# 0 desactiva el pool; cada worker mantiene el suyo
+REALTIME_SESSION_POOL_SIZE = int(os.getenv("REALTIME_SESSION_POOL_SIZE", "0"))
+# Segundos mínimos de vida que le deben quedar al client_secret para entregarlo
+REALTIME_SESSION_MIN_TTL = float(os.getenv("REALTIME_SESSION_MIN_TTL", "20"))
+# Sin pedidos durante este tiempo el pool deja de reponer sesiones
+REALTIME_SESSION_POOL_IDLE = float(os.getenv("REALTIME_SESSION_POOL_IDLE", "300"))
+REALTIME_SESSION_DEFAULT_TTL = 60
+
+_PooledSession = namedtuple("_PooledSession", "config_key expires_at data")
+
+
+def realtime_config_key():
+    """Identifica la versión de settings/tools con la que se creó una sesión"""
+    return (settings_store.version, tools_store.version)
+
+
+class RealtimeSessionPool:
+    """
+    Mantiene hasta `size` sesiones efímeras ya creadas para la configuración
+    actual. Un hilo en segundo plano las repone; las que están por expirar o
+    se crearon con otra versión de settings/tools se descartan.
+    """
+
+    def __init__(self, size, min_ttl, idle_timeout):
+        self.size = size
+        self.min_ttl = min_ttl
+        self.idle_timeout = idle_timeout
+        self._sessions = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_demand = 0.0
+        self.minted = 0
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.errors = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def _prune(self, config_key, now):
+        fresh = deque()
+        for session in self._sessions:
+            if session.config_key == config_key and session.expires_at - now >= self.min_ttl:
+                fresh.append(session)
+            else:
+                self.discarded += 1
+        self._sessions = fresh
+
+    def take(self):
+        """Entrega una sesión lista o None (el llamador la crea en línea)"""
+        if not self.enabled:
+            return None
+        config_key = realtime_config_key()
+        with self._cond:
+            self._last_demand = time.monotonic()
+            self._ensure_thread()
+            self._prune(config_key, time.time())
+            session = self._sessions.popleft() if self._sessions else None
+            if session is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._cond.notify()
+        return session.data if session else None
+
+    def flush(self):
+        with self._cond:
+            self.discarded += len(self._sessions)
+            self._sessions.clear()
+            self._cond.notify()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="realtime-session-pool", daemon=True)
+            self._thread.start()
+
+    def _needs_refill(self, config_key):
+        self._prune(config_key, time.time())
+        idle = time.monotonic() - self._last_demand > self.idle_timeout
+        return not idle and len(self._sessions) < self.size
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            config_key = realtime_config_key()
+            with self._cond:
+                if not self._needs_refill(config_key):
+                    # Despertar periódicamente para descartar sesiones por expirar
+                    self._cond.wait(timeout=5)
+                    continue
+            api_key = openai_api_key()
+            try:
+                if not api_key:
+                    raise RuntimeError("OPENAI_API_KEY is not set on the server")
+                data = mint_realtime_session(api_key)
+            except Exception as e:
+                self.errors += 1
+                app.logger.warning("No se pudo pre-crear una sesión Realtime: %s", e)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+            secret = data.get("client_secret") or {}
+            expires_at = secret.get("expires_at") or time.time() + REALTIME_SESSION_DEFAULT_TTL
+            with self._cond:
+                self.minted += 1
+                self._sessions.append(_PooledSession(config_key, expires_at, data))
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "available": len(self._sessions),
+            "minted": self.minted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "discarded": self.discarded,
+            "errors": self.errors,
+        }
+
+
+realtime_session_pool = RealtimeSessionPool(
+    REALTIME_SESSION_POOL_SIZE, REALTIME_SESSION_MIN_TTL, REALTIME_SESSION_POOL_IDLE
+)
+
+
+@app.get("/api/session/pool")
+def api_session_pool():
+    """Estado del pool de sesiones Realtime pre-creadas"""
+    return jsonify(realtime_session_pool.stats())
+
+
 @app.get("/api/session")
 def api_session():
     """
     Crea una sesión efímera para conectar al Realtime API por WebRTC.
     Devuelve JSON con client_secret.value (token de corta duración).
+    Si el pool está activo, entrega una sesión ya creada sin esperar a OpenAI.
     """
-    settings = read_settings()
-    tools_data = read_tools()
-    
-    model = settings.get("realtime_model", DEFAULT_SETTINGS["realtime_model"])
-    voice = settings.get("voice", DEFAULT_SETTINGS["voice"])
-    api_key = os.getenv("OPENAI_API_KEY")
+    api_key = openai_api_key()
     if not api_key:
         return jsonify({"error": "OPENAI_API_KEY is not set on the server"}), 500
 
-    # Obtener herramientas del sistema activas
-    system_tools = [
-        {
-            "type": "function",
-            "name": tool["name"],
-            "description": tool["description"],
-            "parameters": tool["parameters"]
-        }
-        for tool in tools_data.get("system_tools", [])
-        if tool.get("enabled", False)
-    ]
-    
-    # Obtener herramientas personalizadas activas
-    custom_tools = [
-        {
-            "type": "function",
-            "name": tool["name"],
-            "description": tool["description"],
-            "parameters": tool["parameters"]
-        }
-        for tool in tools_data.get("tools", [])
-        if tool.get("enabled", False)
-    ]
-    
-    # Combinar todas las herramientas
-    active_tools = system_tools + custom_tools
+    pooled = realtime_session_pool.take()
+    if pooled is not None:
+        return jsonify(pooled)
 
-    # Reemplazar marcadores de fecha en el system_prompt
-    system_prompt = replace_date_placeholders(settings.get("system_prompt", DEFAULT_SETTINGS["system_prompt"]))
-    
-    session_config = {
-        "model": model,
-        "voice": voice,
-        "instructions": system_prompt,
-        "turn_detection": {"type": "server_vad"},
-        "modalities": ["audio", "text"],
-        "input_audio_transcription": {"model": "gpt-4o-mini-transcribe"}
-    }
-    
-    # Agregar herramientas solo si hay alguna activa
-    if active_tools:
-        session_config["tools"] = active_tools
-
-    try:
-        r = requests.post(
-            "https://api.openai.com/v1/realtime/sessions",
-            headers={
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-                "OpenAI-Beta": "realtime=v1",
-            },
-            json=session_config,
-            timeout=15,
-        )
-        r.raise_for_status()
-        return jsonify(r.json())
-    except requests.HTTPError as e:
+    import httpx
+
+    try:
+        return jsonify(mint_realtime_session(api_key))
+    except httpx.HTTPStatusError as e:
         return jsonify({
             "error": f"OpenAI error: {e}",
             "details": getattr(e.response, "text", "")
@@ -907,55 +3391,966 @@ def api_session():
         return jsonify({"error": str(e)}), 500
 
 
+# ============================================================================
+# Contexto del chat: presupuesto de tokens y resumen del historial
+# ============================================================================
+
+# Tokens máximos (system + historial + mensaje) que se envían al modelo
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))
+# Al recortar se deja el historial reciente en esta fracción del presupuesto,
+# para que el resumen no se rehaga en cada turno
+CHAT_CONTEXT_KEEP_RATIO = float(os.getenv("CHAT_CONTEXT_KEEP_RATIO", "0.6"))
+# "0" solo descarta los turnos viejos, sin resumirlos
+CHAT_SUMMARY_ENABLED = os.getenv("CHAT_SUMMARY_ENABLED", "1") != "0"
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+CHAT_SUMMARY_CACHE_SIZE = int(os.getenv("CHAT_SUMMARY_CACHE_SIZE", "1000"))
+
+# Formato de Chat Completions: tokens extra por mensaje y para el cebado de la respuesta
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+ChatRequest = namedtuple(
+    "ChatRequest",
+    "messages model temperature context conversation_id message history history_stored",
+)
+_ChatSummary = namedtuple("_ChatSummary", "count digest text")
+
+_token_encoders = {}
+_token_fallback_logged = False
+
+
+def _token_encoder(model):
+    """
+    Encoder de tiktoken para el modelo, o None si no se pudo cargar: tiktoken
+    no instalado o sin acceso para descargar su vocabulario la primera vez.
+    """
+    global _token_fallback_logged
+    if model not in _token_encoders:
+        try:
+            import tiktoken
+
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            encoder = None
+            if not _token_fallback_logged:
+                _token_fallback_logged = True
+                app.logger.warning(
+                    "tiktoken no disponible (%s): los tokens del chat se estiman "
+                    "como 1 cada 4 caracteres", e,
+                )
+        _token_encoders[model] = encoder
+    return _token_encoders[model]
+
+
+def count_tokens(text, model):
+    encoder = _token_encoder(model)
+    if encoder is None:
+        # Aproximación sin tiktoken: ~4 caracteres por token
+        return (len(text) + 3) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model):
+    return sum(count_tokens(m["content"], model) + TOKENS_PER_MESSAGE for m in messages)
+
+
+def history_digest(history):
+    return hashlib.sha1(json.dumps(history, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ChatSummaryCache:
+    """
+    Resumen de los turnos viejos por conversation_id (LRU). Guarda cuántos
+    mensajes cubre y el hash de ese prefijo: si el cliente manda el mismo
+    historial, el resumen se reutiliza sin volver a llamar al modelo.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id, history):
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._entries.move_to_end(conversation_id)
+        if entry is None or entry.count > len(history) or history_digest(history[:entry.count]) != entry.digest:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def put(self, conversation_id, history, count, text):
+        entry = _ChatSummary(count, history_digest(history[:count]), text)
+        with self._lock:
+            self._entries[conversation_id] = entry
+            self._entries.move_to_end(conversation_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, conversation_id):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+
+chat_summary_cache = ChatSummaryCache(CHAT_SUMMARY_CACHE_SIZE)
+
+
+def summarize_history(model, previous_summary, messages):
+    """Pide al modelo un resumen breve de `messages` (más el resumen anterior)"""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous_summary:
+        transcript = f"Resumen previo:\n{previous_summary}\n\nContinuación:\n{transcript}"
+    with upstream_timer("openai_summary", model):
+        resp = get_openai_client().chat.completions.create(
+            model=model,
+            temperature=0,
+            max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "Resume la conversación en pocas frases, en español. Conserva "
+                        "nombres, cifras, fechas, decisiones y pendientes; omite saludos."
+                    ),
+                },
+                {"role": "user", "content": transcript},
+            ],
+        )
+    return (resp.choices[0].message.content or "").strip()
+
+
+def summary_message(text):
+    return {"role": "system", "content": f"Resumen de la conversación anterior:\n{text}"}
+
+
+def fit_chat_context(system_message, history, user_message, model, conversation_id=None):
+    """
+    Devuelve (messages, context): system + [resumen] + turnos recientes +
+    mensaje actual dentro de CHAT_CONTEXT_TOKENS. Los turnos que no entran
+    se resumen (si hay conversation_id, el resumen queda en caché) o se
+    descartan. `context` informa los tokens enviados y los ahorrados.
+    """
+    fixed = count_message_tokens([system_message, user_message], model) + TOKENS_PER_REPLY
+    history_tokens = [count_message_tokens([m], model) for m in history]
+    original = fixed + sum(history_tokens)
+
+    start, summary = 0, None
+    cached = chat_summary_cache.get(conversation_id, history) if conversation_id else None
+    if cached is not None:
+        start, summary = cached.count, cached.text
+
+    def total(first, summary_text):
+        extra = count_message_tokens([summary_message(summary_text)], model) if summary_text else 0
+        return fixed + extra + sum(history_tokens[first:])
+
+    summarized = False
+    if total(start, summary) > CHAT_CONTEXT_TOKENS:
+        # Conservar los turnos más recientes que entren en la fracción KEEP_RATIO
+        keep_budget = CHAT_CONTEXT_TOKENS * CHAT_CONTEXT_KEEP_RATIO - fixed - CHAT_SUMMARY_MAX_TOKENS
+        cut, kept = len(history), 0
+        while cut > start and kept + history_tokens[cut - 1] <= keep_budget:
+            cut -= 1
+            kept += history_tokens[cut]
+        if CHAT_SUMMARY_ENABLED and conversation_id:
+            try:
+                summary = summarize_history(model, summary, history[start:cut])
+                chat_summary_cache.put(conversation_id, history, cut, summary)
+                summarized = True
+            except Exception as e:
+                app.logger.warning("No se pudo resumir el historial: %s", e)
+        start = cut
+
+    messages = [system_message]
+    if summary:
+        messages.append(summary_message(summary))
+    messages.extend(history[start:])
+    messages.append(user_message)
+    sent = total(start, summary)
+    return messages, {
+        "tokens": sent,
+        "tokens_original": original,
+        "tokens_saved": max(0, original - sent),
+        "dropped_messages": start,
+        "summarized": summarized,
+        "summary_cached": cached is not None and not summarized and summary is not None,
+    }
+
+
+# ============================================================================
+# Conversaciones guardadas en el servidor
+# ============================================================================
+
+# "memory" (LRU por worker) o "sqlite" (compartido entre workers)
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory").strip().lower()
+CONVERSATION_DB_PATH = Path(os.getenv("CONVERSATION_DB_PATH", str(INSTANCE_DIR / "conversations.sqlite3")))
+# Segundos sin actividad tras los que una conversación se descarta
+CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "86400"))
+# Topes del backend en memoria (por worker)
+CONVERSATION_MAX_CONVERSATIONS = int(os.getenv("CONVERSATION_MAX_CONVERSATIONS", "1000"))
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(32 * 1024 * 1024)))
+# Mensajes guardados por conversación; al pasarse se recorta a 3/4 de una
+# vez para que el resumen del historial no se invalide en cada turno
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "200"))
+# Número par: los turnos se guardan de a pares y lo conservado empieza por "user"
+CONVERSATION_TRIM_TO = max(2, CONVERSATION_MAX_MESSAGES * 3 // 8 * 2)
+CONVERSATION_ID_MAX_LENGTH = 128
+# Costo aproximado en bytes de cada mensaje además de su texto
+CONVERSATION_MESSAGE_OVERHEAD = 64
+
+
+def conversation_payload(conversation_id, messages, updated_at):
+    return {
+        "id": conversation_id,
+        "messages": messages,
+        "updated_at": datetime.utcfromtimestamp(updated_at).isoformat() + "Z",
+    }
+
+
+def trim_conversation(messages):
+    """Descarta los mensajes más viejos si se pasa de CONVERSATION_MAX_MESSAGES"""
+    if len(messages) <= CONVERSATION_MAX_MESSAGES:
+        return messages
+    return messages[-CONVERSATION_TRIM_TO:]
+
+
+def _messages_size(messages):
+    return sum(len(m["content"]) + CONVERSATION_MESSAGE_OVERHEAD for m in messages)
+
+
+_Conversation = namedtuple("_Conversation", "messages size updated_at")
+
+
+class MemoryConversationStore:
+    """
+    Conversaciones en un LRU del worker con expiración por inactividad y
+    topes de cantidad y de bytes. Con varios workers cada uno tiene el suyo:
+    para compartirlas usar CONVERSATION_BACKEND=sqlite.
+    """
+
+    def __init__(self, ttl, max_conversations, max_bytes):
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _expire(self, now):
+        # El LRU está ordenado por última actividad: basta mirar el frente
+        while self._entries:
+            conversation_id, entry = next(iter(self._entries.items()))
+            if now - entry.updated_at < self.ttl:
+                break
+            self._drop(conversation_id)
+
+    def _drop(self, conversation_id):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+        return entry
+
+    def _store(self, conversation_id, messages, now):
+        messages = trim_conversation(messages)
+        self._drop(conversation_id)
+        entry = _Conversation(messages, _messages_size(messages), now)
+        self._entries[conversation_id] = entry
+        self.bytes += entry.size
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_conversations or self.bytes > self.max_bytes
+        ):
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, conversation_id):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(conversation_id)
+            return conversation_payload(conversation_id, list(entry.messages), entry.updated_at)
+
+    def append(self, conversation_id, messages):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(conversation_id)
+            self._store(conversation_id, (entry.messages if entry else []) + messages, now)
+
+    def replace(self, conversation_id, messages):
+        with self._lock:
+            self._store(conversation_id, list(messages), time.time())
+
+    def delete(self, conversation_id):
+        with self._lock:
+            return self._drop(conversation_id) is not None
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.time())
+            return {
+                "backend": "memory",
+                "conversations": len(self._entries),
+                "bytes": self.bytes,
+                "evictions": self.evictions,
+            }
+
+
+class SqliteConversationStore:
+    """
+    Conversaciones en SQLite (modo WAL), compartidas por todos los workers.
+    Agregar un turno inserta solo sus filas; las conversaciones vencidas se
+    purgan como mucho una vez por minuto al escribir.
+    """
+
+    PURGE_INTERVAL = 60
+
+    def __init__(self, db_path, ttl):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._purged_at = 0.0
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_messages ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "conversation_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS conversation_messages_conversation "
+                "ON conversation_messages (conversation_id, seq)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS conversations_updated_at ON conversations (updated_at)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            ensure_parent_dir(self.db_path)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _delete(self, conn, where, params):
+        conn.execute(
+            "DELETE FROM conversation_messages WHERE conversation_id IN "
+            f"(SELECT id FROM conversations WHERE {where})",
+            params,
+        )
+        return conn.execute(f"DELETE FROM conversations WHERE {where}", params).rowcount
+
+    def _purge(self, conn, now):
+        if now - self._purged_at >= self.PURGE_INTERVAL:
+            self._purged_at = now
+            self._delete(conn, "updated_at < ?", (now - self.ttl,))
+
+    def _insert(self, conn, conversation_id, messages, now):
+        conn.executemany(
+            "INSERT INTO conversation_messages (conversation_id, role, content) VALUES (?, ?, ?)",
+            [(conversation_id, m["role"], m["content"]) for m in messages],
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO conversations (id, updated_at) VALUES (?, ?)",
+            (conversation_id, now),
+        )
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM conversation_messages WHERE conversation_id = ?",
+            (conversation_id,),
+        ).fetchone()
+        if count > CONVERSATION_MAX_MESSAGES:
+            conn.execute(
+                "DELETE FROM conversation_messages WHERE conversation_id = ? AND seq IN "
+                "(SELECT seq FROM conversation_messages WHERE conversation_id = ? ORDER BY seq LIMIT ?)",
+                (conversation_id, conversation_id, count - CONVERSATION_TRIM_TO),
+            )
+
+    def get(self, conversation_id):
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT updated_at FROM conversations WHERE id = ?", (conversation_id,)
+        ).fetchone()
+        if row is None or time.time() - row[0] >= self.ttl:
+            return None
+        rows = conn.execute(
+            "SELECT role, content FROM conversation_messages WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,),
+        )
+        messages = [{"role": role, "content": content} for role, content in rows]
+        return conversation_payload(conversation_id, messages, row[0])
+
+    def append(self, conversation_id, messages):
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            row = conn.execute(
+                "SELECT updated_at FROM conversations WHERE id = ?", (conversation_id,)
+            ).fetchone()
+            if row is not None and now - row[0] >= self.ttl:
+                self._delete(conn, "id = ?", (conversation_id,))
+            self._insert(conn, conversation_id, messages, now)
+
+    def replace(self, conversation_id, messages):
+        now = time.time()
+        with self._transaction() as conn:
+            self._purge(conn, now)
+            self._delete(conn, "id = ?", (conversation_id,))
+            self._insert(conn, conversation_id, trim_conversation(list(messages)), now)
+
+    def delete(self, conversation_id):
+        with self._transaction() as conn:
+            return self._delete(conn, "id = ?", (conversation_id,)) > 0
+
+    def stats(self):
+        (count,) = self._conn().execute(
+            "SELECT COUNT(*) FROM conversations WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()
+        return {"backend": "sqlite", "conversations": count}
+
+
+_conversation_store = None
+_conversation_store_lock = threading.Lock()
+
+
+def get_conversation_store():
+    """Store de conversaciones configurado (creado una sola vez)"""
+    global _conversation_store
+    if _conversation_store is None:
+        with _conversation_store_lock:
+            if _conversation_store is None:
+                if CONVERSATION_BACKEND == "sqlite":
+                    _conversation_store = SqliteConversationStore(CONVERSATION_DB_PATH, CONVERSATION_TTL)
+                elif CONVERSATION_BACKEND == "memory":
+                    _conversation_store = MemoryConversationStore(
+                        CONVERSATION_TTL, CONVERSATION_MAX_CONVERSATIONS, CONVERSATION_MAX_BYTES
+                    )
+                else:
+                    raise RuntimeError(f"CONVERSATION_BACKEND desconocido: {CONVERSATION_BACKEND}")
+    return _conversation_store
+
+
+def remember_chat_reply(chat, reply):
+    """
+    Guarda el turno (mensaje + respuesta) en la conversación. Si el cliente
+    mandó su propio `history`, la conversación guardada pasa a ser esa.
+    """
+    if not chat.conversation_id or reply is None:
+        return
+    turn = [{"role": "user", "content": chat.message}, {"role": "assistant", "content": reply}]
+    try:
+        store = get_conversation_store()
+        if chat.history_stored:
+            store.append(chat.conversation_id, turn)
+        else:
+            store.replace(chat.conversation_id, chat.history + turn)
+    except Exception as e:
+        # La respuesta ya se generó: no perderla por un fallo al guardar
+        app.logger.warning("No se pudo guardar la conversación %s: %s", chat.conversation_id, e)
+
+
+def build_chat_request(data):
+    """
+    Valida el body de /api/chat y arma un ChatRequest con el historial ya
+    recortado al presupuesto de tokens. Lanza ValueError si falta el mensaje.
+    """
+    message = (data.get("message") or "").strip()
+    if not message:
+        raise ValueError("message is required")
+    conversation_id = str(data.get("conversation_id") or "").strip() or None
+    if conversation_id and len(conversation_id) > CONVERSATION_ID_MAX_LENGTH:
+        raise ValueError("conversation_id is too long")
+
+    # Sin `history` explícito se usa la conversación guardada en el servidor
+    history = data.get("history")
+    history_stored = history is None and conversation_id is not None
+    if history_stored:
+        conversation = get_conversation_store().get(conversation_id)
+        history = conversation["messages"] if conversation else []
+
+    config = get_agent_config()
+    settings = config.settings
+    system_prompt = config.instructions()
+    model = settings.get("model", DEFAULT_SETTINGS["model"])
+    temperature = settings.get("temperature", DEFAULT_SETTINGS["temperature"])
+
+    # Only keep valid roles from history
+    turns = []
+    for m in history or []:
+        role = m.get("role")
+        content = m.get("content")
+        if role in ("user", "assistant") and isinstance(content, str):
+            turns.append({"role": role, "content": content})
+
+    # Compose messages for the Chat Completions API
+    messages, context = fit_chat_context(
+        {"role": "system", "content": system_prompt},
+        turns,
+        {"role": "user", "content": message},
+        model,
+        conversation_id,
+    )
+    chat_metrics.record_context(context)
+    return ChatRequest(messages, model, temperature, context, conversation_id, message, turns, history_stored)
+
+
+def chat_reply_payload(reply, context=None):
+    ts = datetime.utcnow().isoformat() + "Z"
+    payload = {"reply": reply, "timestamp": ts}
+    if context is not None:
+        # Tokens enviados al modelo y ahorrados al recortar/resumir el historial
+        payload["context"] = context
+    return payload
+
+
+# ============================================================================
+# Chat en streaming (SSE) y métricas de latencia
+# ============================================================================
+
+# Cuántas respuestas recientes se usan para los percentiles de /api/chat/metrics
+CHAT_METRICS_WINDOW = int(os.getenv("CHAT_METRICS_WINDOW", "500"))
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    # Que nginx no acumule el stream
+    "X-Accel-Buffering": "no",
+}
+
+
+def wants_chat_stream(data, accept=""):
+    """Streaming si el body trae "stream": true o el cliente acepta text/event-stream"""
+    return bool(data.get("stream")) or "text/event-stream" in (accept or "")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+class ChatMetrics:
+    """Latencias de /api/chat: totales acumulados y percentiles sobre una ventana"""
+
+    def __init__(self, window):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.streamed = 0
+        self.errors = 0
+        self.completion_tokens = 0
+        self.context_tokens_saved = 0
+        self.summarized = 0
+        self._ttft_ms = deque(maxlen=window)
+        self._total_ms = deque(maxlen=window)
+        self._tokens_per_sec = deque(maxlen=window)
+
+    def record(self, stream, total_ms, ttft_ms=None, tokens=None, tokens_per_sec=None, error=False):
+        with self._lock:
+            self.requests += 1
+            self.streamed += 1 if stream else 0
+            if error:
+                self.errors += 1
+                return
+            self._total_ms.append(total_ms)
+            if ttft_ms is not None:
+                self._ttft_ms.append(ttft_ms)
+            if tokens:
+                self.completion_tokens += tokens
+            if tokens_per_sec is not None:
+                self._tokens_per_sec.append(tokens_per_sec)
+
+    def record_context(self, context):
+        with self._lock:
+            self.context_tokens_saved += context["tokens_saved"]
+            self.summarized += 1 if context["summarized"] else 0
+
+    @staticmethod
+    def _summary(values):
+        values = sorted(values)
+        return {
+            "avg": round(sum(values) / len(values), 2) if values else None,
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "streamed": self.streamed,
+                "errors": self.errors,
+                "completion_tokens": self.completion_tokens,
+                "context_tokens_saved": self.context_tokens_saved,
+                "summarized": self.summarized,
+                "ttft_ms": self._summary(self._ttft_ms),
+                "total_ms": self._summary(self._total_ms),
+                "tokens_per_sec": self._summary(self._tokens_per_sec),
+            }
+
+
+chat_metrics = ChatMetrics(CHAT_METRICS_WINDOW)
+
+
+class ChatStreamMeter:
+    """Mide una respuesta en streaming: tiempo al primer token y tokens/seg"""
+
+    def __init__(self, model=""):
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.chunks = 0
+        self.usage_tokens = None
+        self.parts = []
+
+    def add_chunk(self, chunk):
+        """Procesa un chunk del SDK; devuelve el texto nuevo (o "")"""
+        usage = getattr(chunk, "usage", None)
+        if usage is not None and getattr(usage, "completion_tokens", None) is not None:
+            self.usage_tokens = usage.completion_tokens
+        text = "".join(
+            choice.delta.content for choice in (chunk.choices or [])
+            if choice.delta is not None and choice.delta.content
+        )
+        if text:
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.chunks += 1
+            self.parts.append(text)
+        return text
+
+    def reply(self):
+        return "".join(self.parts)
+
+    def finish(self):
+        """Registra la respuesta en chat_metrics y devuelve sus métricas"""
+        now = time.perf_counter()
+        # Sin usage (servidores compatibles que no lo mandan) cada chunk cuenta como un token
+        tokens = self.usage_tokens if self.usage_tokens is not None else self.chunks
+        ttft_ms = (self.first_token_at - self.started) * 1000 if self.first_token_at else None
+        generation = now - (self.first_token_at or self.started)
+        tokens_per_sec = tokens / generation if tokens and generation > 0 else None
+        metrics = {
+            "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+            "total_ms": round((now - self.started) * 1000, 2),
+            "completion_tokens": tokens,
+            "tokens_per_sec": round(tokens_per_sec, 2) if tokens_per_sec is not None else None,
+        }
+        chat_metrics.record(True, metrics["total_ms"], ttft_ms, tokens, tokens_per_sec)
+        observe_upstream("openai_chat", self.model, 200, now - self.started)
+        return metrics
+
+    def fail(self, error):
+        elapsed = time.perf_counter() - self.started
+        chat_metrics.record(True, elapsed * 1000, error=True)
+        observe_upstream("openai_chat", self.model, upstream_status(error), elapsed, error)
+
+
+def chat_stream_kwargs(model, messages, temperature):
+    return {
+        "model": model,
+        "messages": messages,
+        "temperature": temperature,
+        "stream": True,
+        "stream_options": {"include_usage": True},
+    }
+
+
+def iter_chat_stream(client, chat):
+    """
+    Eventos SSE de una respuesta en streaming (`chat` es un ChatRequest):
+      event: delta  data: {"content": "..."}   (uno por fragmento)
+      event: done   data: {"reply", "timestamp", "context", "metrics"}
+      event: error  data: {"error": "..."}
+    """
+    meter = ChatStreamMeter(chat.model)
+    try:
+        stream = client.chat.completions.create(**chat_stream_kwargs(chat.model, chat.messages, chat.temperature))
+        for chunk in stream:
+            text = meter.add_chunk(chunk)
+            if text:
+                yield sse_event("delta", {"content": text})
+    except Exception as e:
+        meter.fail(e)
+        yield sse_event("error", {"error": str(e)})
+        return
+    metrics = meter.finish()
+    remember_chat_reply(chat, meter.reply())
+    yield sse_event("done", dict(chat_reply_payload(meter.reply(), chat.context), metrics=metrics))
+
+
+@app.get("/api/chat/conversations/<conversation_id>")
+def api_chat_conversation(conversation_id):
+    conversation = get_conversation_store().get(conversation_id)
+    if conversation is None:
+        return jsonify({"error": "Conversation not found"}), 404
+    return jsonify(conversation)
+
+
+@app.delete("/api/chat/conversations/<conversation_id>")
+def api_chat_conversation_delete(conversation_id):
+    if not get_conversation_store().delete(conversation_id):
+        return jsonify({"error": "Conversation not found"}), 404
+    chat_summary_cache.discard(conversation_id)
+    return jsonify({"deleted": conversation_id})
+
+
+@app.get("/api/chat/metrics")
+def api_chat_metrics():
+    """Tiempo al primer token, duración y tokens/seg de las respuestas recientes"""
+    return jsonify(dict(chat_metrics.stats(), conversations=get_conversation_store().stats()))
+
+
 @app.post("/api/chat")
 def api_chat():
     """
     Body JSON:
     {
       "message": "texto del usuario",
-      "history": [{"role": "user"|"assistant", "content": "..."}, ...]  // opcional
+      "conversation_id": "...",  // opcional: el servidor guarda los turnos y su resumen
+      "history": [{"role": "user"|"assistant", "content": "..."}, ...],  // opcional: reemplaza lo guardado
+      "stream": true  // opcional: responde con Server-Sent Events (ver iter_chat_stream)
     }
+    Sin "stream" (ni Accept: text/event-stream) responde {"reply", "timestamp", "context"}.
     """
     try:
         data = request.get_json(silent=True) or {}
-        message = (data.get("message") or "").strip()
-        history = data.get("history") or []
-        if not message:
-            return jsonify({"error": "message is required"}), 400
-
-        settings = read_settings()
-        system_prompt = replace_date_placeholders(settings.get("system_prompt", DEFAULT_SETTINGS["system_prompt"]))
-        model = settings.get("model", DEFAULT_SETTINGS["model"])
-        temperature = settings.get("temperature", DEFAULT_SETTINGS["temperature"])
-
-        # Compose messages for the Chat Completions API
-        messages = [{"role": "system", "content": system_prompt}]
-        # Only keep valid roles from history
-        for m in history:
-            role = m.get("role")
-            content = m.get("content")
-            if role in ("user", "assistant") and isinstance(content, str):
-                messages.append({"role": role, "content": content})
-        messages.append({"role": "user", "content": message})
-
-        # Call OpenAI Chat Completions
-        # SDK v1.x
-        from openai import OpenAI
+        try:
+            chat = build_chat_request(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        resp = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
+        # Call OpenAI Chat Completions (cliente compartido, SDK v1.x)
+        client = get_openai_client()
+        if wants_chat_stream(data, request.headers.get("Accept")):
+            return app.response_class(
+                stream_with_context(iter_chat_stream(client, chat)),
+                mimetype="text/event-stream",
+                headers=SSE_HEADERS,
+            )
+
+        started = time.perf_counter()
+        try:
+            with upstream_timer("openai_chat", chat.model):
+                resp = client.chat.completions.create(
+                    model=chat.model,
+                    messages=chat.messages,
+                    temperature=chat.temperature,
+                )
+        except Exception:
+            chat_metrics.record(False, (time.perf_counter() - started) * 1000, error=True)
+            raise
+        usage = getattr(resp, "usage", None)
+        chat_metrics.record(
+            False,
+            (time.perf_counter() - started) * 1000,
+            tokens=getattr(usage, "completion_tokens", None),
         )
         reply = resp.choices[0].message.content
-        ts = datetime.utcnow().isoformat() + "Z"
-        return jsonify({"reply": reply, "timestamp": ts})
+        remember_chat_reply(chat, reply)
+        return jsonify(chat_reply_payload(reply, chat.context))
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# ============================================================================
+# Exportación de métricas
+# ============================================================================
+
+def cache_counts():
+    """(hits, misses) de cada caché en memoria, leídos al exportar"""
+    return {
+        "settings": (settings_store.hits, settings_store.misses),
+        "tools": (tools_store.hits, tools_store.misses),
+        "tool_response": (tool_response_cache.hits, tool_response_cache.misses),
+        "realtime_session_pool": (realtime_session_pool.hits, realtime_session_pool.misses),
+        "chat_summary": (chat_summary_cache.hits, chat_summary_cache.misses),
+        "pages": (page_cache_hits, page_cache_misses),
+    }
+
+
+metrics.register(CallbackMetric(
+    "cache_hits_total", "Lecturas servidas desde caché", "counter", ("cache",),
+    lambda: [((name,), hits) for name, (hits, _) in cache_counts().items()],
+))
+metrics.register(CallbackMetric(
+    "cache_misses_total", "Lecturas que no estaban en caché", "counter", ("cache",),
+    lambda: [((name,), misses) for name, (_, misses) in cache_counts().items()],
+))
+metrics.register(CallbackMetric(
+    "cache_hit_ratio", "Fracción de aciertos desde el arranque del worker", "gauge", ("cache",),
+    lambda: [
+        ((name,), hits / (hits + misses))
+        for name, (hits, misses) in cache_counts().items() if hits + misses
+    ],
+))
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Métricas del worker en formato de texto de Prometheus"""
+    return app.response_class(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# ============================================================================
+# Arranque: warm-up y /health/ready
+# ============================================================================
+
+# Al importar la app, un hilo prepara lo que si no pagaría el primer pedido
+# (0 = nada; el worker queda listo de entrada)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
+# 1 = escribir en stderr los tiempos de importación y de cada paso del warm-up
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0") == "1"
+# Módulos que se importan recién al usarse; el perfil dice cuáles ya se cargaron
+DEFERRED_MODULES = ("requests", "openai", "httpx", "dotenv", "tiktoken", "brotli")
+
+
+def warm_config():
+    """settings.json y tools.json parseados y la configuración del agente derivada"""
+    get_agent_config().settings_json()
+
+
+def warm_tools():
+    """Registro compilado y la sesión HTTP (con requests importado) de cada host"""
+    for compiled in get_tool_registry().by_name.values():
+        if not compiled.is_system and compiled.error is None:
+            get_host_pool(compiled.url)
+
+
+def warm_openai():
+    """Importa openai/httpx y crea el cliente compartido, si hay API key"""
+    if openai_api_key():
+        get_openai_handle()
+
+
+def warm_pages():
+    if PAGE_CACHE_WARM:
+        warm_page_cache()
+
+
+def warm_tokens():
+    """Encoder de tokens del modelo del chat (tiktoken descarga su vocabulario la primera vez)"""
+    _token_encoder(get_agent_config().settings.get("model", DEFAULT_SETTINGS["model"]))
+
+
+class StartupWarmup:
+    """
+    Corre los pasos de warm-up en un hilo y recuerda cuánto tardó cada uno.
+    Un paso que falla se registra y no frena a los demás: el worker queda
+    listo igual y lo que faltó se hace en el primer pedido que lo necesite.
+
+    El estado es por proceso. Si el servidor importa la app antes de hacer
+    fork (gunicorn --preload), el hilo no pasa a los workers; por eso
+    start() vuelve a lanzarlo cuando cambia el pid (ver health_ready).
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.pid = None
+        self.done = threading.Event()
+        self.timings = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.done = threading.Event()
+            self.timings = {}
+            self.errors = {}
+        threading.Thread(target=self.run, name="startup-warmup", daemon=True).start()
+
+    def run(self):
+        for name, step in self.steps:
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = str(e)
+                app.logger.warning("Warm-up: falló el paso %s: %s", name, e)
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        self.done.set()
+        if STARTUP_PROFILE:
+            report_startup_profile("warm-up", self.timings)
+
+    def status(self):
+        return {
+            "ready": self.done.is_set(),
+            "steps_ms": dict(self.timings),
+            "errors": dict(self.errors),
+        }
+
+
+def report_startup_profile(phase, timings):
+    import sys
+
+    loaded = [name for name in DEFERRED_MODULES if name in sys.modules]
+    parts = ", ".join(f"{name}={ms} ms" for name, ms in timings.items())
+    click.echo(f"[startup pid={os.getpid()}] {phase}: {parts}; cargados: {', '.join(loaded) or '-'}", err=True)
+
+
+startup_warmup = StartupWarmup([
+    ("config", warm_config),
+    ("tools", warm_tools),
+    ("pages", warm_pages),
+    ("openai", warm_openai),
+    ("tokens", warm_tokens),
+])
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    200 cuando el worker terminó el warm-up, 503 mientras tanto: el balanceador
+    no le manda tráfico a un worker frío
+    """
+    if not STARTUP_WARMUP:
+        return jsonify({"ready": True, "startup": STARTUP_TIMINGS})
+    startup_warmup.start()
+    status = startup_warmup.status()
+    status["startup"] = STARTUP_TIMINGS
+    return jsonify(status), 200 if status["ready"] else 503
+
+
+STARTUP_TIMINGS["module_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+if STARTUP_PROFILE:
+    report_startup_profile("import", STARTUP_TIMINGS)
+if STARTUP_WARMUP:
+    startup_warmup.start()
+
+
 if __name__ == "__main__":
     # Run on a non-default port to avoid clashes with other dev servers
     port = int(os.getenv("PORT", "5050"))
@@ -0,0 +1,552 @@
+"""
+Modo ASGI opcional.
+
+Sirve /api/execute_tool(s), /api/session, /api/chat y /api/<coleccion>/changes
+con handlers asyncio y clientes HTTP no bloqueantes, de modo que miles de
+llamadas en vuelo (o de tablas escuchando cambios) comparten unos pocos
+workers. Todas las demás rutas se delegan a la app Flask de siempre, con los
+mismos contratos JSON.
+
+Uso:
+    pip install -r requirements-asgi.txt
+    uvicorn asgi:app --host 0.0.0.0 --port 5050 --workers 2
+"""
+import asyncio
+import json
+import os
+from functools import partial
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+
+from app import (
+    app as flask_app,
+    CHANGES_HEARTBEAT_SECONDS,
+    CHANGES_RECHECK_SECONDS,
+    CHANGES_RETRY_MS,
+    COLLECTIONS,
+    CORS_HEADERS as FLASK_CORS_HEADERS,
+    OPENAI_BASE_URL,
+    REALTIME_SESSIONS_URL,
+    REALTIME_SESSION_TIMEOUT,
+    SSE_HEADERS,
+    IDEMPOTENT_TOOL_METHODS,
+    OPENAI_MAX_RETRIES,
+    RETRY_STATUS_CODES,
+    TOOL_BATCH_WORKERS,
+    batch_call_result,
+    batch_deadline_payload,
+    build_chat_request,
+    build_session_config,
+    change_events,
+    changes_poll_payload,
+    chat_metrics,
+    chat_reply_payload,
+    chat_stream_kwargs,
+    ChatStreamMeter,
+    get_change_feed,
+    get_collection,
+    openai_api_key,
+    openai_timeout,
+    parse_changes_since,
+    parse_changes_timeout,
+    parse_tool_batch,
+    prepare_tool_call,
+    tool_cache_key,
+    tool_response_cache,
+    realtime_session_headers,
+    realtime_session_pool,
+    remember_chat_reply,
+    http_request_duration,
+    upstream_timer,
+    sse_event,
+    tool_request_kwargs,
+    tool_response_payload,
+    wants_chat_stream,
+)
+
+# Conexiones simultáneas máximas del cliente httpx (por worker)
+ASGI_MAX_CONNECTIONS = int(os.getenv("ASGI_MAX_CONNECTIONS", "200"))
+
+# Los mismos headers CORS que agrega app.add_cors_headers
+CORS_HEADERS = [(k.lower().encode(), v.encode()) for k, v in FLASK_CORS_HEADERS.items()]
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+_http_client = None
+_openai_client = None
+_openai_key = None
+_cache_inflight = {}
+
+
+def get_http_client():
+    """Cliente httpx compartido por todas las corrutinas del worker"""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASGI_MAX_CONNECTIONS,
+                max_keepalive_connections=ASGI_MAX_CONNECTIONS,
+            ),
+        )
+    return _http_client
+
+
+def get_openai_client():
+    """AsyncOpenAI sobre el mismo pool httpx; se rehace si cambia la API key"""
+    global _openai_client, _openai_key
+    key = (openai_api_key(), OPENAI_BASE_URL)
+    if _openai_client is None or _openai_key != key:
+        from openai import AsyncOpenAI
+
+        _openai_client = AsyncOpenAI(
+            api_key=key[0],
+            base_url=OPENAI_BASE_URL,
+            http_client=get_http_client(),
+            timeout=openai_timeout(),
+            max_retries=OPENAI_MAX_RETRIES,
+        )
+        _openai_key = key
+    return _openai_client
+
+
+async def read_json(receive):
+    """Lee el body completo; equivale a request.get_json(silent=True) or {}"""
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        more_body = message.get("more_body", False)
+    try:
+        return json.loads(b"".join(chunks) or b"null") or {}
+    except ValueError:
+        return {}
+
+
+async def send_json(send, payload, status=200):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            *CORS_HEADERS,
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def execute_tool_call_async(tool_name, arguments):
+    """Versión asyncio de app.execute_tool_call con la misma política de reintentos"""
+    try:
+        # Revisa tools.json y corre las herramientas del sistema (archivos, SQLite): fuera del loop
+        payload, status, compiled = await asyncio.to_thread(prepare_tool_call, tool_name, arguments)
+        if compiled is None:
+            return payload, status
+
+        if compiled.options.cache_ttl is None:
+            return await fetch_tool_response_timed(compiled, arguments), 200
+        return await fetch_tool_response_cached(compiled, arguments), 200
+
+    except httpx.HTTPError as e:
+        return {
+            "success": False,
+            "error": f"Request failed: {str(e)}"
+        }, 500
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }, 500
+
+
+async def fetch_tool_response_cached(compiled, arguments):
+    """Consulta la caché compartida; las misses concurrentes esperan a la primera"""
+    key = tool_cache_key(compiled, arguments)
+    payload = tool_response_cache.lookup(key)
+    if payload is not None:
+        return payload
+    pending = _cache_inflight.get(key)
+    if pending is not None:
+        tool_response_cache.note_coalesced()
+        try:
+            return await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+        except Exception:
+            pass
+        # La request líder falló o se canceló: intentar por cuenta propia
+        return await fetch_tool_response_timed(compiled, arguments)
+    pending = _cache_inflight[key] = asyncio.get_running_loop().create_future()
+    # Si la herramienta se invalida mientras tanto, la respuesta no se guarda
+    generation = tool_response_cache.generation
+    try:
+        payload = await fetch_tool_response_timed(compiled, arguments)
+        tool_response_cache.store(key, payload, compiled.options.cache_ttl, generation)
+        pending.set_result(payload)
+        return payload
+    except asyncio.CancelledError:
+        pending.cancel()
+        raise
+    except Exception as e:
+        pending.set_exception(e)
+        # Evitar el aviso de "exception was never retrieved" si nadie esperaba
+        pending.exception()
+        raise
+    finally:
+        _cache_inflight.pop(key, None)
+
+
+async def fetch_tool_response_timed(compiled, arguments):
+    with upstream_timer("tool", compiled.name) as call:
+        payload = await fetch_tool_response(compiled, arguments)
+        call["status"] = payload["status_code"]
+    return payload
+
+
+async def fetch_tool_response(compiled, arguments):
+    options = compiled.options
+    connect_timeout, read_timeout = options.timeout
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    idempotent = compiled.method in IDEMPOTENT_TOOL_METHODS
+    kwargs = tool_request_kwargs(compiled, arguments)
+    attempt = 0
+    while True:
+        try:
+            response = await get_http_client().request(
+                compiled.method, compiled.url, timeout=timeout, **kwargs
+            )
+        except (httpx.ConnectError, httpx.ConnectTimeout):
+            if attempt >= options.retries:
+                raise
+        except (httpx.NetworkError, httpx.TimeoutException):
+            if not idempotent or attempt >= options.retries:
+                raise
+        else:
+            if not (idempotent and response.status_code in RETRY_STATUS_CODES and attempt < options.retries):
+                return tool_response_payload(response.status_code, response.json, response.text)
+        attempt += 1
+        await asyncio.sleep(options.retry_backoff * (2 ** (attempt - 1)))
+
+
+async def api_execute_tool(scope, receive, send):
+    data = await read_json(receive)
+    payload, status = await execute_tool_call_async(data.get("tool_name"), data.get("arguments", {}))
+    await send_json(send, payload, status)
+
+
+async def api_execute_tools(scope, receive, send):
+    data = await read_json(receive)
+    try:
+        calls, deadline = parse_tool_batch(data)
+    except ValueError as e:
+        return await send_json(send, {"error": str(e)}, 400)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    semaphore = asyncio.Semaphore(TOOL_BATCH_WORKERS)
+
+    async def run(call):
+        async with semaphore:
+            call_started = loop.time()
+            payload, status = await execute_tool_call_async(call.get("tool_name"), call.get("arguments", {}))
+            return payload, status, loop.time() - call_started
+
+    tasks = [asyncio.ensure_future(run(call)) for call in calls]
+    await asyncio.wait(tasks, timeout=deadline)
+
+    results = []
+    for call, task in zip(calls, tasks):
+        if task.done():
+            payload, status, elapsed = task.result()
+        else:
+            task.cancel()
+            payload, status, elapsed = batch_deadline_payload(deadline), 504, loop.time() - started
+        results.append(batch_call_result(call, payload, status, elapsed))
+
+    await send_json(send, {
+        "results": results,
+        "elapsed_ms": round((loop.time() - started) * 1000, 2),
+    })
+
+
+async def api_session(scope, receive, send):
+    # Revisan el .env y las versiones de settings/tools (stat y lectura de archivos): fuera del loop
+    api_key = await asyncio.to_thread(openai_api_key)
+    if not api_key:
+        return await send_json(send, {"error": "OPENAI_API_KEY is not set on the server"}, 500)
+
+    pooled = await asyncio.to_thread(realtime_session_pool.take)
+    if pooled is not None:
+        return await send_json(send, pooled)
+
+    try:
+        config = await asyncio.to_thread(build_session_config)
+        with upstream_timer("openai_session") as call:
+            r = await get_http_client().post(
+                REALTIME_SESSIONS_URL,
+                headers=realtime_session_headers(api_key),
+                json=config,
+                timeout=REALTIME_SESSION_TIMEOUT,
+            )
+            call["status"] = r.status_code
+        r.raise_for_status()
+        await send_json(send, r.json())
+    except httpx.HTTPStatusError as e:
+        await send_json(send, {
+            "error": f"OpenAI error: {e}",
+            "details": e.response.text,
+        }, 502)
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+def request_header(scope, name):
+    name = name.lower().encode()
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+async def stream_chat(send, chat):
+    """Versión asyncio de app.iter_chat_stream: mismos eventos SSE"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            *[(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()],
+            *CORS_HEADERS,
+        ],
+    })
+
+    async def emit(event, data):
+        await send({"type": "http.response.body", "body": sse_event(event, data).encode("utf-8"), "more_body": True})
+
+    meter = ChatStreamMeter(chat.model)
+    try:
+        stream = await get_openai_client().chat.completions.create(
+            **chat_stream_kwargs(chat.model, chat.messages, chat.temperature)
+        )
+        async for chunk in stream:
+            text = meter.add_chunk(chunk)
+            if text:
+                await emit("delta", {"content": text})
+    except Exception as e:
+        meter.fail(e)
+        await emit("error", {"error": str(e)})
+    else:
+        metrics = meter.finish()
+        await asyncio.to_thread(remember_chat_reply, chat, meter.reply())
+        await emit("done", dict(chat_reply_payload(meter.reply(), chat.context), metrics=metrics))
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def api_chat(scope, receive, send):
+    try:
+        data = await read_json(receive)
+        try:
+            # Puede llamar al modelo para resumir el historial: fuera del loop
+            chat = await asyncio.to_thread(build_chat_request, data)
+        except ValueError as e:
+            return await send_json(send, {"error": str(e)}, 400)
+
+        if wants_chat_stream(data, request_header(scope, "accept")):
+            return await stream_chat(send, chat)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            with upstream_timer("openai_chat", chat.model):
+                resp = await get_openai_client().chat.completions.create(
+                    model=chat.model,
+                    messages=chat.messages,
+                    temperature=chat.temperature,
+                )
+        except Exception:
+            chat_metrics.record(False, (loop.time() - started) * 1000, error=True)
+            raise
+        usage = getattr(resp, "usage", None)
+        chat_metrics.record(
+            False,
+            (loop.time() - started) * 1000,
+            tokens=getattr(usage, "completion_tokens", None),
+        )
+        reply = resp.choices[0].message.content
+        await asyncio.to_thread(remember_chat_reply, chat, reply)
+        await send_json(send, chat_reply_payload(reply, chat.context))
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+
+async def wait_for_changes_async(name, feed, version, timeout):
+    """
+    Versión asyncio de app.wait_for_changes: el feed avisa por callback en
+    lugar de bloquear un hilo. Cada CHANGES_RECHECK_SECONDS revisa (en un
+    hilo) si otro worker cambió la colección.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def listener():
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:
+            # El loop ya se cerró: no hay a quién avisar
+            pass
+
+    feed.add_listener(listener)
+    try:
+        deadline = loop.time() + timeout
+        next_recheck = loop.time() + CHANGES_RECHECK_SECONDS
+        while True:
+            changed.clear()
+            changes = feed.since(version)
+            remaining = deadline - loop.time()
+            if changes != [] or remaining <= 0:
+                return changes
+            try:
+                await asyncio.wait_for(changed.wait(), min(remaining, next_recheck - loop.time()))
+            except asyncio.TimeoutError:
+                if loop.time() >= next_recheck:
+                    await asyncio.to_thread(get_collection(name).refresh)
+                    next_recheck = loop.time() + CHANGES_RECHECK_SECONDS
+    finally:
+        feed.remove_listener(listener)
+
+
+async def until_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def stream_changes(send, name, feed, version):
+    """Versión asyncio de app.iter_change_events, sin límite de duración"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            *[(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()],
+            *CORS_HEADERS,
+        ],
+    })
+
+    async def emit(text):
+        await send({"type": "http.response.body", "body": text.encode("utf-8"), "more_body": True})
+
+    await emit(f"retry: {CHANGES_RETRY_MS}\n\n")
+    while True:
+        changes = await wait_for_changes_async(name, feed, version, CHANGES_HEARTBEAT_SECONDS)
+        if changes == []:
+            await emit(": ping\n\n")
+        else:
+            text, version = change_events(feed, version, changes)
+            await emit(text)
+
+
+async def serve_change_stream(receive, send, name, feed, version):
+    """stream_changes hasta que el cliente se desconecta"""
+    stream = asyncio.ensure_future(stream_changes(send, name, feed, version))
+    disconnect = asyncio.ensure_future(until_disconnect(receive))
+    done, pending = await asyncio.wait({stream, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if stream in done:
+        stream.result()
+
+
+async def api_collection_changes(scope, receive, send, name):
+    """Mismo contrato que app.collection_changes_response (SSE o long-poll)"""
+    try:
+        # Suscribirse la primera vez lee la colección: fuera del loop
+        feed = await asyncio.to_thread(get_change_feed, name)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        try:
+            since = parse_changes_since(request_header(scope, "last-event-id") or query.get("since", [None])[0])
+        except ValueError as e:
+            return await send_json(send, {"error": str(e)}, 400)
+
+        if "text/event-stream" not in request_header(scope, "accept"):
+            if since is None:
+                return await send_json(send, {"version": feed.version, "changes": []})
+            try:
+                timeout = parse_changes_timeout(query.get("timeout", [None])[0])
+            except ValueError as e:
+                return await send_json(send, {"error": str(e)}, 400)
+
+            changes = await wait_for_changes_async(name, feed, since, timeout)
+            return await send_json(send, changes_poll_payload(feed, since, changes))
+    except Exception as e:
+        return await send_json(send, {"error": str(e)}, 500)
+
+    # Fuera del try: con el stream ya empezado no se puede responder un 500
+    await serve_change_stream(receive, send, name, feed, feed.version if since is None else since)
+
+
+ASYNC_ROUTES = {
+    ("POST", "/api/execute_tool"): api_execute_tool,
+    ("POST", "/api/execute_tools"): api_execute_tools,
+    ("GET", "/api/session"): api_session,
+    ("POST", "/api/chat"): api_chat,
+}
+
+
+def async_route(scope):
+    """Handler asyncio de la request o None si la atiende Flask"""
+    handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None and scope["method"] == "GET":
+        # /api/<coleccion>/changes de cualquier colección registrada
+        parts = scope["path"].split("/")
+        if len(parts) == 4 and parts[1] == "api" and parts[3] == "changes" and parts[2] in COLLECTIONS:
+            handler = partial(api_collection_changes, name=parts[2])
+    return handler
+
+
+async def lifespan(receive, send):
+    global _http_client, _openai_client
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            # El cliente OpenAI usa el mismo pool: basta con cerrar httpx
+            _openai_client = None
+            if _http_client is not None:
+                await _http_client.aclose()
+                _http_client = None
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def timed_route(handler, scope, receive, send):
+    """Registra la duración de una ruta asyncio en las mismas métricas que Flask"""
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    status = 500
+
+    async def send_wrapper(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        await send(message)
+
+    try:
+        await handler(scope, receive, send_wrapper)
+    finally:
+        http_request_duration.observe(loop.time() - started, scope["method"], scope["path"], status)
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http":
+        handler = async_route(scope)
+        if handler is not None:
+            return await timed_route(handler, scope, receive, send)
+    await wsgi_app(scope, receive, send)
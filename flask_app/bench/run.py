@@ -0,0 +1,464 @@
+"""
+Benchmarks de la API de flask_app.
+
+Levanta la app real en un proceso aparte (con un directorio de datos
+temporal), un stub de OpenAI y un stub de backend de herramientas, y mide
+cada escenario con N clientes concurrentes: latencia p50/p95/p99,
+throughput y memoria (RSS) del servidor. El resultado se guarda en JSON
+para comparar corridas entre commits.
+
+Uso (desde flask_app/):
+    python bench/run.py --out bench-results.json
+    python bench/run.py --rows 10,1000,100000 --server asgi --backend sqlite
+    python bench/run.py --compare antes.json despues.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from stubs import OpenAIStubHandler, ToolStubHandler, start_stub, stub_url
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Carmen", "Jorge", "Lucía", "Pedro", "Sofía", "Miguel"]
+APELLIDOS = ["García", "López", "Martínez", "Hernández", "Pérez", "Sánchez", "Ramírez", "Torres"]
+CONCEPTOS = ["Comida", "Transporte", "Renta", "Luz", "Internet", "Papelería", "Gasolina", "Café"]
+
+
+# ============================================================================
+# Servidor bajo prueba
+# ============================================================================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def seed_data_dir(data_dir, tools_url):
+    """settings.json y tools.json mínimos; las colecciones arrancan vacías"""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    settings = {
+        "system_prompt": "Eres un asistente de prueba.",
+        "model": "gpt-4o-mini",
+        "temperature": 0.6,
+        "realtime_model": "gpt-realtime-mini",
+        "voice": "verse",
+    }
+    tools = {"tools": [
+        {
+            "id": f"bench-{name}",
+            "name": f"bench_{name}",
+            "description": f"Herramienta de benchmark ({name})",
+            "enabled": True,
+            "endpoint": {"url": f"{tools_url}/{name}", "method": "GET", "headers": {}},
+            "parameters": {"type": "object", "properties": {"q": {"type": "string"}}},
+        }
+        for name in ("fast", "slow", "fail")
+    ]}
+    (data_dir / "settings.json").write_text(json.dumps(settings, ensure_ascii=False, indent=2), encoding="utf-8")
+    (data_dir / "tools.json").write_text(json.dumps(tools, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class AppServer:
+    """La app en un subproceso: Flask (servidor de desarrollo con hilos) o uvicorn"""
+
+    def __init__(self, kind, data_dir, env):
+        self.kind = kind
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = dict(
+            os.environ, **env,
+            FLASK_DATA_DIR=str(data_dir), FLASK_INSTANCE_DIR=str(data_dir / "instance"), PORT=str(self.port),
+        )
+        if kind == "asgi":
+            cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+                   "--port", str(self.port), "--log-level", "warning"]
+        else:
+            cmd = [sys.executable, "-c",
+                   "import logging, app; logging.getLogger('werkzeug').setLevel(logging.ERROR); "
+                   f"app.app.run(host='127.0.0.1', port={self.port}, threaded=True)"]
+        self.process = subprocess.Popen(cmd, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL)
+        self.wait_ready()
+
+    def wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"El servidor terminó al arrancar (código {self.process.returncode})")
+            try:
+                # Listo recién con el warm-up terminado, como lo vería un balanceador
+                if requests.get(f"{self.url}/health/ready", timeout=1).ok:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError("El servidor no respondió a tiempo")
+
+    def memory(self):
+        """RSS actual y pico en MiB (Linux; None en otros sistemas)"""
+        values = {}
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    key, _, rest = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        values[key] = round(int(rest.split()[0]) / 1024, 1)
+        except OSError:
+            pass
+        return {"rss_mb": values.get("VmRSS"), "rss_peak_mb": values.get("VmHWM")}
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# ============================================================================
+# Generador de carga
+# ============================================================================
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 3)
+
+
+def run_scenario(server, name, make_request, args, rows=None, on_response=None, warmup=True):
+    """
+    Corre `make_request(worker, i) -> (method, path, kwargs)` con
+    args.concurrency clientes hasta args.duration segundos o args.requests
+    requests. Se consideran errores las respuestas 5xx y las excepciones.
+    Con warmup=True antes se hace una request sin medir (i=-1), para no
+    contar la creación de clientes y cachés del primer uso.
+    """
+    if warmup:
+        method, path, kwargs = make_request(0, -1)
+        try:
+            requests.request(method, server.url + path, timeout=60, **kwargs)
+        except requests.RequestException:
+            pass
+    latencies = []
+    statuses = {}
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+    stop_at = time.perf_counter() + args.duration
+
+    def worker(worker_id):
+        nonlocal errors
+        session = requests.Session()
+        for i in counter:
+            if time.perf_counter() >= stop_at:
+                break
+            method, path, kwargs = make_request(worker_id, i)
+            started = time.perf_counter()
+            try:
+                response = session.request(method, server.url + path, timeout=60, **kwargs)
+                body = response.content
+                status = response.status_code
+            except requests.RequestException:
+                body, status = None, "exception"
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "exception" or status >= 500:
+                    errors += 1
+            if on_response is not None and body is not None:
+                on_response(status, body)
+        session.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "scenario": name,
+        "rows": rows,
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": round(latencies[-1], 3) if latencies else None,
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+        },
+        **server.memory(),
+    }
+    print(
+        f"  {name:<22} {'' if rows is None else rows:>7} "
+        f"n={result['requests']:<6} err={errors:<4} {result['throughput_rps']:>9} rps  "
+        f"p50={result['latency_ms']['p50']} p95={result['latency_ms']['p95']} "
+        f"p99={result['latency_ms']['p99']} ms  rss={result['rss_mb']} MiB",
+        flush=True,
+    )
+    return result
+
+
+def single_request(server, name, method, path, rows=None, **kwargs):
+    """Una sola request larga (p. ej. la importación inicial), medida igual que un escenario"""
+    started = time.perf_counter()
+    response = requests.request(method, server.url + path, timeout=600, **kwargs)
+    elapsed = (time.perf_counter() - started) * 1000
+    result = {
+        "scenario": name,
+        "rows": rows,
+        "requests": 1,
+        "errors": int(response.status_code >= 500),
+        "statuses": {str(response.status_code): 1},
+        "throughput_rps": None,
+        "latency_ms": {key: round(elapsed, 3) for key in ("p50", "p95", "p99", "max", "mean")},
+        **server.memory(),
+    }
+    print(f"  {name:<22} {rows:>7} {elapsed:>10.1f} ms  rss={result['rss_mb']} MiB", flush=True)
+    return result
+
+
+# ============================================================================
+# Escenarios
+# ============================================================================
+
+def api_scenarios(server, args):
+    results = [
+        run_scenario(server, "session", lambda w, i: ("GET", "/api/session", {}), args),
+    ]
+    for tool in ("fast", "slow", "fail"):
+        payload = {"tool_name": f"bench_{tool}", "arguments": {"q": "x"}}
+        results.append(run_scenario(
+            server, f"execute_tool_{tool}",
+            lambda w, i, payload=payload: ("POST", "/api/execute_tool", {"json": payload}),
+            args,
+        ))
+    # Una conversación por cliente: el historial crece en el servidor
+    run_id = f"{time.time_ns():x}"
+    results.append(run_scenario(
+        server, "chat",
+        lambda w, i: ("POST", "/api/chat", {"json": {"message": f"pregunta {i}", "conversation_id": f"{run_id}-{w}"}}),
+        args,
+    ))
+    results.append(run_scenario(
+        server, "chat_stream",
+        lambda w, i: ("POST", "/api/chat", {"json": {
+            "message": f"pregunta {i}", "conversation_id": f"{run_id}-s{w}", "stream": True,
+        }}),
+        args,
+    ))
+    return results
+
+
+def persona_row(rng):
+    return {
+        "nombre": rng.choice(NOMBRES),
+        "apellido": rng.choice(APELLIDOS),
+        "telefono": str(rng.randrange(10 ** 9, 10 ** 10)),
+    }
+
+
+def gasto_row(rng):
+    return {
+        "descripcion": f"{rng.choice(CONCEPTOS)} {rng.randrange(1000)}",
+        "gasto": round(rng.uniform(10, 5000), 2),
+        "fecha": f"2024-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+    }
+
+
+def collection_scenarios(server, name, rows, args):
+    rng = random.Random(rows)
+    make_row = persona_row if name == "personas" else gasto_row
+    body = "\n".join(json.dumps(make_row(rng), ensure_ascii=False) for _ in range(rows))
+    results = [single_request(
+        server, f"{name}_import", "POST", f"/api/{name}/import", rows,
+        data=body.encode("utf-8"), headers={"Content-Type": "application/x-ndjson"},
+    )]
+
+    results.append(run_scenario(server, f"{name}_list_page", lambda w, i: ("GET", f"/api/{name}?limit=50", {}), args, rows))
+    results.append(run_scenario(server, f"{name}_list_all", lambda w, i: ("GET", f"/api/{name}", {}), args, rows))
+    if name == "personas":
+        results.append(run_scenario(
+            server, "personas_search",
+            lambda w, i: ("GET", f"/api/personas/search?q={NOMBRES[i % len(NOMBRES)][:-1]}", {}), args, rows,
+        ))
+    else:
+        results.append(run_scenario(server, "gastos_stats", lambda w, i: ("GET", "/api/gastos/stats", {}), args, rows))
+
+    created = []
+    created_lock = threading.Lock()
+
+    def remember(status, content):
+        if status == 201:
+            with created_lock:
+                created.append(json.loads(content)["created"]["id"])
+
+    rows_for_create = [make_row(rng) for _ in range(256)]
+    results.append(run_scenario(
+        server, f"{name}_create",
+        lambda w, i: ("POST", f"/api/{name}", {"json": rows_for_create[i % len(rows_for_create)]}),
+        args, rows, on_response=remember,
+    ))
+    if created:
+        field, value = ("nombre", "Editado") if name == "personas" else ("descripcion", "Editado")
+        results.append(run_scenario(
+            server, f"{name}_update",
+            lambda w, i: ("PUT", f"/api/{name}/{created[i % len(created)]}", {"json": {field: value}}),
+            args, rows,
+        ))
+        # Cada id se borra una sola vez: no más requests que filas creadas
+        delete_args = argparse.Namespace(**dict(vars(args), requests=min(args.requests, len(created))))
+        results.append(run_scenario(
+            server, f"{name}_delete",
+            lambda w, i: ("DELETE", f"/api/{name}/{created[i]}", {}),
+            delete_args, rows, warmup=False,
+        ))
+    return results
+
+
+# ============================================================================
+# Comparación de corridas
+# ============================================================================
+
+def compare(base_path, new_path):
+    """Imprime la variación de p50/p95/throughput de cada escenario en común"""
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return data["meta"], {(r["scenario"], r["rows"]): r for r in data["results"]}
+
+    base_meta, base = load(base_path)
+    new_meta, new = load(new_path)
+    print(f"base: {base_meta.get('commit')}  nuevo: {new_meta.get('commit')}")
+    print(f"{'escenario':<22} {'filas':>7} {'p50 ms':>24} {'p95 ms':>24} {'rps':>24}")
+
+    def delta(old, cur):
+        if old is None or cur is None:
+            return f"{'-':>24}"
+        change = (cur - old) / old * 100 if old else 0.0
+        return f"{old} → {cur} ({change:+.0f}%)".rjust(24)
+
+    for key in sorted(set(base) & set(new), key=lambda k: (k[0], k[1] or 0)):
+        old, cur = base[key], new[key]
+        print(
+            f"{key[0]:<22} {'' if key[1] is None else key[1]:>7} "
+            f"{delta(old['latency_ms']['p50'], cur['latency_ms']['p50'])} "
+            f"{delta(old['latency_ms']['p95'], cur['latency_ms']['p95'])} "
+            f"{delta(old['throughput_rps'], cur['throughput_rps'])}"
+        )
+
+
+# ============================================================================
+# Main
+# ============================================================================
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de la API de flask_app")
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask")
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json", help="COLLECTION_BACKEND")
+    parser.add_argument("--rows", default="10,1000,100000", help="tamaños de colección, separados por coma")
+    parser.add_argument("--concurrency", type=int, default=8, help="clientes simultáneos")
+    parser.add_argument("--duration", type=float, default=5.0, help="segundos máximos por escenario")
+    parser.add_argument("--requests", type=int, default=2000, help="requests máximas por escenario")
+    parser.add_argument("--openai-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=5.0)
+    parser.add_argument("--slow-tool-latency-ms", type=float, default=250.0)
+    parser.add_argument("--only", choices=("api", "collections"), help="correr solo un grupo de escenarios")
+    parser.add_argument("--out", help="archivo JSON de resultados (por defecto, solo consola)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NUEVO"), help="comparar dos resultados y salir")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        return compare(*args.compare)
+
+    openai_stub = start_stub(OpenAIStubHandler, latency=args.openai_latency_ms / 1000)
+    tools_stub = start_stub(
+        ToolStubHandler, latency=args.tool_latency_ms / 1000, slow_latency=args.slow_tool_latency_ms / 1000,
+    )
+    env = {
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_BASE_URL": f"{stub_url(openai_stub)}/v1",
+        "COLLECTION_BACKEND": args.backend,
+    }
+    rows_list = [int(r) for r in args.rows.split(",") if r.strip()]
+    results = []
+    workdir = Path(tempfile.mkdtemp(prefix="flask-bench-"))
+    print(f"servidor={args.server} backend={args.backend} concurrencia={args.concurrency}", flush=True)
+    try:
+        if args.only in (None, "api"):
+            data_dir = workdir / "api"
+            seed_data_dir(data_dir, stub_url(tools_stub))
+            server = AppServer(args.server, data_dir, env)
+            try:
+                results.extend(api_scenarios(server, args))
+            finally:
+                server.stop()
+        if args.only in (None, "collections"):
+            for rows in rows_list:
+                # Directorio de datos nuevo por tamaño: cada corrida arranca de cero
+                data_dir = workdir / f"rows-{rows}"
+                seed_data_dir(data_dir, stub_url(tools_stub))
+                server = AppServer(args.server, data_dir, env)
+                try:
+                    for name in ("personas", "gastos"):
+                        results.extend(collection_scenarios(server, name, rows, args))
+                finally:
+                    server.stop()
+    finally:
+        openai_stub.shutdown()
+        tools_stub.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Resultados en {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Servidores locales para los benchmarks: imitan a OpenAI y al backend de las
+herramientas, con latencias fijas, para que las mediciones dependan solo de
+la app.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Se sobrescriben en cada servidor (ver start_stub)
+    latency = 0.0
+    slow_latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        try:
+            return json.loads(raw or b"{}")
+        except ValueError:
+            return {}
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class OpenAIStubHandler(StubHandler):
+    """/realtime/sessions y /chat/completions (con y sin stream)"""
+
+    STREAM_WORDS = ["Hola", ",", " esta", " es", " una", " respuesta", " de", " prueba", "."]
+
+    def do_POST(self):
+        body = self.read_body()
+        time.sleep(self.latency)
+        path = urlsplit(self.path).path
+        if path.endswith("/realtime/sessions"):
+            return self.send_json({
+                "id": "sess_bench",
+                "model": body.get("model"),
+                "client_secret": {"value": "ek_bench", "expires_at": int(time.time()) + 60},
+            })
+        if path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return self.stream_chat(body)
+            return self.send_json({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(self.STREAM_WORDS)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 20, "completion_tokens": len(self.STREAM_WORDS), "total_tokens": 29},
+            })
+        self.send_json({"error": {"message": "not found"}}, 404)
+
+    def stream_chat(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk = {"id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": 0, "model": body.get("model")}
+        for word in self.STREAM_WORDS:
+            delta = dict(chunk, choices=[{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+            self.wfile.write(b"data: " + json.dumps(delta).encode("utf-8") + b"\n\n")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage = dict(chunk, choices=[], usage={"prompt_tokens": 20, "completion_tokens": len(self.STREAM_WORDS), "total_tokens": 29})
+            self.wfile.write(b"data: " + json.dumps(usage).encode("utf-8") + b"\n\n")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class ToolStubHandler(StubHandler):
+    """/fast, /slow y /fail (500), para GET y POST"""
+
+    def handle_tool(self, arguments):
+        path = urlsplit(self.path).path
+        if path == "/fast":
+            time.sleep(self.latency)
+            return self.send_json({"ok": True, "echo": arguments})
+        if path == "/slow":
+            time.sleep(self.slow_latency)
+            return self.send_json({"ok": True, "echo": arguments})
+        if path == "/fail":
+            time.sleep(self.latency)
+            return self.send_json({"error": "backend caído"}, 500)
+        self.send_json({"error": "not found"}, 404)
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        self.handle_tool({key: values[-1] for key, values in query.items()})
+
+    def do_POST(self):
+        self.handle_tool(self.read_body())
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Cola de listen() amplia: con mucha concurrencia no debe ser el cuello de botella
+    request_queue_size = 1024
+
+
+def start_stub(handler, latency=0.0, slow_latency=0.0):
+    """Levanta el stub en un puerto libre (hilo daemon); devuelve el servidor"""
+    handler = type(handler.__name__, (handler,), {"latency": latency, "slow_latency": slow_latency})
+    server = StubServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def stub_url(server):
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
@@ -0,0 +1,866 @@
+"""
+Colecciones declaradas por esquema: campos, filas compactas con __slots__,
+paginación por cursor y los backends json y SQLite con sus observadores.
+app.py arma encima las rutas /api/<coleccion> (ver register_collection).
+"""
+import base64
+import bisect
+import itertools
+import json
+import operator
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import namedtuple
+from collections.abc import Mapping
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+from json_store import (
+    CONFIG_RECHECK_SECONDS,
+    OPTIMISTIC_WRITE_RETRIES,
+    WriteConflict,
+    commit_json_file,
+    content_etag,
+    etag_matches,
+    file_lock,
+    file_stat_key,
+    load_json_file,
+    stat_etag,
+)
+
+CollectionQuery = namedtuple("CollectionQuery", "filters sort_field desc limit cursor")
+
+
+def gen_id():
+    """Genera un ID único corto"""
+    return str(uuid.uuid4())[:8]
+
+
+def parse_text(value):
+    return "" if value is None else str(value).strip()
+
+
+def parse_fecha(value):
+    """Valida una fecha AAAA-MM-DD; lanza ValueError si no lo es"""
+    return datetime.strptime(str(value).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+# Tipo de campo -> (conversión, mensaje si el valor no sirve)
+FIELD_TYPES = {
+    "text": (parse_text, None),
+    "number": (float, "{name} debe ser un número válido"),
+    "date": (parse_fecha, "{name} debe tener formato AAAA-MM-DD"),
+}
+FILTER_OPS = ("prefix", "contains", "min", "max")
+
+
+class Field:
+    """
+    Campo de una colección.
+    - type: text, number o date (ver FIELD_TYPES).
+    - required: True o el mensaje de error si falta.
+    - default: valor (o función que lo devuelve) si el body no lo trae.
+    - filter/filters: operación de listado con el nombre del campo como
+      parámetro, o {parámetro: operación} (prefix, contains, min, max).
+    - sortable: admite ?sort= (y en SQLite tiene índice).
+    - search: "text" o "phone" para indexarlo en /search.
+    """
+
+    def __init__(self, name, type="text", required=False, default=None,
+                 filter=None, filters=None, sortable=False, search=None):
+        if type not in FIELD_TYPES:
+            raise ValueError(f"{name}: tipo desconocido {type!r}")
+        if not name.isidentifier() or name.startswith("_") or name == "id" or hasattr(Record, name):
+            raise ValueError(f"nombre de campo no permitido: {name!r}")
+        self.name = name
+        self.type = type
+        self.required = required
+        self.default = default
+        self.filters = dict(filters or {})
+        if filter:
+            self.filters[name] = filter
+        if any(op not in FILTER_OPS for op in self.filters.values()):
+            raise ValueError(f"{name}: filtros válidos: {', '.join(FILTER_OPS)}")
+        self.sortable = sortable
+        self.search = search
+        self._convert, error = FIELD_TYPES[type]
+        self._error = error.format(name=name) if error else None
+
+    def parse(self, value):
+        """Valor convertido al tipo del campo; ValueError con el mensaje del tipo si no sirve"""
+        try:
+            return self._convert(value)
+        except (TypeError, ValueError):
+            raise ValueError(self._error)
+
+
+_UNSET = object()
+
+
+class Record(Mapping):
+    """
+    Fila de una colección. Cada esquema genera una subclase con __slots__
+    (id y sus campos), que ocupa bastante menos que un dict por fila; las
+    claves que el esquema no declara (filas viejas) van aparte en _extra.
+    Se lee como un dict de solo lectura y se serializa con to_dict().
+    """
+
+    __slots__ = ("_extra",)
+    _fields = ()
+    _field_set = frozenset()
+
+    def __init__(self, data):
+        extra = None
+        for key, value in data.items():
+            if key in self._field_set:
+                setattr(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        self._extra = extra
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            value = getattr(self, key, _UNSET)
+            if value is not _UNSET:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in self._fields:
+            if hasattr(self, name):
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self):
+        if self._extra is None:
+            try:
+                return self._dump()
+            except AttributeError:
+                # Fila vieja a la que le falta algún campo
+                pass
+        data = {}
+        for name in self._fields:
+            value = getattr(self, name, _UNSET)
+            if value is not _UNSET:
+                data[name] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def replace(self, changes):
+        """Copia de la fila con `changes` aplicados (las filas publicadas no se mutan)"""
+        return type(self)(dict(self.to_dict(), **changes))
+
+
+class CollectionSchema:
+    """
+    Declaración de una colección: sus campos y los mensajes propios. De acá
+    salen la validación de altas y ediciones, los filtros y órdenes del
+    listado, los campos de exportación y de búsqueda, los índices de SQLite
+    y la clase con __slots__ de sus filas. register_collection() le genera
+    las rutas.
+    """
+
+    def __init__(self, name, fields, not_found, path=None, required_message=None):
+        self.name = name
+        self.fields = tuple(fields)
+        self.not_found = not_found
+        # Sin path, register_collection() la ubica en DATA_DIR/<nombre>.json
+        self.path = Path(path) if path else None
+        self.required_message = required_message
+
+        names = [field.name for field in self.fields]
+        if not names:
+            raise ValueError(f"{name}: sin campos")
+        if len(set(names)) != len(names):
+            raise ValueError(f"{name}: campos repetidos")
+        self.field_names = tuple(names)
+        self.export_fields = ("id",) + self.field_names
+        # Parámetro de query -> (operación, campo)
+        self.filters = {
+            param: (op, field.name) for field in self.fields for param, op in field.filters.items()
+        }
+        self.sort_fields = tuple(field.name for field in self.fields if field.sortable)
+        self.search_fields = tuple(field.name for field in self.fields if field.search == "text")
+        phones = [field.name for field in self.fields if field.search == "phone"]
+        if len(phones) > 1:
+            raise ValueError(f"{name}: solo un campo puede ser search='phone'")
+        self.phone_field = phones[0] if phones else None
+
+        fields = ("id",) + self.field_names
+        # El dict de una fila completa: attrgetter lee todos los slots en una
+        # sola llamada (con al menos dos campos siempre devuelve una tupla)
+        get_values = operator.attrgetter(*fields)
+
+        def _dump(record):
+            return dict(zip(fields, get_values(record)))
+
+        self.record_type = type(f"{name.title()}Record", (Record,), {
+            "__slots__": fields,
+            "_fields": fields,
+            "_field_set": frozenset(fields),
+            "_dump": _dump,
+        })
+
+    @property
+    def searchable(self):
+        return bool(self.search_fields or self.phone_field)
+
+    def record(self, data):
+        return self.record_type(data)
+
+    def validate(self, body):
+        """Arma una fila nueva a partir de un body; lanza ValueError si no es válido"""
+        item = {"id": gen_id()}
+        for field in self.fields:
+            value = body.get(field.name)
+            if (value is None or value == "") and field.default is not None:
+                value = field.default() if callable(field.default) else field.default
+            if field.required and parse_text(value) == "":
+                if isinstance(field.required, str):
+                    raise ValueError(field.required)
+                raise ValueError(self.required_message or f"{field.name} es requerido")
+            item[field.name] = field.parse(value)
+        return self.record_type(item)
+
+    def validate_changes(self, body):
+        """Campos a actualizar presentes en el body, ya convertidos (ValueError si alguno no sirve)"""
+        return {field.name: field.parse(body[field.name]) for field in self.fields if field.name in body}
+
+
+def _sort_rank(value):
+    """
+    Clave comparable para cualquier valor JSON, con el mismo orden que usa
+    SQLite: números antes que texto; los valores ausentes cuentan como "".
+    """
+    if isinstance(value, (int, float)):
+        return (1, float(value))
+    if value is None:
+        return (2, "")
+    return (2, value if isinstance(value, str) else str(value))
+
+
+def sort_key(item, field, seq):
+    """Clave de orden de una fila; `seq` (orden de inserción) desempata"""
+    return (_sort_rank(item.get(field)) if field else (0, 0), seq)
+
+
+def fold_text(text):
+    """Minúsculas y sin acentos: 'Café' -> 'cafe'"""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def text_tokens(text, min_length=3):
+    """Palabras normalizadas de un texto, sin repetir y en orden de aparición"""
+    folded = "".join(c if c.isalnum() else " " for c in fold_text(text))
+    return list(dict.fromkeys(t for t in folded.split() if len(t) >= min_length))
+
+
+def item_matches(item, filters):
+    for op, field, value in filters:
+        current = item.get(field)
+        if op == "prefix":
+            if not _sql_casefold(current).startswith(value):
+                return False
+        elif op == "contains":
+            if value not in _sql_casefold(current):
+                return False
+        elif isinstance(current, bool) or not isinstance(current, (int, float)):
+            # Solo números (como json_type en SQLite, donde true/false no lo son)
+            return False
+        elif op == "min" and current < value:
+            return False
+        elif op == "max" and current > value:
+            return False
+    return True
+
+
+def _sql_casefold(value):
+    if value is None:
+        return ""
+    return (value if isinstance(value, str) else str(value)).casefold()
+
+
+def _sql_field(field):
+    # `field` siempre viene de los filtros/órdenes declarados en el esquema
+    return f"COALESCE(json_extract(data, '$.{field}'), '')"
+
+
+def _sql_number_filter(field, cmp):
+    """
+    Condición `campo <cmp> ?` que, como item_matches, solo deja pasar valores
+    numéricos: con _sql_field un texto o un campo ausente ('') se compararía
+    como texto y siempre quedaría por encima de cualquier número.
+    """
+    return (
+        f"json_type(data, '$.{field}') IN ('integer', 'real') "
+        f"AND json_extract(data, '$.{field}') {cmp} ?"
+    )
+
+
+def encode_cursor(q, key):
+    (rank, value), seq = key
+    raw = json.dumps([q.sort_field, q.desc, rank, value, seq], ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort_field, desc):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        field, cursor_desc, rank, value, seq = json.loads(raw)
+    except Exception:
+        raise ValueError("cursor inválido")
+    if field != sort_field or cursor_desc != desc:
+        raise ValueError("cursor no corresponde al orden solicitado")
+    return ((rank, value), seq)
+
+
+def dump_collection_bytes(items):
+    """
+    {"items": [...]} con una fila por línea. Cada fila pasa por el encoder
+    en C de json (indent=2 sobre todo el archivo usa el encoder en Python,
+    varias veces más lento con colecciones grandes).
+    """
+    rows = ",\n".join("    " + json.dumps(item.to_dict(), ensure_ascii=False) for item in items)
+    body = '{\n  "items": [\n' + rows + '\n  ]\n}\n' if rows else '{\n  "items": []\n}\n'
+    return body.encode("utf-8")
+
+
+def item_etag(item):
+    return content_etag(item.to_dict())
+
+
+
+def check_item_etag(item, if_match):
+    if not etag_matches(if_match, item_etag(item)):
+        raise WriteConflict("El registro fue modificado por otra persona")
+
+
+class CollectionEvents:
+    """
+    Notifica los cambios de una colección a observadores que mantienen
+    estructuras derivadas (totales, índices...). Un observador implementa
+    reset(items) y apply(op, old, new) con op en insert/update/delete.
+
+    Los cambios de este proceso llegan como deltas; los de otro proceso solo
+    se notan al llamar a refresh(), que entonces manda reset. Por eso quien
+    lee una estructura derivada debe llamar antes a refresh().
+    """
+
+    def subscribe(self, observer):
+        # Con el lock de escritura tomado ningún commit cae entre el listado
+        # inicial y el alta: no se pierde ni se aplica dos veces
+        with self._lock:
+            if getattr(observer, "needs_items", True):
+                items = self._current_items()
+            else:
+                # Un observador con needs_items = False se ahorra el listado inicial
+                self.refresh(fresh=True)
+                items = []
+            self._observers.append(observer)
+            observer.reset(items)
+        return observer
+
+    def _emit(self, op, old, new):
+        for observer in self._observers:
+            observer.apply(op, old, new)
+
+    def _emit_reset(self, items):
+        for observer in self._observers:
+            observer.reset(items)
+
+
+class JsonCollectionBackend(CollectionEvents):
+    """
+    Colección guardada en un archivo JSON {"items": [...]}, indexada en
+    memoria por id con una fila compacta (Record) por item. Las lecturas no
+    toman lock; las escrituras se serializan y reemplazan las filas
+    (copy-on-write) en lugar de mutarlas. El archivo
+    se reescribe completo en cada cambio, de forma atómica y solo si ningún
+    otro proceso lo modificó desde la última lectura.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.name = schema.name
+        self.path = schema.path
+        self._lock = threading.RLock()
+        self._items = None
+        self._seqs = {}
+        self._next_seq = itertools.count(1)
+        self._version = 0
+        self._sorted = {}
+        self._observers = []
+        self._stat_key = None
+        self._checked_at = 0.0
+
+    def _index(self, fresh=False):
+        items = self._items
+        now = time.monotonic()
+        if not fresh and items is not None and now - self._checked_at < CONFIG_RECHECK_SECONDS:
+            return items
+        with self._lock:
+            stat_key = file_stat_key(self.path)
+            if self._items is None or stat_key != self._stat_key:
+                data, stat_key = load_json_file(self.path, lambda: {"items": []})
+                record = self.schema.record
+                items = {item["id"]: record(item) for item in data.get("items", [])}
+                self._seqs = {item_id: next(self._next_seq) for item_id in items}
+                reloaded = self._items is not None
+                self._items = items
+                self._version += 1
+                self._stat_key = stat_key
+                self._checked_at = now
+                if reloaded:
+                    # El archivo cambió fuera de este proceso
+                    self._emit_reset(list(items.values()))
+            self._checked_at = now
+            return self._items
+
+    def refresh(self, fresh=False):
+        """Relee el archivo si otro proceso lo cambió (los observadores reciben reset)"""
+        self._index(fresh)
+
+    def _current_items(self):
+        return list(self._index(fresh=True).values())
+
+    def _commit(self, change):
+        """
+        Aplica change(index) -> (index_nuevo o None, resultado, eventos) sobre
+        el contenido actual del disco y lo guarda solo si el archivo no cambió
+        entretanto (otro worker); si cambió, relee y vuelve a intentar, el
+        último intento con el lock del archivo tomado.
+        """
+        with self._lock:
+            for attempt in range(OPTIMISTIC_WRITE_RETRIES + 1):
+                last = attempt == OPTIMISTIC_WRITE_RETRIES
+                with file_lock(self.path) if last else nullcontext():
+                    index = self._index(fresh=True)
+                    new_index, result, events = change(index)
+                    if new_index is None:
+                        return result
+                    payload = dump_collection_bytes(new_index.values())
+                    try:
+                        stat_key = commit_json_file(self.path, payload, expected=self._stat_key)
+                    except WriteConflict:
+                        if last:
+                            raise
+                        continue
+                seqs = dict(self._seqs)
+                for op, old, new in events:
+                    if op == "insert":
+                        seqs.setdefault(new["id"], next(self._next_seq))
+                self._seqs = seqs
+                self._items = new_index
+                self._version += 1
+                self._stat_key = stat_key
+                self._checked_at = time.monotonic()
+                for op, old, new in events:
+                    self._emit(op, old, new)
+                return result
+
+    def version_tag(self):
+        """ETag de la versión del archivo (el mismo en todos los workers), o None si no existe"""
+        self._index()
+        return stat_etag(self._stat_key)
+
+    def list_items(self):
+        return list(self._index().values())
+
+    def iter_items(self):
+        # El dict publicado nunca se muta, así que se puede recorrer sin copiarlo
+        return iter(self._index().values())
+
+    def count(self):
+        return len(self._index())
+
+    def get(self, item_id):
+        return self._index().get(item_id)
+
+    def insert(self, item):
+        return self.insert_many([item])[0]
+
+    def insert_many(self, items):
+        def change(index):
+            index = dict(index)
+            for item in items:
+                index[item["id"]] = item
+            return index, items, [("insert", None, item) for item in items]
+
+        return self._commit(change)
+
+    def update(self, item_id, changes, if_match=None):
+        """
+        Aplica `changes` a la fila; devuelve la fila nueva o None si no existe.
+        Con if_match lanza WriteConflict si la fila ya no tiene ese ETag.
+        """
+        def change(index):
+            current = index.get(item_id)
+            if current is None:
+                return None, None, []
+            check_item_etag(current, if_match)
+            updated = current.replace(changes)
+            index = dict(index)
+            index[item_id] = updated
+            return index, updated, [("update", current, updated)]
+
+        return self._commit(change)
+
+    def delete(self, item_id, if_match=None):
+        def change(index):
+            current = index.get(item_id)
+            if current is None:
+                return None, False, []
+            check_item_etag(current, if_match)
+            index = dict(index)
+            del index[item_id]
+            return index, True, [("delete", current, None)]
+
+        return self._commit(change)
+
+    def _sorted_rows(self, field):
+        """
+        (filas, claves): filas (clave, item) en orden ascendente y la lista de
+        sus claves para bisect. Se recalculan solo tras cambios.
+        """
+        self._index()
+        # Filas, seqs y versión se publican juntos bajo el lock: leídos por
+        # separado, un commit o una recarga en medio los mezclaría
+        with self._lock:
+            index, seqs, version = self._items, self._seqs, self._version
+        cached = self._sorted.get(field)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+        rows = sorted(
+            ((sort_key(item, field, seqs[item_id]), item) for item_id, item in index.items()),
+            key=lambda row: row[0],
+        )
+        keys = [key for key, _ in rows]
+        self._sorted[field] = (version, rows, keys)
+        return rows, keys
+
+    def query(self, q):
+        """Devuelve (items, total, clave_del_ultimo_item o None si no hay más páginas)"""
+        rows, keys = self._sorted_rows(q.sort_field)
+        if q.filters:
+            rows = [row for row in rows if item_matches(row[1], q.filters)]
+            keys = [key for key, _ in rows]
+        total = len(rows)
+        if not q.desc:
+            start = bisect.bisect_right(keys, q.cursor) if q.cursor else 0
+            end = total if q.limit is None else min(total, start + q.limit)
+            page = rows[start:end]
+            has_more = end < total
+        else:
+            end = bisect.bisect_left(keys, q.cursor) if q.cursor else total
+            start = 0 if q.limit is None else max(0, end - q.limit)
+            page = rows[start:end][::-1]
+            has_more = start > 0
+        next_key = page[-1][0] if page and has_more else None
+        return [item for _, item in page], total, next_key
+
+
+class SqliteCollectionBackend(CollectionEvents):
+    """
+    Colección guardada en una tabla SQLite (modo WAL). Lookup por id con
+    índice, updates y deletes de una sola fila, y transacciones IMMEDIATE
+    para que los escritores concurrentes (hilos o procesos) no pierdan
+    cambios. `seq` conserva el orden de inserción.
+    """
+
+    def __init__(self, schema, db_path, legacy_path=None):
+        self.schema = schema
+        self.name = name = schema.name
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._observers = []
+        # Versión de la colección (tabla collection_versions) que ya reflejan los observadores
+        self._version = None
+        self._checked_at = 0.0
+        self._table = f'"col_{name}"'
+        with self._transaction() as conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._table} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "id TEXT NOT NULL UNIQUE, "
+                "data TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS migrations ("
+                "collection TEXT PRIMARY KEY, source TEXT, rows INTEGER, migrated_at TEXT)"
+            )
+            # Cada escritura la incrementa: así un worker nota lo que escribieron los demás
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS collection_versions ("
+                "collection TEXT PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO collection_versions VALUES (?, 0)", (name,))
+            for field in schema.sort_fields:
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "col_{name}_{field}" '
+                    f"ON {self._table} ({_sql_field(field)}, seq)"
+                )
+        if legacy_path is not None:
+            self.migrate_from_json(legacy_path)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.create_function("casefold", 1, _sql_casefold, deterministic=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _read_version(self, conn):
+        row = conn.execute(
+            "SELECT version FROM collection_versions WHERE collection = ?", (self.name,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump_version(self, conn):
+        """Incrementa la versión dentro de la transacción; devuelve la anterior"""
+        version = self._read_version(conn)
+        conn.execute(
+            "UPDATE collection_versions SET version = ? WHERE collection = ?", (version + 1, self.name)
+        )
+        return version
+
+    def _write(self, change):
+        """
+        Corre change(conn) -> (resultado, eventos) en una transacción que
+        también incrementa la versión, y avisa los eventos. Si la versión de
+        antes no era la que ya vieron los observadores, otro proceso escribió
+        entretanto: en lugar de los deltas reciben reset.
+        """
+        with self._lock:
+            with self._transaction() as conn:
+                result, events = change(conn)
+                previous = self._bump_version(conn) if events else None
+            if events:
+                if previous != self._version:
+                    self._reload()
+                else:
+                    self._version = previous + 1
+                    for op, old, new in events:
+                        self._emit(op, old, new)
+                self._checked_at = time.monotonic()
+            return result
+
+    def _snapshot(self):
+        """(versión, filas) leídas en una misma transacción"""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            version = self._read_version(conn)
+            rows = conn.execute(f"SELECT data FROM {self._table} ORDER BY seq").fetchall()
+        finally:
+            conn.execute("COMMIT")
+        return version, [self._row(data) for (data,) in rows]
+
+    def _reload(self):
+        """Toma la versión actual y manda reset a los observadores; devuelve las filas"""
+        version, items = self._snapshot()
+        if version != self._version:
+            self._version = version
+            self._emit_reset(items)
+        return items
+
+    def refresh(self, fresh=False):
+        """Si otro proceso escribió desde la última versión vista, los observadores reciben reset"""
+        now = time.monotonic()
+        if not fresh and now - self._checked_at < CONFIG_RECHECK_SECONDS:
+            return
+        with self._lock:
+            if self._read_version(self._conn()) != self._version:
+                self._reload()
+            self._checked_at = now
+
+    def _current_items(self):
+        self._checked_at = time.monotonic()
+        return self._reload()
+
+    def migrate_from_json(self, path, force=False):
+        """
+        Importa data/<coleccion>.json una sola vez (queda registrado en la
+        tabla migrations). Devuelve el número de filas importadas.
+        """
+        with self._lock:
+            with self._transaction() as conn:
+                done = conn.execute(
+                    "SELECT 1 FROM migrations WHERE collection = ?", (self.name,)
+                ).fetchone()
+                if done and not force:
+                    return 0
+                items = []
+                if Path(path).exists():
+                    items = load_json_file(Path(path), lambda: {"items": []})[0].get("items", [])
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {self._table} (id, data) VALUES (?, ?)",
+                    [(item["id"], json.dumps(item, ensure_ascii=False)) for item in items],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO migrations VALUES (?, ?, ?, ?)",
+                    (self.name, str(path), len(items), datetime.utcnow().isoformat() + "Z"),
+                )
+                self._bump_version(conn)
+            # Las filas importadas llegan a los observadores como un reset
+            self._reload()
+            return len(items)
+
+    def _row(self, data):
+        return self.schema.record(json.loads(data))
+
+    def version_tag(self):
+        # Sin una versión barata y común a todos los procesos: el ETag sale del body
+        return None
+
+    def list_items(self):
+        rows = self._conn().execute(f"SELECT data FROM {self._table} ORDER BY seq")
+        return [self._row(data) for (data,) in rows]
+
+    def iter_items(self, chunk_size=1000):
+        # Por tramos de seq para no mantener abierta una lectura durante todo el recorrido
+        last_seq = 0
+        while True:
+            rows = self._conn().execute(
+                f"SELECT seq, data FROM {self._table} WHERE seq > ? ORDER BY seq LIMIT ?",
+                (last_seq, chunk_size),
+            ).fetchall()
+            if not rows:
+                return
+            for seq, data in rows:
+                yield self._row(data)
+            last_seq = rows[-1][0]
+
+    def count(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def get(self, item_id):
+        row = self._conn().execute(
+            f"SELECT data FROM {self._table} WHERE id = ?", (item_id,)
+        ).fetchone()
+        return self._row(row[0]) if row else None
+
+    def insert(self, item):
+        return self.insert_many([item])[0]
+
+    def insert_many(self, items):
+        def change(conn):
+            conn.executemany(
+                f"INSERT INTO {self._table} (id, data) VALUES (?, ?)",
+                [(item["id"], json.dumps(item.to_dict(), ensure_ascii=False)) for item in items],
+            )
+            return items, [("insert", None, item) for item in items]
+
+        return self._write(change)
+
+    def update(self, item_id, changes, if_match=None):
+        def change(conn):
+            row = conn.execute(
+                f"SELECT data FROM {self._table} WHERE id = ?", (item_id,)
+            ).fetchone()
+            if row is None:
+                return None, []
+            current = self._row(row[0])
+            check_item_etag(current, if_match)
+            updated = current.replace(changes)
+            conn.execute(
+                f"UPDATE {self._table} SET data = ? WHERE id = ?",
+                (json.dumps(updated.to_dict(), ensure_ascii=False), item_id),
+            )
+            return updated, [("update", current, updated)]
+
+        return self._write(change)
+
+    def delete(self, item_id, if_match=None):
+        def change(conn):
+            row = conn.execute(
+                f"SELECT data FROM {self._table} WHERE id = ?", (item_id,)
+            ).fetchone()
+            if row is None:
+                return False, []
+            current = self._row(row[0])
+            check_item_etag(current, if_match)
+            conn.execute(f"DELETE FROM {self._table} WHERE id = ?", (item_id,))
+            return True, [("delete", current, None)]
+
+        return self._write(change)
+
+    def query(self, q):
+        where, params = [], []
+        for op, field, value in q.filters:
+            column = _sql_field(field)
+            if op == "prefix":
+                where.append(f"substr(casefold({column}), 1, ?) = ?")
+                params += [len(value), value]
+            elif op == "contains":
+                where.append(f"instr(casefold({column}), ?) > 0")
+                params.append(value)
+            elif op == "min":
+                where.append(_sql_number_filter(field, ">="))
+                params.append(value)
+            elif op == "max":
+                where.append(_sql_number_filter(field, "<="))
+                params.append(value)
+        filter_sql = " AND ".join(where) or "1"
+        total = self._conn().execute(
+            f"SELECT COUNT(*) FROM {self._table} WHERE {filter_sql}", params
+        ).fetchone()[0]
+
+        # Sin campo de orden se ordena solo por seq (una constante no altera el orden)
+        column = _sql_field(q.sort_field) if q.sort_field else "''"
+        direction, cmp = ("DESC", "<") if q.desc else ("ASC", ">")
+        page_sql, page_params = filter_sql, list(params)
+        if q.cursor:
+            # cursor = ((rango, valor), seq): continuar después de esa fila
+            (_, value), seq = q.cursor
+            value = value if q.sort_field else ""
+            page_sql += f" AND ({column} {cmp} ? OR ({column} = ? AND seq {cmp} ?))"
+            page_params += [value, value, seq]
+        sql = (
+            f"SELECT data, {column}, seq FROM {self._table} WHERE {page_sql} "
+            f"ORDER BY {column} {direction}, seq {direction}"
+        )
+        if q.limit is not None:
+            sql += " LIMIT ?"
+            page_params.append(q.limit + 1)
+        rows = self._conn().execute(sql, page_params).fetchall()
+        has_more = q.limit is not None and len(rows) > q.limit
+        rows = rows[:q.limit] if has_more else rows
+        next_key = None
+        if has_more:
+            _, value, seq = rows[-1]
+            next_key = ((_sort_rank(value) if q.sort_field else (0, 0)), seq)
+        return [self._row(data) for data, _, _ in rows], total, next_key
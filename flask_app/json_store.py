@@ -0,0 +1,226 @@
+"""
+Persistencia de archivos JSON: escrituras atómicas, copia de respaldo y
+locks entre hilos y procesos. La usan el config store (settings.json,
+tools.json), las conversaciones y el backend json de las colecciones.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import file_io_bytes, file_io_duration, file_io_operations
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo locks entre hilos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_ready_dirs = set()
+
+
+def ensure_parent_dir(path):
+    # Solo la primera escritura en cada directorio lo crea; las siguientes son un no-op
+    if path.parent not in _ready_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _ready_dirs.add(path.parent)
+
+# Cada cuánto (segundos) se vuelve a hacer stat() del archivo para detectar
+# ediciones externas. Las escrituras hechas por esta app se ven al instante.
+CONFIG_RECHECK_SECONDS = float(os.getenv("CONFIG_RECHECK_SECONDS", "1.0"))
+
+# Se guarda junto a cada archivo la última versión buena (<archivo>.bak)
+JSON_BACKUP_SUFFIX = ".bak"
+# Lee-modifica-escribe: intentos sin lock antes de repetir con el lock tomado
+OPTIMISTIC_WRITE_RETRIES = 3
+
+
+class WriteConflict(Exception):
+    """El archivo (o la fila) cambió desde que se leyó; el llamador debe reintentar"""
+
+
+def file_stat_key(path):
+    """(mtime, tamaño, inode) del archivo, o None si no existe"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def stat_etag(stat_key):
+    """ETag de un archivo: igual en todos los procesos mientras no se reescriba"""
+    if stat_key is None:
+        return None
+    mtime_ns, size, ino = stat_key
+    return f'"{ino:x}-{mtime_ns:x}-{size:x}"'
+
+
+def content_etag(data):
+    """ETag de un objeto JSON según su contenido (p. ej. una herramienta o una fila)"""
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return f'"{digest.hexdigest()[:20]}"'
+
+
+def bytes_etag(data):
+    """ETag de un body ya serializado"""
+    return f'"{hashlib.sha1(data).hexdigest()[:20]}"'
+
+
+def etag_matches(if_match, etag):
+    """Compara el header If-Match (puede traer varias etiquetas o *) con un ETag"""
+    if if_match is None:
+        return True
+    tags = [tag.strip() for tag in if_match.split(",")]
+    return "*" in tags or etag in tags or (etag is not None and f"W/{etag}" in tags)
+
+
+def dump_json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Lock exclusivo y reentrante entre hilos y entre procesos (flock sobre
+    <archivo>.lock). Las escrituras normales lo toman solo para el reemplazo,
+    no para serializar ni para el fsync.
+    """
+    with _file_locks_guard:
+        entry = _file_locks.get(path)
+        if entry is None:
+            handle = None
+            if fcntl is not None:
+                handle = open(path.with_name(path.name + ".lock"), "a+b")
+            entry = _file_locks[path] = [threading.RLock(), handle, 0]
+    thread_lock, handle = entry[0], entry[1]
+    with thread_lock:
+        entry[2] += 1
+        try:
+            if entry[2] == 1 and handle is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            yield
+        finally:
+            entry[2] -= 1
+            if entry[2] == 0 and handle is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _fsync_dir(directory):
+    # Persiste el rename; no existe en Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def commit_json_file(path, payload, expected=False, backup=True, on_commit=None):
+    """
+    Escribe `payload` (bytes) en `path` de forma atómica: archivo temporal en
+    el mismo directorio + fsync + rename, guardando antes la versión anterior
+    como copia de respaldo (salvo backup=False). Si `expected` no es False,
+    solo reemplaza si el archivo sigue teniendo ese stat key (None = no debe
+    existir); si no, lanza WriteConflict. on_commit(stat_key) corre todavía
+    con el lock tomado. Devuelve el stat key nuevo.
+    """
+    ensure_parent_dir(path)
+    started = time.perf_counter()
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with file_lock(path):
+            current = file_stat_key(path)
+            if expected is not False and current != expected:
+                raise WriteConflict(f"{path.name} cambió mientras se editaba")
+            if backup and current is not None:
+                # Hard link: el .bak conserva el inode actual sin copiar datos
+                backup_tmp = tmp_path.with_suffix(".bak.tmp")
+                try:
+                    os.link(path, backup_tmp)
+                except OSError:
+                    shutil.copyfile(path, backup_tmp)
+                os.replace(backup_tmp, path.with_name(path.name + JSON_BACKUP_SUFFIX))
+            os.replace(tmp_path, path)
+            stat_key = file_stat_key(path)
+            if on_commit is not None:
+                on_commit(stat_key)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    _fsync_dir(path.parent)
+    file_io_operations.inc("write", path.name)
+    file_io_bytes.inc("write", path.name, amount=len(payload))
+    file_io_duration.observe(time.perf_counter() - started, "write")
+    return stat_key
+
+
+def _read_json_file(path):
+    """(data, stat_key) del archivo; el stat sale del mismo descriptor que se leyó"""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        data = json.load(f)
+    file_io_operations.inc("read", path.name)
+    file_io_bytes.inc("read", path.name, amount=st.st_size)
+    file_io_duration.observe(time.perf_counter() - started, "read")
+    return data, (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def load_json_file(path, default_factory):
+    """
+    Lee un archivo JSON y devuelve (data, stat_key). Si no existe lo crea con
+    los valores por defecto. Si está dañado restaura la última copia buena;
+    solo si tampoco hay copia usable aparta el archivo dañado y arranca de cero.
+    """
+    ensure_parent_dir(path)
+    try:
+        return _read_json_file(path)
+    except FileNotFoundError:
+        data = default_factory()
+        try:
+            return data, commit_json_file(path, dump_json_bytes(data), expected=None)
+        except WriteConflict:
+            # Otro proceso lo creó primero
+            return load_json_file(path, default_factory)
+    except (OSError, ValueError) as e:
+        error = e
+
+    stat_key = file_stat_key(path)
+    backup_path = path.with_name(path.name + JSON_BACKUP_SUFFIX)
+    try:
+        data, _ = _read_json_file(backup_path)
+    except (OSError, ValueError):
+        corrupt_path = path.with_name(f"{path.name}.corrupt-{int(time.time())}")
+        logger.error("%s dañado (%s) y sin copia usable; se aparta como %s",
+                     path.name, error, corrupt_path.name)
+        with file_lock(path):
+            if file_stat_key(path) == stat_key:
+                os.replace(path, corrupt_path)
+        return load_json_file(path, default_factory)
+
+    logger.warning("%s dañado (%s); se restaura %s", path.name, error, backup_path.name)
+    try:
+        # Sin respaldo: el archivo dañado no debe pisar la copia buena
+        return data, commit_json_file(path, dump_json_bytes(data), expected=stat_key, backup=False)
+    except WriteConflict:
+        # Otro proceso lo reescribió mientras tanto: leer lo nuevo
+        return load_json_file(path, default_factory)
@@ -0,0 +1,194 @@
+"""
+Métricas en formato de texto de Prometheus (ver GET /metrics en app.py).
+
+Contadores, histogramas y métricas calculadas al exportar, registrados en
+un único MetricsRegistry por proceso, más las métricas comunes de HTTP,
+servicios externos y archivos de datos.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Límites (segundos) de los buckets de los histogramas de latencia
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Las lecturas/escrituras de archivos son órdenes de magnitud más rápidas
+METRICS_FILE_IO_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_sample(name, labelnames, labels, value):
+    if labelnames:
+        pairs = ",".join(f'{n}="{_escape_label(v)}"' for n, v in zip(labelnames, labels))
+        name = f"{name}{{{pairs}}}"
+    if isinstance(value, float):
+        value = repr(value) if value == value and value not in (float("inf"), float("-inf")) else "NaN"
+    return f"{name} {value}"
+
+
+class Counter:
+    """Contador por combinación de labels (los valores se pasan en orden)"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, self.labelnames, labels, value
+
+
+class Histogram:
+    """
+    Histograma de buckets fijos por combinación de labels. observe() solo
+    hace una búsqueda binaria y suma bajo un lock: los acumulados que pide
+    Prometheus se calculan al exportar.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=METRICS_LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._bounds = [repr(float(b)) for b in self.buckets] + ["+Inf"]
+        self._series = {}   # labels -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, n in zip(self._bounds, counts):
+                cumulative += n
+                yield f"{self.name}_bucket", bucket_labelnames, labels + (bound,), cumulative
+            yield f"{self.name}_sum", self.labelnames, labels, total
+            yield f"{self.name}_count", self.labelnames, labels, count
+
+
+class CallbackMetric:
+    """Métrica cuyo valor se lee al exportar: collect() devuelve [(labels, valor)]"""
+
+    def __init__(self, name, help, kind, labelnames, collect):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._collect = collect
+
+    def samples(self):
+        for labels, value in self._collect():
+            yield self.name, self.labelnames, labels, value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception as e:
+                # Un colector roto no debe tumbar todo el scrape
+                logger.warning("No se pudo leer la métrica %s: %s", metric.name, e)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format_sample(*sample) for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+http_request_duration = metrics.register(Histogram(
+    "http_request_duration_seconds",
+    "Duración de las requests HTTP por ruta, hasta enviar el último byte",
+    ("method", "route", "status"),
+))
+upstream_request_duration = metrics.register(Histogram(
+    "upstream_request_duration_seconds",
+    "Duración de las llamadas a servicios externos (OpenAI, herramientas)",
+    ("upstream", "name", "status"),
+))
+upstream_errors = metrics.register(Counter(
+    "upstream_errors_total",
+    "Llamadas a servicios externos que terminaron en excepción, por tipo",
+    ("upstream", "error"),
+))
+file_io_operations = metrics.register(Counter(
+    "file_io_operations_total", "Lecturas y escrituras de archivos de datos", ("op", "file"),
+))
+file_io_bytes = metrics.register(Counter(
+    "file_io_bytes_total", "Bytes leídos y escritos en archivos de datos", ("op", "file"),
+))
+file_io_duration = metrics.register(Histogram(
+    "file_io_duration_seconds", "Duración de lecturas y escrituras de archivos de datos",
+    ("op",), buckets=METRICS_FILE_IO_BUCKETS,
+))
+
+
+def upstream_status(error):
+    """Código HTTP de una excepción de requests/httpx/openai, o "error" si no lo hay"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status or "error"
+
+
+def observe_upstream(upstream, name, status, seconds, error=None):
+    upstream_request_duration.observe(seconds, upstream, name, status)
+    if error is not None:
+        upstream_errors.inc(upstream, type(error).__name__)
+
+
+@contextmanager
+def upstream_timer(upstream, name=""):
+    """
+    Mide una llamada a un servicio externo. El bloque puede fijar
+    call["status"] (por defecto 200); si lanza, se usa el código de la
+    excepción y se cuenta el error.
+    """
+    call = {"status": 200}
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        observe_upstream(upstream, name, upstream_status(e), time.perf_counter() - started, e)
+        raise
+    observe_upstream(upstream, name, call["status"], time.perf_counter() - started)
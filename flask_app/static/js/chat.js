@@ -6,8 +6,11 @@ document.addEventListener("DOMContentLoaded", () => {
   const downloadBtn = document.getElementById("downloadBtn");
   const modelInfo = document.getElementById("modelInfo");
 
-  // Historial mantendrá objetos { role: "user"|"assistant", content: "..." }
-  const history = [];
+  // Id de la conversación: el servidor guarda con él el historial (y su resumen),
+  // así que cada POST lleva solo el mensaje nuevo
+  const conversationId = window.crypto && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 
   // Cargar settings (modelo, temperatura) para mostrar en UI
   fetch("/api/settings")
@@ -34,31 +37,47 @@ document.addEventListener("DOMContentLoaded", () => {
     const sentAt = new Date();
     addMessage("user", text, sentAt);
 
-    // Importante: NO agregamos aún el mensaje del usuario a history que enviamos al backend,
-    // porque el backend ya agrega el mensaje actual. Lo agregaremos localmente tras la respuesta.
+    // El backend agrega este mensaje y la respuesta a la conversación guardada
     setFormEnabled(false);
 
     try {
       const res = await fetch("/api/chat", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: {
+          "Content-Type": "application/json",
+          Accept: "text/event-stream, application/json",
+        },
         body: JSON.stringify({
           message: text,
-          history, // solo historial previo
+          conversation_id: conversationId,
+          stream: true,
         }),
       });
 
-      const data = await res.json();
-      if (!res.ok) {
-        throw new Error(data && data.error ? data.error : "Error en la solicitud");
+      const contentType = res.headers.get("Content-Type") || "";
+      let reply = "";
+      if (res.ok && contentType.includes("text/event-stream") && res.body) {
+        // Mostrar la respuesta a medida que llegan los fragmentos
+        const bubble = addMessage("assistant", "", new Date());
+        const done = await readChatStream(res.body, (chunk) => {
+          reply += chunk;
+          bubble.textContent = reply;
+          transcriptEl.scrollTop = transcriptEl.scrollHeight;
+        });
+        reply = done.reply ?? reply;
+        bubble.textContent = reply;
+        if (done.metrics) {
+          console.debug("chat metrics", done.metrics);
+        }
+      } else {
+        // Respuesta JSON de siempre (servidor sin streaming o error)
+        const data = await res.json();
+        if (!res.ok) {
+          throw new Error(data && data.error ? data.error : "Error en la solicitud");
+        }
+        reply = data.reply || "";
+        addMessage("assistant", reply, data.timestamp ? new Date(data.timestamp) : new Date());
       }
-
-      // Tras respuesta exitosa, ahora sí, persistimos ambos en el historial
-      history.push({ role: "user", content: text });
-
-      const reply = data.reply || "";
-      addMessage("assistant", reply, data.timestamp ? new Date(data.timestamp) : new Date());
-      history.push({ role: "assistant", content: reply });
     } catch (err) {
       addMessage("assistant", `⚠️ Error: ${(err && err.message) || err}`, new Date());
     } finally {
@@ -111,6 +130,37 @@ document.addEventListener("DOMContentLoaded", () => {
     transcriptEl.appendChild(item);
     // Auto-scroll al final
     transcriptEl.scrollTop = transcriptEl.scrollHeight;
+    return bubble;
+  }
+
+  // Lee los eventos SSE de /api/chat: llama onDelta por cada fragmento y
+  // resuelve con el payload de "done" ({ reply, timestamp, metrics }).
+  async function readChatStream(body, onDelta) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let result = {};
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+        let event = "message";
+        let data = "";
+        raw.split("\n").forEach((line) => {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+        const payload = data ? JSON.parse(data) : {};
+        if (event === "delta") onDelta(payload.content || "");
+        else if (event === "done") result = payload;
+        else if (event === "error") throw new Error(payload.error || "Error en la solicitud");
+      }
+    }
+    return result;
   }
 
   function transcriptToPlain() {
@@ -7,6 +7,22 @@
 let editingItem = null;
 let editingType = null;
 
+// Filas cargadas de cada colección y su feed de cambios (/api/<coleccion>/changes)
+const collections = {
+  personas: { bodyId: 'personasTableBody', pagerId: 'personasPager', render: renderPersonas, load: loadPersonas },
+  gastos: { bodyId: 'gastosTableBody', pagerId: 'gastosPager', render: renderGastos, load: loadGastos }
+};
+Object.values(collections).forEach(state => {
+  Object.assign(state, {
+    rows: new Map(), total: 0, nextCursor: null, loadingMore: false,
+    version: null, source: null, pollId: 0, polling: false, renderPending: false
+  });
+});
+// Filas por página del listado (/api/<coleccion>?limit=...&cursor=...)
+const PAGE_SIZE = 100;
+const POLL_TIMEOUT_SECONDS = 25;
+const POLL_RETRY_MS = 3000;
+
 export async function init() {
   console.log('[Tablas Module] Inicializando...');
   
@@ -23,9 +39,7 @@ export async function init() {
 
 async function loadPersonas() {
   try {
-    const response = await fetch('/api/personas', { cache: 'no-store' });
-    const data = await response.json();
-    renderPersonas(data.items || []);
+    await loadCollection('personas');
   } catch (error) {
     console.error('[Tablas] Error cargando personas:', error);
     document.getElementById('personasTableBody').innerHTML = `
@@ -97,8 +111,8 @@ async function createPersona(event) {
     
     if (response.ok) {
       hideCreatePersonaForm();
-      // Recargar inmediatamente sin esperar
-      loadPersonas();
+      // El feed de cambios trae la fila nueva; sin feed, recargar
+      reloadIfNotWatching('personas');
       showNotification('✅ Persona creada exitosamente');
     } else {
       const error = await response.json();
@@ -112,9 +126,7 @@ async function createPersona(event) {
 
 async function editPersona(id) {
   try {
-    const response = await fetch('/api/personas');
-    const data = await response.json();
-    const persona = data.items.find(p => p.id === id);
+    const persona = collections.personas.rows.get(id);
     
     if (!persona) {
       showNotification('❌ Persona no encontrada', 'error');
@@ -160,8 +172,7 @@ async function deletePersona(id) {
     });
     
     if (response.ok) {
-      // Recargar inmediatamente sin esperar
-      loadPersonas();
+      reloadIfNotWatching('personas');
       showNotification('✅ Persona eliminada exitosamente');
     } else {
       const error = await response.json();
@@ -179,9 +190,7 @@ async function deletePersona(id) {
 
 async function loadGastos() {
   try {
-    const response = await fetch('/api/gastos', { cache: 'no-store' });
-    const data = await response.json();
-    renderGastos(data.items || []);
+    await loadCollection('gastos');
   } catch (error) {
     console.error('[Tablas] Error cargando gastos:', error);
     document.getElementById('gastosTableBody').innerHTML = `
@@ -251,8 +260,7 @@ async function createGasto(event) {
     
     if (response.ok) {
       hideCreateGastoForm();
-      // Recargar inmediatamente sin esperar
-      loadGastos();
+      reloadIfNotWatching('gastos');
       showNotification('✅ Gasto creado exitosamente');
     } else {
       const error = await response.json();
@@ -266,9 +274,7 @@ async function createGasto(event) {
 
 async function editGasto(id) {
   try {
-    const response = await fetch('/api/gastos');
-    const data = await response.json();
-    const gasto = data.items.find(g => g.id === id);
+    const gasto = collections.gastos.rows.get(id);
     
     if (!gasto) {
       showNotification('❌ Gasto no encontrado', 'error');
@@ -310,8 +316,7 @@ async function deleteGasto(id) {
     });
     
     if (response.ok) {
-      // Recargar inmediatamente sin esperar
-      loadGastos();
+      reloadIfNotWatching('gastos');
       showNotification('✅ Gasto eliminado exitosamente');
     } else {
       const error = await response.json();
@@ -367,12 +372,7 @@ async function saveEdit() {
       // Guardar el tipo antes de cerrar el modal
       const type = editingType;
       closeEditModal();
-      // Recargar inmediatamente sin esperar
-      if (type === 'persona') {
-        loadPersonas();
-      } else {
-        loadGastos();
-      }
+      reloadIfNotWatching(type === 'persona' ? 'personas' : 'gastos');
       showNotification('✅ Actualizado exitosamente');
     } else {
       const error = await response.json();
@@ -384,6 +384,191 @@ async function saveEdit() {
   }
 }
 
+// ============================================================================
+// FEED DE CAMBIOS
+// ============================================================================
+
+async function fetchPage(name, cursor) {
+  const params = new URLSearchParams({ limit: PAGE_SIZE });
+  if (cursor) {
+    params.set('cursor', cursor);
+  }
+  const response = await fetch(`/api/${name}?${params}`, { cache: 'no-store' });
+  const data = await response.json();
+  if (!response.ok) {
+    throw new Error(data.error || `Error ${response.status}`);
+  }
+  return { data, response };
+}
+
+// Carga la primera página y luego aplica los cambios del feed
+async function loadCollection(name) {
+  const state = collections[name];
+  const { data, response } = await fetchPage(name, null);
+  state.rows = new Map((data.items || []).map(item => [item.id, item]));
+  state.nextCursor = data.next_cursor || null;
+  state.total = parseInt(response.headers.get('X-Total-Count'), 10) || state.rows.size;
+  state.version = response.headers.get('X-Collection-Version');
+  renderCollection(name);
+  watchCollection(name);
+}
+
+// Página siguiente ("Cargar más"); el feed mantiene al día las filas ya cargadas
+async function loadMore(name) {
+  const state = collections[name];
+  if (!state.nextCursor || state.loadingMore) {
+    return;
+  }
+  state.loadingMore = true;
+  renderPager(name);
+  try {
+    const { data, response } = await fetchPage(name, state.nextCursor);
+    (data.items || []).forEach(item => state.rows.set(item.id, item));
+    state.nextCursor = data.next_cursor || null;
+    state.total = parseInt(response.headers.get('X-Total-Count'), 10) || state.total;
+  } catch (error) {
+    console.error(`[Tablas] Error cargando más ${name}:`, error);
+    showNotification('❌ Error al cargar más filas', 'error');
+  } finally {
+    state.loadingMore = false;
+  }
+  renderCollection(name);
+}
+
+function renderCollection(name) {
+  const state = collections[name];
+  state.render(Array.from(state.rows.values()));
+  renderPager(name);
+}
+
+function renderPager(name) {
+  const state = collections[name];
+  const pager = document.getElementById(state.pagerId);
+  if (!pager) {
+    return;
+  }
+  if (!state.nextCursor) {
+    pager.innerHTML = '';
+    return;
+  }
+  pager.innerHTML = `
+    <span style="color: #64748b;">Mostrando ${state.rows.size} de ${state.total}</span>
+    <button class="btn btn-sm" onclick="tablasModule.loadMore('${name}')" ${state.loadingMore ? 'disabled' : ''}>
+      ${state.loadingMore ? 'Cargando...' : 'Cargar más'}
+    </button>
+  `;
+}
+
+function isMounted(name) {
+  return document.getElementById(collections[name].bodyId) !== null;
+}
+
+function isWatching(name) {
+  const state = collections[name];
+  return state.polling || (state.source !== null && state.source.readyState !== EventSource.CLOSED);
+}
+
+function reloadIfNotWatching(name) {
+  if (!isWatching(name)) {
+    collections[name].load();
+  }
+}
+
+function stopWatching(name) {
+  const state = collections[name];
+  if (state.source) {
+    state.source.close();
+    state.source = null;
+  }
+  state.pollId += 1;
+  state.polling = false;
+}
+
+function watchCollection(name) {
+  const state = collections[name];
+  stopWatching(name);
+  if (state.version === null) {
+    return;
+  }
+
+  if (!window.EventSource) {
+    pollChanges(name, state.pollId);
+    return;
+  }
+
+  // Al reconectar, EventSource manda Last-Event-ID y sigue desde ahí
+  const source = new EventSource(`/api/${name}/changes?since=${state.version}`);
+  source.addEventListener('change', (event) => applyChange(name, JSON.parse(event.data)));
+  source.addEventListener('reset', () => {
+    // Quedamos demasiado atrás (o cambió el servidor): recargar todo
+    stopWatching(name);
+    state.load();
+  });
+  state.source = source;
+}
+
+// Fallback sin EventSource: long-poll contra el mismo endpoint
+async function pollChanges(name, pollId) {
+  const state = collections[name];
+  state.polling = true;
+  while (state.pollId === pollId && isMounted(name)) {
+    try {
+      const response = await fetch(
+        `/api/${name}/changes?since=${state.version}&timeout=${POLL_TIMEOUT_SECONDS}`,
+        { cache: 'no-store' }
+      );
+      const data = await response.json();
+      if (state.pollId !== pollId) {
+        return;
+      }
+      if (data.reset) {
+        stopWatching(name);
+        state.load();
+        return;
+      }
+      (data.changes || []).forEach(change => applyChange(name, change));
+      state.version = data.version;
+    } catch (error) {
+      console.error(`[Tablas] Error consultando cambios de ${name}:`, error);
+      await new Promise(resolve => setTimeout(resolve, POLL_RETRY_MS));
+    }
+  }
+  if (state.pollId === pollId) {
+    state.polling = false;
+  }
+}
+
+function applyChange(name, change) {
+  const state = collections[name];
+  if (!isMounted(name)) {
+    // Se cambió de módulo: la tabla ya no está en pantalla
+    stopWatching(name);
+    return;
+  }
+  if (change.op === 'delete') {
+    state.rows.delete(change.id);
+    state.total = Math.max(0, state.total - 1);
+  } else if (change.op === 'insert') {
+    state.total += 1;
+    // Las altas van al final: si faltan páginas, llegará con "Cargar más"
+    if (!state.nextCursor) {
+      state.rows.set(change.id, change.item);
+    }
+  } else if (state.rows.has(change.id)) {
+    state.rows.set(change.id, change.item);
+  }
+  state.version = change.version;
+
+  // Una importación trae muchos cambios seguidos: un solo render por frame
+  if (!state.renderPending) {
+    state.renderPending = true;
+    requestAnimationFrame(() => {
+      state.renderPending = false;
+      renderCollection(name);
+    });
+  }
+}
+
 // ============================================================================
 // UTILIDADES
 // ============================================================================
@@ -441,15 +626,14 @@ style.textContent = `
 document.head.appendChild(style);
 
 // Función pública para refrescar datos desde eventos externos
+// (si el feed de cambios está activo, los cambios ya llegan solos)
 function refresh(collection) {
-  if (collection === 'personas') {
-    loadPersonas();
-  } else if (collection === 'gastos') {
-    loadGastos();
+  if (collection === 'personas' || collection === 'gastos') {
+    reloadIfNotWatching(collection);
   } else {
     // Si no se especifica, recargar ambas
-    loadPersonas();
-    loadGastos();
+    reloadIfNotWatching('personas');
+    reloadIfNotWatching('gastos');
   }
 }
 
@@ -467,5 +651,6 @@ window.tablasModule = {
   deleteGasto,
   closeEditModal,
   saveEdit,
+  loadMore,
   refresh
 };
@@ -807,6 +807,76 @@
       animationId = requestAnimationFrame(draw);
     }
     
+    // Herramientas que modifican colecciones: al terminar bien se avisa a la página
+    const CRUD_TOOLS = {
+      'crearPersona': 'personas',
+      'modificarPersona': 'personas',
+      'borrarPersona': 'personas',
+      'crearGasto': 'gastos',
+      'modificarGasto': 'gastos',
+      'borrarGasto': 'gastos'
+    };
+    
+    // Ejecuta varias function calls en una sola petición; resultados en el mismo orden
+    async function executeTools(calls) {
+      try {
+        const response = await fetch(SERVER_URL + "/api/execute_tools", {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ calls: calls })
+        });
+        const data = await response.json();
+        if (!response.ok) throw new Error(data.error || ("HTTP " + response.status));
+        return data.results;
+      } catch (error) {
+        return calls.map((call) => ({ call_id: call.call_id, success: false, error: error.message || "Error desconocido" }));
+      }
+    }
+    
+    function sendFunctionOutput(callId, output) {
+      dc.send(JSON.stringify({
+        type: "conversation.item.create",
+        item: { type: "function_call_output", call_id: callId, output: output }
+      }));
+    }
+    
+    async function handleFunctionCalls(items) {
+      const calls = [];
+      for (const item of items) {
+        try {
+          calls.push({ call_id: item.call_id, tool_name: item.name, arguments: JSON.parse(item.arguments || "{}") });
+        } catch (error) {
+          sendFunctionOutput(item.call_id, JSON.stringify({ error: error.message || "Argumentos inválidos" }));
+        }
+      }
+      
+      const results = calls.length ? await executeTools(calls) : [];
+      let disconnectRequested = false;
+      results.forEach((result, i) => {
+        const call = calls[i];
+        if (result.success && CRUD_TOOLS[call.tool_name]) {
+          const collection = CRUD_TOOLS[call.tool_name];
+          console.log("[Ring] Emitiendo evento data_changed para: " + collection);
+          window.parent.postMessage({ type: "data_changed", collection: collection }, "*");
+        }
+        if (result.success && result.system_action === "disconnect") {
+          disconnectRequested = true;
+        } else if (result.success && result.system_action === "open_url") {
+          window.parent.postMessage({ type: "open_url", url: result.url }, "*");
+        } else if (result.success && result.system_action === "open_module") {
+          window.parent.postMessage({ type: "open_module", module: result.module }, "*");
+        }
+        const output = result.success ? JSON.stringify(result.result) : JSON.stringify({ error: result.error || "Error" });
+        sendFunctionOutput(call.call_id, output);
+      });
+      
+      // Una sola respuesta del asistente para todo el lote
+      dc.send(JSON.stringify({ type: "response.create" }));
+      if (disconnectRequested) {
+        setTimeout(() => cleanup(), 2000);
+      }
+    }
+    
     function wireDataChannel(channel) {
       dc = channel;
       dc.onmessage = async (e) => {
@@ -849,91 +919,13 @@
             lastAssistantEventTs = performance.now();
           }
           
-          // Manejar function calls
-          if (t === "response.function_call_arguments.done") {
-            const callId = ev.call_id;
-            const functionName = ev.name;
-            const argsString = ev.arguments || "{}";
-            
-            try {
-              const args = JSON.parse(argsString);
-              const response = await fetch(SERVER_URL + "/api/execute_tool", {
-                method: "POST",
-                headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ tool_name: functionName, arguments: args })
-              });
-              
-              const result = await response.json();
-              
-              // Emitir evento de cambio de datos si es una operación CRUD exitosa
-              if (response.ok && result.success) {
-                const crudTools = {
-                  'crearPersona': 'personas',
-                  'modificarPersona': 'personas',
-                  'borrarPersona': 'personas',
-                  'crearGasto': 'gastos',
-                  'modificarGasto': 'gastos',
-                  'borrarGasto': 'gastos'
-                };
-                
-                if (crudTools[functionName]) {
-                  const collection = crudTools[functionName];
-                  console.log(\`[Ring] Emitiendo evento data_changed para: \${collection}\`);
-                  window.parent.postMessage({ 
-                    type: "data_changed", 
-                    collection: collection 
-                  }, "*");
-                }
-              }
-              
-              if (result.success && result.system_action) {
-                if (result.system_action === "disconnect") {
-                  const output = JSON.stringify(result.result);
-                  dc.send(JSON.stringify({
-                    type: "conversation.item.create",
-                    item: { type: "function_call_output", call_id: callId, output: output }
-                  }));
-                  dc.send(JSON.stringify({ type: "response.create" }));
-                  setTimeout(() => cleanup(), 2000);
-                  return;
-                }
-                
-                if (result.system_action === "open_url") {
-                  window.parent.postMessage({ type: "open_url", url: result.url }, "*");
-                  const output = JSON.stringify(result.result);
-                  dc.send(JSON.stringify({
-                    type: "conversation.item.create",
-                    item: { type: "function_call_output", call_id: callId, output: output }
-                  }));
-                  dc.send(JSON.stringify({ type: "response.create" }));
-                  return;
-                }
-                
-                if (result.system_action === "open_module") {
-                  window.parent.postMessage({ type: "open_module", module: result.module }, "*");
-                  const output = JSON.stringify(result.result);
-                  dc.send(JSON.stringify({
-                    type: "conversation.item.create",
-                    item: { type: "function_call_output", call_id: callId, output: output }
-                  }));
-                  dc.send(JSON.stringify({ type: "response.create" }));
-                  return;
-                }
-              }
-              
-              const output = result.success ? JSON.stringify(result.result) : JSON.stringify({ error: result.error || "Error" });
-              dc.send(JSON.stringify({
-                type: "conversation.item.create",
-                item: { type: "function_call_output", call_id: callId, output: output }
-              }));
-              dc.send(JSON.stringify({ type: "response.create" }));
-            } catch (error) {
-              const errorOutput = JSON.stringify({ error: error.message || "Error desconocido" });
-              dc.send(JSON.stringify({
-                type: "conversation.item.create",
-                item: { type: "function_call_output", call_id: callId, output: errorOutput }
-              }));
-              dc.send(JSON.stringify({ type: "response.create" }));
+          // Manejar function calls: todas las de una misma respuesta van al
+          // servidor en un solo lote (/api/execute_tools), que las corre en paralelo
+          if (t === "response.done") {
+            const output = (ev.response && ev.response.output) || [];
+            const calls = output.filter((item) => item.type === "function_call");
+            if (calls.length) {
+              await handleFunctionCalls(calls);
             }
           }
         } catch {}
@@ -1,4 +1,5 @@
 /* Enhanced Energy Ring UI with improved UX and controls
+   (requiere tools-handler.js antes: las herramientas se ejecutan con window.toolsHandler)
    - Visual status indicators and error messages
    - Mute/unmute functionality
    - Better state management
@@ -409,6 +410,62 @@
     animationId = requestAnimationFrame(draw);
   }
 
+  function sendFunctionOutput(callId, output) {
+    dc.send(JSON.stringify({
+      type: "conversation.item.create",
+      item: {
+        type: "function_call_output",
+        call_id: callId,
+        output: output
+      }
+    }));
+  }
+
+  async function handleFunctionCalls(items) {
+    console.log("[ring] 🔧 Function calls detectadas:", items.length);
+
+    const calls = [];
+    for (const item of items) {
+      try {
+        calls.push({ call_id: item.call_id, name: item.name, arguments: JSON.parse(item.arguments || "{}") });
+      } catch (error) {
+        console.error("[ring] ❌ Argumentos inválidos:", error);
+        sendFunctionOutput(item.call_id, JSON.stringify({ error: error.message || 'Error desconocido' }));
+      }
+    }
+
+    const results = calls.length ? await window.toolsHandler.executeTools(calls) : [];
+    let disconnectRequested = false;
+    results.forEach((result) => {
+      if (result.success && result.system_action === "disconnect") {
+        disconnectRequested = true;
+      } else if (result.success && result.system_action === "open_url") {
+        console.log("[ring] 🌐 Abriendo URL:", result.url);
+        try {
+          window.open(result.url, '_blank', 'noopener,noreferrer');
+        } catch (error) {
+          console.error("[ring] ❌ Error abriendo URL:", error);
+        }
+      }
+      const output = result.success
+        ? JSON.stringify(result.result)
+        : JSON.stringify({ error: result.error || 'Error ejecutando herramienta' });
+      sendFunctionOutput(result.call_id, output);
+    });
+
+    // Una sola respuesta del asistente para todo el lote
+    dc.send(JSON.stringify({ type: "response.create" }));
+    console.log("[ring] ✅ Respuestas de herramientas enviadas:", results.length);
+
+    if (disconnectRequested) {
+      // Esperar un momento para que el AI responda antes de desconectar
+      setTimeout(() => {
+        console.log("[ring] 👋 Desconectando por solicitud del AI...");
+        disconnect();
+      }, 2000);
+    }
+  }
+
   function wireDataChannel(channel) {
     dc = channel;
     dc.onopen = () => {
@@ -452,129 +509,13 @@
           isAssistantResponding = false;
         }
 
-        // Manejar function calls
-        if (t === "response.function_call_arguments.done") {
-          console.log("[ring] 🔧 Function call detectado:", ev);
-          
-          const callId = ev.call_id;
-          const functionName = ev.name;
-          const argsString = ev.arguments || "{}";
-          
-          try {
-            const args = JSON.parse(argsString);
-            
-            // Ejecutar la herramienta
-            const response = await fetch('/api/execute_tool', {
-              method: 'POST',
-              headers: {
-                'Content-Type': 'application/json'
-              },
-              body: JSON.stringify({
-                tool_name: functionName,
-                arguments: args
-              })
-            });
-            
-            const result = await response.json();
-            
-            // Manejar acciones del sistema
-            if (result.success && result.system_action) {
-              console.log("[ring] 🔧 Acción del sistema detectada:", result.system_action);
-              
-              if (result.system_action === "disconnect") {
-                // Preparar respuesta antes de desconectar
-                const output = JSON.stringify(result.result);
-                const responseEvent = {
-                  type: "conversation.item.create",
-                  item: {
-                    type: "function_call_output",
-                    call_id: callId,
-                    output: output
-                  }
-                };
-                dc.send(JSON.stringify(responseEvent));
-                dc.send(JSON.stringify({ type: "response.create" }));
-                
-                // Esperar un momento para que el AI responda antes de desconectar
-                setTimeout(() => {
-                  console.log("[ring] 👋 Desconectando por solicitud del AI...");
-                  disconnect();
-                }, 2000);
-                
-                return;
-              }
-              
-              if (result.system_action === "open_url") {
-                const urlToOpen = result.url;
-                console.log("[ring] 🌐 Abriendo URL:", urlToOpen);
-                
-                // Abrir URL en nueva ventana
-                try {
-                  window.open(urlToOpen, '_blank', 'noopener,noreferrer');
-                  console.log("[ring] ✅ URL abierta exitosamente");
-                } catch (error) {
-                  console.error("[ring] ❌ Error abriendo URL:", error);
-                }
-                
-                // Enviar confirmación al AI
-                const output = JSON.stringify(result.result);
-                const responseEvent = {
-                  type: "conversation.item.create",
-                  item: {
-                    type: "function_call_output",
-                    call_id: callId,
-                    output: output
-                  }
-                };
-                dc.send(JSON.stringify(responseEvent));
-                dc.send(JSON.stringify({ type: "response.create" }));
-                
-                return;
-              }
-            }
-            
-            // Preparar la respuesta para herramientas normales
-            const output = result.success 
-              ? JSON.stringify(result.result)
-              : JSON.stringify({ error: result.error || 'Error ejecutando herramienta' });
-            
-            // Enviar la respuesta al AI
-            const responseEvent = {
-              type: "conversation.item.create",
-              item: {
-                type: "function_call_output",
-                call_id: callId,
-                output: output
-              }
-            };
-            
-            dc.send(JSON.stringify(responseEvent));
-            
-            // Crear respuesta del asistente
-            dc.send(JSON.stringify({ type: "response.create" }));
-            
-            console.log("[ring] ✅ Respuesta de herramienta enviada:", output);
-          } catch (error) {
-            console.error("[ring] ❌ Error ejecutando herramienta:", error);
-            
-            // Enviar error al AI
-            const errorOutput = JSON.stringify({ 
-              error: error.message || 'Error desconocido' 
-            });
-            
-            const responseEvent = {
-              type: "conversation.item.create",
-              item: {
-                type: "function_call_output",
-                call_id: callId,
-                output: errorOutput
-              }
-            };
-            
-            dc.send(JSON.stringify(responseEvent));
-            dc.send(JSON.stringify({ type: "response.create" }));
+        // Manejar function calls: todas las de una misma respuesta van al
+        // servidor en un solo lote (ToolsHandler.executeTools)
+        if (t === "response.done") {
+          const calls = (ev.response?.output || []).filter((item) => item.type === "function_call");
+          if (calls.length) {
+            await handleFunctionCalls(calls);
           }
-          return;
         }
 
         // Assistant speaking toggle based on server events
@@ -15,6 +15,40 @@
   // Cache de mรณdulos cargados
   const moduleCache = new Map();
 
+  // HTML de todos los módulos, pedido una sola vez a /modules al iniciar
+  let bundlePromise = null;
+
+  /**
+   * Precarga el HTML de todos los módulos en una sola request.
+   * Si falla, cada módulo se pide por separado al abrirlo.
+   */
+  function preloadModules() {
+    if (!bundlePromise) {
+      bundlePromise = fetch('/modules')
+        .then(response => response.ok ? response.json() : null)
+        .then(bundle => (bundle && bundle.modules) || {})
+        .catch(() => ({}));
+    }
+    return bundlePromise;
+  }
+
+  /**
+   * Devuelve el HTML parcial de un módulo
+   * @param {string} moduleName - Nombre del módulo
+   */
+  async function loadModuleHtml(moduleName) {
+    const bundle = await preloadModules();
+    if (typeof bundle[moduleName] === 'string') {
+      return bundle[moduleName];
+    }
+
+    const response = await fetch(`/modules/${moduleName}`);
+    if (!response.ok) {
+      throw new Error(`Error ${response.status}: ${response.statusText}`);
+    }
+    return response.text();
+  }
+
   /**
    * Carga un mรณdulo dinรกmicamente
    * @param {string} moduleName - Nombre del mรณdulo a cargar
@@ -47,13 +81,8 @@
         </div>
       `;
 
-      // Fetch del HTML parcial
-      const response = await fetch(`/modules/${moduleName}`);
-      if (!response.ok) {
-        throw new Error(`Error ${response.status}: ${response.statusText}`);
-      }
-
-      const html = await response.text();
+      // HTML parcial (del bundle precargado o, si no está, de /modules/<nombre>)
+      const html = await loadModuleHtml(moduleName);
       
       // Inyectar HTML
       appContent.innerHTML = html;
@@ -154,6 +183,9 @@
   function init() {
     console.log('[SPA] Inicializando...');
 
+    // Pedir ya el HTML de todos los módulos: navegar entre ellos no vuelve al servidor
+    preloadModules();
+
     // Configurar event listeners para el sidebar
     document.querySelectorAll('.menu-item[data-module]').forEach(item => {
       item.addEventListener('click', (e) => {
@@ -87,6 +87,46 @@ class ToolsHandler {
     }
   }
 
+  /**
+   * Ejecuta varias herramientas en una sola petición; el servidor las corre en paralelo
+   * @param {Array<{call_id?: string, name: string, arguments: object}>} calls
+   * @returns {Promise<Array<object>>} - Resultados ({call_id, success, result | error}) en el mismo orden que `calls`
+   */
+  async executeTools(calls) {
+    console.log(`🔧 Ejecutando ${calls.length} herramientas en lote`);
+
+    try {
+      const response = await fetch('/api/execute_tools', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+          calls: calls.map((call) => ({
+            call_id: call.call_id,
+            tool_name: call.name,
+            arguments: call.arguments
+          }))
+        })
+      });
+
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error || `HTTP ${response.status}`);
+      }
+
+      // Cada resultado trae además system_action/url/module si es una herramienta del sistema
+      return data.results;
+    } catch (error) {
+      console.error(`❌ Error en la llamada HTTP:`, error);
+      return calls.map((call) => ({
+        call_id: call.call_id,
+        success: false,
+        error: error.message
+      }));
+    }
+  }
+
   /**
    * Maneja un function call del Realtime API
    * @param {object} functionCall - El objeto function_call del evento
@@ -127,6 +167,41 @@ class ToolsHandler {
     return result;
   }
 
+  /**
+   * Maneja todas las function calls de una misma respuesta con una sola petición
+   * @param {Array<object>} functionCalls - Los items function_call de response.done
+   * @param {object} client - El cliente de Realtime API
+   */
+  async handleFunctionCalls(functionCalls, client) {
+    const calls = functionCalls.map(({ call_id, name, arguments: argsString }) => {
+      let args = {};
+      try {
+        args = JSON.parse(argsString || '{}');
+      } catch (error) {
+        console.error('❌ Error parseando argumentos:', error);
+      }
+      return { call_id, name, arguments: args };
+    });
+
+    const results = await this.executeTools(calls);
+
+    for (const result of results) {
+      const output = result.success
+        ? JSON.stringify(result.result)
+        : JSON.stringify({ error: result.error });
+      if (client && client.sendFunctionCallOutput) {
+        client.sendFunctionCallOutput({
+          call_id: result.call_id,
+          output: output
+        });
+      } else {
+        console.warn('⚠️ Cliente no disponible para enviar respuesta');
+      }
+    }
+
+    return results;
+  }
+
   /**
    * Configura los event listeners para el Realtime API client
    * @param {object} client - El cliente de Realtime API
@@ -137,13 +212,12 @@ class ToolsHandler {
       return;
     }
 
-    // Escuchar eventos de function call
-    client.on('conversation.item.created', (event) => {
-      const item = event.item;
-      
-      // Si es un function call, manejarlo
-      if (item.type === 'function_call') {
-        this.handleFunctionCall(item, client);
+    // Al terminar cada respuesta, ejecutar juntas todas sus function calls
+    client.on('response.done', (event) => {
+      const output = (event.response && event.response.output) || [];
+      const functionCalls = output.filter((item) => item.type === 'function_call');
+      if (functionCalls.length) {
+        this.handleFunctionCalls(functionCalls, client);
       }
     });
 
@@ -0,0 +1,81 @@
+"""
+La app lee su configuración del entorno al importarse: antes de importarla
+se apuntan FLASK_DATA_DIR y FLASK_INSTANCE_DIR a directorios temporales y se
+apaga el warm-up.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="flask_app-tests-")
+os.environ["FLASK_DATA_DIR"] = DATA_DIR
+INSTANCE_DIR = tempfile.mkdtemp(prefix="flask_app-tests-instance-")
+os.environ["FLASK_INSTANCE_DIR"] = INSTANCE_DIR
+os.environ["STARTUP_WARMUP"] = "0"
+os.environ["COLLECTION_BACKEND"] = "json"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+import app as flask_app  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def data_dir():
+    yield DATA_DIR
+    shutil.rmtree(DATA_DIR, ignore_errors=True)
+    shutil.rmtree(INSTANCE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def collection_backend(request, monkeypatch, tmp_path):
+    """
+    Corre el test con cada backend de colecciones, sobre datos vacíos en
+    tmp_path: los backends y sus observadores se crean de nuevo.
+    """
+    monkeypatch.setattr(flask_app, "COLLECTION_BACKEND", request.param)
+    monkeypatch.setattr(flask_app, "COLLECTION_DB_PATH", tmp_path / "collections.sqlite3")
+    for name in ("_collections", "_search_indexes", "_change_feeds"):
+        monkeypatch.setattr(flask_app, name, {})
+    monkeypatch.setattr(flask_app, "_gastos_stats", None)
+    for name, schema in flask_app.COLLECTIONS.items():
+        monkeypatch.setattr(schema, "path", tmp_path / f"{name}.json")
+    return request.param
+
+
+def stub_tool(name, url, **endpoint):
+    """Herramienta de tools.json que llama a url con GET"""
+    return {
+        "id": f"test-{name}",
+        "name": name,
+        "description": f"Herramienta de prueba ({name})",
+        "enabled": True,
+        "endpoint": dict({"url": url, "method": "GET", "headers": {}, "retries": 0}, **endpoint),
+        "parameters": {"type": "object", "properties": {"q": {"type": "string"}}},
+    }
+
+
+@pytest.fixture
+def tool_backend():
+    """
+    Stub de bench/stubs.py (/fast, /slow tarda 1 s, /fail responde 500)
+    configurado en tools.json como fast, slow y fail. Devuelve la URL del stub.
+    """
+    from bench.stubs import ToolStubHandler, start_stub, stub_url
+
+    server = start_stub(ToolStubHandler, slow_latency=1.0)
+    url = stub_url(server)
+    original = flask_app.tools_store.read()
+    flask_app.tools_store.write({
+        "system_tools": original.get("system_tools", []),
+        "tools": [stub_tool(name, f"{url}/{name}") for name in ("fast", "slow", "fail")],
+    })
+    yield url
+    flask_app.tools_store.write(original)
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,53 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+
+
+def run_bench(*args):
+    return subprocess.run(
+        [sys.executable, "bench/run.py", *args],
+        cwd=APP_DIR, capture_output=True, text=True, timeout=120,
+    )
+
+
+def test_bench_smoke_run(tmp_path):
+    out = tmp_path / "resultados.json"
+    result = run_bench(
+        "--rows", "10", "--concurrency", "2", "--requests", "3", "--duration", "1",
+        "--openai-latency-ms", "0", "--tool-latency-ms", "0", "--slow-tool-latency-ms", "10",
+        "--out", str(out),
+    )
+    assert result.returncode == 0, result.stderr
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert report["meta"]["args"]["rows"] == "10"
+    by_name = {r["scenario"]: r for r in report["results"]}
+    for name in ("session", "execute_tool_fast", "execute_tool_slow", "chat", "chat_stream",
+                 "personas_list_page", "personas_create", "gastos_stats", "gastos_delete"):
+        assert name in by_name, name
+        assert by_name[name]["errors"] == 0, (name, by_name[name]["statuses"])
+        latency = by_name[name]["latency_ms"]
+        assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    assert by_name["personas_list_page"]["rows"] == 10
+
+
+def test_bench_compare(tmp_path):
+    def write(name, p50, rps):
+        path = tmp_path / name
+        path.write_text(json.dumps({
+            "meta": {"commit": name},
+            "results": [{"scenario": "chat", "rows": None, "throughput_rps": rps,
+                         "latency_ms": {"p50": p50, "p95": p50 * 2}}],
+        }), encoding="utf-8")
+        return str(path)
+
+    result = run_bench("--compare", write("antes", 100.0, 10.0), write("despues", 50.0, 20.0))
+
+    assert result.returncode == 0, result.stderr
+    assert "base: antes  nuevo: despues" in result.stdout
+    line = next(line for line in result.stdout.splitlines() if line.startswith("chat"))
+    assert "100.0 → 50.0 (-50%)" in line
+    assert "10.0 → 20.0 (+100%)" in line
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+
+import pytest
+
+import app as flask_app
+
+NDJSON = "application/x-ndjson"
+
+
+def import_body(client, name, body, content_type=NDJSON, **params):
+    return client.post(f"/api/{name}/import", data=body, content_type=content_type, query_string=params)
+
+
+def test_ndjson_import_reports_bad_rows_by_line(client, collection_backend):
+    body = "\n".join([
+        json.dumps({"descripcion": "cafe", "gasto": 10}),
+        '{"descripcion": "roto',
+        "",
+        json.dumps(["no", "es", "objeto"]),
+        json.dumps({"gasto": 5}),
+        json.dumps({"descripcion": "taxi", "gasto": "noventa"}),
+        json.dumps({"descripcion": "bus", "gasto": 1.5}),
+    ])
+
+    response = import_body(client, "gastos", body)
+
+    assert response.status_code == 200
+    data = response.get_json()
+    # La línea vacía no cuenta como fila
+    assert (data["rows"], data["inserted"], data["error_count"]) == (6, 2, 4)
+    assert [error["line"] for error in data["errors"]] == [2, 4, 5, 6]
+    assert data["errors"][0]["error"] == "JSON inválido"
+    assert data["errors"][1]["error"] == "cada fila debe ser un objeto"
+    assert data["errors"][2]["error"] == "descripcion es requerida"
+
+    # Las filas válidas quedan guardadas aunque otras fallen
+    items = client.get("/api/gastos", query_string={"sort": "descripcion"}).get_json()["items"]
+    assert [(item["descripcion"], item["gasto"]) for item in items] == [("bus", 1.5), ("cafe", 10)]
+
+
+def test_errors_list_is_capped_but_all_are_counted(client, collection_backend, monkeypatch):
+    monkeypatch.setattr(flask_app, "BULK_MAX_ERRORS", 2)
+    body = "\n".join(json.dumps({"gasto": n}) for n in range(5))
+
+    data = import_body(client, "gastos", body).get_json()
+
+    assert data["error_count"] == 5
+    assert [error["line"] for error in data["errors"]] == [1, 2]
+
+
+def test_import_writes_in_batches(client, collection_backend, monkeypatch):
+    monkeypatch.setattr(flask_app, "BULK_BATCH_SIZE", 2)
+    body = "\n".join(json.dumps({"descripcion": f"g{n}", "gasto": n}) for n in range(5))
+
+    data = import_body(client, "gastos", body).get_json()
+
+    assert data["inserted"] == 5
+    assert client.get("/api/gastos").headers["X-Total-Count"] == "5"
+
+
+def test_json_body_with_items(client, collection_backend):
+    body = json.dumps({"items": [{"nombre": "Ana", "apellido": "Paz", "telefono": "1"}, "x"]})
+
+    data = import_body(client, "personas", body, content_type="application/json").get_json()
+
+    assert (data["inserted"], data["error_count"]) == (1, 1)
+    assert data["errors"] == [{"line": 2, "error": "cada fila debe ser un objeto"}]
+
+
+def test_unreadable_json_body_is_400(client, collection_backend):
+    response = import_body(client, "personas", '{"items": [', content_type="application/json")
+
+    assert response.status_code == 400
+    assert response.get_json()["error"].startswith("No se pudo leer el body")
+
+
+@pytest.mark.parametrize("content_type", ["application/xml", "text/plain"])
+def test_unsupported_content_type_is_415(client, collection_backend, content_type):
+    response = import_body(client, "personas", "nombre,apellido,telefono\nAna,Paz,1\n", content_type=content_type)
+
+    assert response.status_code == 415
+    assert "Content-Type no soportado" in response.get_json()["error"]
+    assert client.get("/api/personas").get_json()["items"] == []
+
+
+def test_format_param_overrides_content_type(client, collection_backend):
+    body = "nombre,apellido,telefono\nAna,Paz,1\n"
+
+    data = import_body(client, "personas", body, content_type="text/plain", format="csv").get_json()
+    assert data["inserted"] == 1
+
+    response = import_body(client, "personas", body, format="xml")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "format debe ser uno de: ndjson, csv, json"
+
+
+def test_generic_content_type_is_read_as_ndjson(client, collection_backend):
+    body = json.dumps({"nombre": "Ana", "apellido": "Paz", "telefono": "1"})
+
+    data = import_body(client, "personas", body, content_type="application/octet-stream").get_json()
+
+    assert data["inserted"] == 1
+
+
+def test_csv_export_import_round_trip(client, collection_backend):
+    personas = [
+        {"nombre": "Ana", "apellido": "Paz, de la", "telefono": "+54 11 1234"},
+        {"nombre": "José", "apellido": 'O"Neil', "telefono": "2"},
+    ]
+    for persona in personas:
+        assert client.post("/api/personas", json=persona).status_code == 201
+    before = client.get("/api/personas").get_json()["items"]
+
+    exported = client.get("/api/personas/export", query_string={"format": "csv"})
+    assert exported.status_code == 200
+    assert exported.mimetype == "text/csv"
+    assert exported.headers["Content-Disposition"] == 'attachment; filename="personas.csv"'
+    text = exported.get_data(as_text=True)
+    assert [row["nombre"] for row in csv.DictReader(io.StringIO(text))] == ["Ana", "José"]
+
+    for item in before:
+        client.delete(f"/api/personas/{item['id']}")
+    data = import_body(client, "personas", text.encode("utf-8"), content_type="text/csv").get_json()
+
+    assert (data["rows"], data["inserted"], data["error_count"]) == (2, 2, 0)
+    after = client.get("/api/personas").get_json()["items"]
+    fields = ("nombre", "apellido", "telefono")
+    assert [{f: item[f] for f in fields} for item in after] == personas
+
+
+def test_csv_import_reports_row_line_numbers(client, collection_backend):
+    body = "descripcion,gasto\ncafe,10\n,5\ntaxi,abc\n"
+
+    data = import_body(client, "gastos", body, content_type="text/csv").get_json()
+
+    assert (data["inserted"], data["error_count"]) == (1, 2)
+    assert [error["line"] for error in data["errors"]] == [3, 4]
+
+
+def test_ndjson_export(client, collection_backend):
+    client.post("/api/gastos", json={"descripcion": "cafe", "gasto": 10})
+
+    exported = client.get("/api/gastos/export")
+
+    assert exported.mimetype == NDJSON
+    rows = [json.loads(line) for line in exported.get_data(as_text=True).splitlines()]
+    assert [(row["descripcion"], row["gasto"]) for row in rows] == [("cafe", 10)]
+
+
+def test_export_unknown_format_is_400(client, collection_backend):
+    response = client.get("/api/gastos/export", query_string={"format": "xml"})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "format debe ser ndjson o csv"
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+import app as flask_app
+
+
+def create_persona(client, nombre="Ana"):
+    response = client.post("/api/personas", json={"nombre": nombre, "apellido": "Paz", "telefono": "1"})
+    assert response.status_code == 201
+    return response.get_json()["created"]
+
+
+def test_flask_stream_ends_after_stream_seconds(client, monkeypatch):
+    monkeypatch.setattr(flask_app, "CHANGES_STREAM_SECONDS", 0.2)
+    monkeypatch.setattr(flask_app, "CHANGES_RECHECK_SECONDS", 0.05)
+    version = client.get("/api/personas/changes").get_json()["version"]
+
+    response = client.get(
+        f"/api/personas/changes?since={version}", headers={"Accept": "text/event-stream"}, buffered=False,
+    )
+    # Termina solo: el hilo del worker queda libre y el navegador reconecta
+    body = b"".join(response.response)
+    assert body.startswith(b"retry: ")
+
+
+def test_flask_long_poll_returns_change(client):
+    version = client.get("/api/personas/changes").get_json()["version"]
+    threading.Timer(0.1, create_persona, args=(flask_app.app.test_client(), "Bea")).start()
+
+    data = client.get(f"/api/personas/changes?since={version}&timeout=5").get_json()
+
+    assert [(change["op"], change["item"]["nombre"]) for change in data["changes"]] == [("insert", "Bea")]
+    assert data["version"] == version + 1
+
+
+@pytest.fixture
+def asgi_app():
+    pytest.importorskip("asgiref")
+    import asgi
+
+    return asgi.app
+
+
+async def call_asgi(asgi_app, path, query="", headers=(), on_body=None):
+    """Llama a la app ASGI y devuelve (status, partes del body); on_body decide cuándo desconectar"""
+    disconnected = asyncio.Event()
+    requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+    status = None
+    chunks = []
+
+    async def receive():
+        message = next(requests, None)
+        if message is None:
+            await disconnected.wait()
+            message = {"type": "http.disconnect"}
+        return message
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message.get("body"):
+            chunks.append(message["body"])
+            if on_body is not None and on_body(chunks):
+                disconnected.set()
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+    }
+    await asyncio.wait_for(asgi_app(scope, receive, send), 5)
+    return status, chunks
+
+
+def test_asgi_long_poll_does_not_use_a_thread(asgi_app, client):
+    version = client.get("/api/personas/changes").get_json()["version"]
+
+    async def scenario():
+        poll = asyncio.ensure_future(call_asgi(asgi_app, "/api/personas/changes", f"since={version}&timeout=5"))
+        await asyncio.sleep(0.1)
+        # La escritura llega desde otro hilo, como una request Flask
+        await asyncio.to_thread(create_persona, client, "Caro")
+        return await poll
+
+    status, chunks = asyncio.run(scenario())
+    assert status == 200
+    data = json.loads(b"".join(chunks))
+    assert [change["item"]["nombre"] for change in data["changes"]] == ["Caro"]
+
+
+def test_asgi_long_poll_validates_since(asgi_app):
+    status, chunks = asyncio.run(call_asgi(asgi_app, "/api/personas/changes", "since=x"))
+    assert status == 400
+    assert b"since debe ser un entero" in b"".join(chunks)
+
+
+def test_asgi_stream_sends_changes_until_disconnect(asgi_app, client):
+    version = client.get("/api/personas/changes").get_json()["version"]
+
+    async def scenario():
+        stream = asyncio.ensure_future(call_asgi(
+            asgi_app,
+            "/api/personas/changes",
+            headers=[("accept", "text/event-stream"), ("last-event-id", str(version))],
+            on_body=lambda chunks: any(b"event: change" in chunk for chunk in chunks),
+        ))
+        await asyncio.sleep(0.1)
+        await asyncio.to_thread(create_persona, client, "Dora")
+        return await stream
+
+    status, chunks = asyncio.run(scenario())
+    assert status == 200
+    assert chunks[0].startswith(b"retry: ")
+    assert f"id: {version + 1}\n".encode() in chunks[1]
+    assert b'"nombre": "Dora"' in chunks[1]
+    assert not flask_app.get_change_feed("personas")._listeners
+
+
+def test_asgi_and_flask_send_the_same_cors_headers(asgi_app, client):
+    import httpx
+
+    async def get(path):
+        transport = httpx.ASGITransport(app=asgi_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.get(path)
+
+    flask_headers = client.get("/api/personas").headers
+    assert flask_headers["Access-Control-Expose-Headers"] == "X-Total-Count, ETag"
+    # /changes lo atiende el handler asyncio; /api/personas se delega a Flask
+    for path in ("/api/personas/changes", "/api/personas"):
+        headers = asyncio.run(get(path)).headers
+        for name, value in flask_app.CORS_HEADERS.items():
+            assert headers[name] == value, (path, name)
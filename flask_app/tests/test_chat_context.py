@@ -0,0 +1,175 @@
+import logging
+import sys
+
+import pytest
+
+import app as flask_app
+
+SYSTEM = {"role": "system", "content": "sistema"}
+USER = {"role": "user", "content": "pregunta actual"}
+
+
+def turn(i, words=10):
+    role = "user" if i % 2 == 0 else "assistant"
+    return {"role": role, "content": " ".join([f"t{i}"] * words)}
+
+
+def tokens(message):
+    # Con el conteo de prueba (una palabra = un token) más el extra por mensaje
+    return len(message["content"].split()) + flask_app.TOKENS_PER_MESSAGE
+
+
+class WordEncoder:
+    """Encoder de prueba: una palabra = un token"""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+@pytest.fixture(autouse=True)
+def budget(monkeypatch):
+    """Presupuesto chico y conteo de tokens determinista"""
+    monkeypatch.setattr(flask_app, "_token_encoders", {"gpt-4o-mini": WordEncoder()})
+    monkeypatch.setattr(flask_app, "CHAT_CONTEXT_TOKENS", 100)
+    monkeypatch.setattr(flask_app, "CHAT_CONTEXT_KEEP_RATIO", 0.6)
+    monkeypatch.setattr(flask_app, "CHAT_SUMMARY_MAX_TOKENS", 10)
+    monkeypatch.setattr(flask_app, "CHAT_SUMMARY_ENABLED", True)
+
+
+@pytest.fixture
+def summarizer(monkeypatch):
+    calls = []
+
+    def summarize(model, previous, messages):
+        calls.append((previous, [m["content"] for m in messages]))
+        return f"resumen {len(calls)}"
+
+    monkeypatch.setattr(flask_app, "summarize_history", summarize)
+    return calls
+
+
+def fit(history, conversation_id=None):
+    return flask_app.fit_chat_context(SYSTEM, history, USER, "gpt-4o-mini", conversation_id)
+
+
+def test_history_within_budget_is_sent_whole(summarizer):
+    history = [turn(i) for i in range(3)]
+
+    messages, context = fit(history, "ctx-entra")
+
+    assert messages == [SYSTEM, *history, USER]
+    assert context["tokens"] == context["tokens_original"] == sum(map(tokens, messages)) + flask_app.TOKENS_PER_REPLY
+    assert (context["dropped_messages"], context["summarized"], context["tokens_saved"]) == (0, False, 0)
+    assert summarizer == []
+
+
+def test_without_conversation_id_oldest_turns_are_dropped(summarizer):
+    history = [turn(i) for i in range(10)]
+
+    messages, context = fit(history)
+
+    # Quedan system, los turnos más recientes en orden y el mensaje actual
+    dropped = context["dropped_messages"]
+    assert dropped > 0
+    assert messages == [SYSTEM, *history[dropped:], USER]
+    assert context["tokens"] <= flask_app.CHAT_CONTEXT_TOKENS * flask_app.CHAT_CONTEXT_KEEP_RATIO
+    assert context["tokens_saved"] == context["tokens_original"] - context["tokens"]
+    assert summarizer == []
+
+
+def test_old_turns_are_summarized_and_the_summary_reused(summarizer):
+    history = [turn(i) for i in range(10)]
+
+    messages, context = fit(history, "ctx-resumen")
+    cut = context["dropped_messages"]
+    assert context["summarized"] is True
+    assert messages == [SYSTEM, flask_app.summary_message("resumen 1"), *history[cut:], USER]
+    assert summarizer == [(None, [m["content"] for m in history[:cut]])]
+
+    # El turno siguiente manda el mismo prefijo: se reutiliza sin llamar al modelo
+    history += [turn(10, words=2)]
+    messages, context = fit(history, "ctx-resumen")
+    assert messages[1] == flask_app.summary_message("resumen 1")
+    assert (context["summarized"], context["summary_cached"]) == (False, True)
+    assert len(summarizer) == 1
+
+
+def test_summary_is_extended_when_history_grows_past_budget(summarizer):
+    history = [turn(i) for i in range(10)]
+    _, first = fit(history, "ctx-crece")
+
+    history += [turn(i) for i in range(10, 16)]
+    messages, context = fit(history, "ctx-crece")
+
+    assert context["summarized"] is True
+    assert context["dropped_messages"] > first["dropped_messages"]
+    # El resumen nuevo parte del anterior y solo agrega los turnos que siguen
+    assert summarizer[1][0] == "resumen 1"
+    assert summarizer[1][1] == [m["content"] for m in history[first["dropped_messages"]:context["dropped_messages"]]]
+    assert messages[1] == flask_app.summary_message("resumen 2")
+
+
+def test_changed_history_invalidates_cached_summary(summarizer):
+    history = [turn(i) for i in range(10)]
+    fit(history, "ctx-editado")
+
+    edited = [turn(0, words=3)] + history[1:]
+    _, context = fit(edited, "ctx-editado")
+
+    assert context["summary_cached"] is False
+    assert summarizer[1][0] is None
+
+
+def test_summary_failure_falls_back_to_dropping(monkeypatch):
+    def fail(*args):
+        raise RuntimeError("sin OpenAI")
+
+    monkeypatch.setattr(flask_app, "summarize_history", fail)
+    history = [turn(i) for i in range(10)]
+
+    messages, context = fit(history, "ctx-falla")
+
+    assert context["summarized"] is False
+    assert messages == [SYSTEM, *history[context["dropped_messages"]:], USER]
+
+
+def test_summary_disabled_only_drops(monkeypatch, summarizer):
+    monkeypatch.setattr(flask_app, "CHAT_SUMMARY_ENABLED", False)
+
+    messages, context = fit([turn(i) for i in range(10)], "ctx-apagado")
+
+    assert context["summarized"] is False
+    assert flask_app.summary_message("resumen 1") not in messages
+    assert summarizer == []
+
+
+def test_turn_larger_than_budget_leaves_system_and_message(summarizer):
+    history = [turn(0), turn(1, words=500)]
+
+    messages, context = fit(history)
+
+    assert messages == [SYSTEM, USER]
+    assert context["dropped_messages"] == 2
+
+
+def test_system_and_message_are_kept_even_over_budget(monkeypatch, summarizer):
+    monkeypatch.setattr(flask_app, "CHAT_CONTEXT_TOKENS", 5)
+    history = [turn(0)]
+
+    messages, context = fit(history)
+
+    assert messages == [SYSTEM, USER]
+    assert context["tokens"] > flask_app.CHAT_CONTEXT_TOKENS
+
+
+def test_without_tiktoken_tokens_are_estimated_and_logged_once(monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, "tiktoken", None)
+    monkeypatch.setattr(flask_app, "_token_encoders", {})
+    monkeypatch.setattr(flask_app, "_token_fallback_logged", False)
+
+    with caplog.at_level(logging.WARNING):
+        assert flask_app.count_tokens("abcdefgh", "gpt-4o-mini") == 2
+        assert flask_app.count_tokens("abcdefghi", "otro-modelo") == 3
+
+    warnings = [r for r in caplog.records if "tiktoken no disponible" in r.getMessage()]
+    assert len(warnings) == 1
@@ -0,0 +1,152 @@
+import asyncio
+import json
+import socket
+
+import pytest
+
+import app as flask_app
+from bench.stubs import OpenAIStubHandler, start_stub, stub_url
+
+STUB_REPLY = "".join(OpenAIStubHandler.STREAM_WORDS)
+
+
+def parse_sse(text):
+    """[(evento, data)] de un body text/event-stream"""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def use_openai(monkeypatch, url, max_retries=None):
+    """Apunta el cliente OpenAI de Flask y del modo ASGI (asgi.py importa los valores) a url"""
+    try:
+        import asgi
+    except ImportError:
+        asgi = None
+    for module in (flask_app, asgi):
+        if module is None:
+            continue
+        monkeypatch.setattr(module, "OPENAI_BASE_URL", url)
+        if max_retries is not None:
+            monkeypatch.setattr(module, "OPENAI_MAX_RETRIES", max_retries)
+    if asgi is not None:
+        # El cliente httpx del modo ASGI queda atado al loop de cada asyncio.run
+        monkeypatch.setattr(asgi, "_http_client", None)
+        monkeypatch.setattr(asgi, "_openai_client", None)
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    server = start_stub(OpenAIStubHandler)
+    use_openai(monkeypatch, stub_url(server))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def openai_down(monkeypatch):
+    """OpenAI inalcanzable (puerto cerrado) y sin reintentos"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    use_openai(monkeypatch, f"http://127.0.0.1:{port}", max_retries=0)
+
+
+def test_stream_sends_deltas_then_done(client, openai_stub):
+    response = client.post("/api/chat", json={"message": "hola", "stream": True})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names == ["delta"] * (len(names) - 1) + ["done"]
+    assert "".join(data["content"] for name, data in events if name == "delta") == STUB_REPLY
+    done = events[-1][1]
+    assert done["reply"] == STUB_REPLY
+    assert {"timestamp", "context", "metrics"} <= set(done)
+
+
+def test_stream_on_accept_header_and_saves_conversation(client, openai_stub):
+    response = client.post(
+        "/api/chat",
+        json={"message": "hola", "conversation_id": "stream-test"},
+        headers={"Accept": "text/event-stream"},
+    )
+    assert parse_sse(response.get_data(as_text=True))[-1][0] == "done"
+
+    messages = client.get("/api/chat/conversations/stream-test").get_json()["messages"]
+    assert messages == [{"role": "user", "content": "hola"}, {"role": "assistant", "content": STUB_REPLY}]
+
+
+def test_stream_reports_upstream_error(client, openai_down):
+    response = client.post("/api/chat", json={"message": "hola", "stream": True})
+
+    assert response.status_code == 200
+    events = parse_sse(response.get_data(as_text=True))
+    assert [name for name, _ in events] == ["error"]
+    assert events[0][1]["error"]
+
+
+def test_json_reply_without_stream(client, openai_stub):
+    response = client.post("/api/chat", json={"message": "hola"})
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["reply"] == STUB_REPLY
+    assert {"timestamp", "context"} <= set(data)
+
+
+def test_json_reply_upstream_error_is_500(client, openai_down):
+    response = client.post("/api/chat", json={"message": "hola"})
+
+    assert response.status_code == 500
+    assert response.get_json()["error"]
+
+
+def test_missing_message_is_400(client):
+    assert client.post("/api/chat", json={"stream": True}).status_code == 400
+
+
+def post_asgi_chat(body):
+    """POST /api/chat contra asgi.app (el stream del chat es finito: se lee completo)"""
+    httpx = pytest.importorskip("httpx")
+    import asgi
+
+    async def post():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/api/chat", json=body)
+
+    return asyncio.run(post())
+
+
+@pytest.fixture
+def asgi_available():
+    pytest.importorskip("asgiref")
+
+
+def test_asgi_stream_sends_deltas_then_done(asgi_available, openai_stub):
+    response = post_asgi_chat({"message": "hola", "stream": True})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert [name for name, _ in events][-1] == "done"
+    assert "".join(data["content"] for name, data in events if name == "delta") == STUB_REPLY
+    assert events[-1][1]["reply"] == STUB_REPLY
+
+
+def test_asgi_stream_reports_upstream_error(asgi_available, openai_down):
+    events = parse_sse(post_asgi_chat({"message": "hola", "stream": True}).text)
+
+    assert [name for name, _ in events] == ["error"]
+
+
+def test_asgi_json_reply_without_stream(asgi_available, openai_stub):
+    response = post_asgi_chat({"message": "hola"})
+
+    assert response.status_code == 200
+    assert response.json()["reply"] == STUB_REPLY
@@ -0,0 +1,158 @@
+import pytest
+
+from collection_store import CollectionSchema, Field, Record
+
+
+def gastos_schema(**kwargs):
+    return CollectionSchema(
+        "gastos",
+        fields=[
+            Field("descripcion", required="descripcion es requerida", filter="contains", sortable=True, search="text"),
+            Field("gasto", "number", required=True, filters={"gasto_min": "min", "gasto_max": "max"}, sortable=True),
+            Field("fecha", "date", default="2024-01-31"),
+            Field("nota", default=lambda: "sin nota"),
+        ],
+        not_found="Gasto no encontrado",
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"name": "monto", "type": "money"}, "tipo desconocido"),
+    ({"name": "id"}, "nombre de campo no permitido"),
+    ({"name": "_oculto"}, "nombre de campo no permitido"),
+    ({"name": "con-guion"}, "nombre de campo no permitido"),
+    ({"name": "to_dict"}, "nombre de campo no permitido"),
+    ({"name": "monto", "filter": "between"}, "filtros válidos"),
+])
+def test_invalid_field_declarations(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        Field(**kwargs)
+
+
+@pytest.mark.parametrize("fields, message", [
+    ([], "sin campos"),
+    ([Field("a"), Field("a")], "campos repetidos"),
+    ([Field("a", search="phone"), Field("b", search="phone")], "search='phone'"),
+])
+def test_invalid_schema_declarations(fields, message):
+    with pytest.raises(ValueError, match=message):
+        CollectionSchema("prueba", fields=fields, not_found="no")
+
+
+def test_schema_derives_filters_sort_and_search_fields():
+    schema = gastos_schema()
+
+    assert schema.field_names == ("descripcion", "gasto", "fecha", "nota")
+    assert schema.export_fields == ("id", "descripcion", "gasto", "fecha", "nota")
+    assert schema.filters == {
+        "descripcion": ("contains", "descripcion"),
+        "gasto_min": ("min", "gasto"),
+        "gasto_max": ("max", "gasto"),
+    }
+    assert schema.sort_fields == ("descripcion", "gasto")
+    assert schema.search_fields == ("descripcion",)
+    assert schema.phone_field is None
+    assert schema.searchable
+
+
+def test_validate_converts_types_and_applies_defaults():
+    item = gastos_schema().validate({"descripcion": "  café ", "gasto": "12.5"})
+
+    assert isinstance(item, Record)
+    assert len(item["id"]) == 8
+    assert dict(item) == {
+        "id": item["id"],
+        "descripcion": "café",
+        "gasto": 12.5,
+        "fecha": "2024-01-31",
+        "nota": "sin nota",
+    }
+
+
+def test_empty_value_uses_default():
+    item = gastos_schema().validate({"descripcion": "taxi", "gasto": 3, "fecha": "", "nota": None})
+
+    assert (item["fecha"], item["nota"]) == ("2024-01-31", "sin nota")
+
+
+@pytest.mark.parametrize("body, message", [
+    ({"gasto": 1}, "descripcion es requerida"),
+    ({"descripcion": "   ", "gasto": 1}, "descripcion es requerida"),
+    ({"descripcion": "taxi"}, "gasto es requerido"),
+    ({"descripcion": "taxi", "gasto": "mucho"}, "gasto debe ser un número válido"),
+    ({"descripcion": "taxi", "gasto": 1, "fecha": "31/01/2024"}, "fecha debe tener formato AAAA-MM-DD"),
+])
+def test_validate_errors(body, message):
+    with pytest.raises(ValueError) as error:
+        gastos_schema().validate(body)
+    assert str(error.value) == message
+
+
+def test_required_message_overrides_default_message():
+    schema = CollectionSchema(
+        "personas",
+        fields=[Field("nombre", required=True), Field("apellido", required=True)],
+        not_found="no",
+        required_message="nombre y apellido son requeridos",
+    )
+
+    with pytest.raises(ValueError, match="nombre y apellido son requeridos"):
+        schema.validate({"nombre": "Ana"})
+
+
+def test_validate_changes_only_returns_fields_in_body():
+    schema = gastos_schema()
+
+    assert schema.validate_changes({"gasto": "7", "otro": "x"}) == {"gasto": 7.0}
+    assert schema.validate_changes({}) == {}
+    with pytest.raises(ValueError, match="fecha debe tener formato AAAA-MM-DD"):
+        schema.validate_changes({"fecha": "ayer"})
+
+
+def test_record_uses_slots():
+    item = gastos_schema().record({"id": "a1", "descripcion": "cafe", "gasto": 1.0, "fecha": "2024-01-01", "nota": ""})
+
+    assert type(item).__name__ == "GastosRecord"
+    assert not hasattr(item, "__dict__")
+    with pytest.raises(AttributeError):
+        item.otro = 1
+
+
+def test_record_reads_like_a_read_only_dict():
+    data = {"id": "a1", "descripcion": "cafe", "gasto": 1.0, "fecha": "2024-01-01", "nota": ""}
+    item = gastos_schema().record(data)
+
+    assert item == data
+    assert item.to_dict() == data
+    assert list(item) == list(data)
+    assert len(item) == 5
+    assert item["gasto"] == item.gasto == 1.0
+    assert item.get("falta", "x") == "x"
+    assert "descripcion" in item and "falta" not in item
+    with pytest.raises(KeyError):
+        item["falta"]
+    with pytest.raises(TypeError):
+        item["gasto"] = 2
+
+
+def test_record_keeps_undeclared_keys_and_missing_fields():
+    # Fila vieja: sin fecha ni nota y con una clave que el esquema no declara
+    item = gastos_schema().record({"id": "a1", "descripcion": "cafe", "gasto": 1.0, "legacy": True})
+
+    assert item.to_dict() == {"id": "a1", "descripcion": "cafe", "gasto": 1.0, "legacy": True}
+    assert "fecha" not in item
+    assert item.get("fecha") is None
+    with pytest.raises(KeyError):
+        item["fecha"]
+
+
+def test_replace_returns_a_new_record():
+    item = gastos_schema().record({"id": "a1", "descripcion": "cafe", "gasto": 1.0})
+
+    updated = item.replace({"gasto": 2.0, "nota": "con leche"})
+
+    assert item.to_dict() == {"id": "a1", "descripcion": "cafe", "gasto": 1.0}
+    assert updated.to_dict() == {"id": "a1", "descripcion": "cafe", "gasto": 2.0, "nota": "con leche"}
+    assert type(updated) is type(item)
+    assert repr(updated).startswith("GastosRecord({")
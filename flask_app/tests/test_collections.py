@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+
+import app as flask_app
+import collection_store
+from app import GastosStats
+from collection_store import CollectionSchema, Field
+
+
+def gastos_schema(tmp_path):
+    return CollectionSchema(
+        "gastos",
+        fields=[Field("descripcion", required=True), Field("gasto", type="number", required=True)],
+        path=tmp_path / "gastos.json",
+        not_found="Gasto no encontrado",
+    )
+
+
+def open_backend(kind, schema, tmp_path):
+    """Un backend por "worker": dos instancias sobre los mismos datos no comparten memoria"""
+    if kind == "json":
+        return collection_store.JsonCollectionBackend(schema)
+    return collection_store.SqliteCollectionBackend(schema, tmp_path / "collections.sqlite3")
+
+
+def write_externally(path, item):
+    """Agrega una fila al .json como lo haría otro proceso (reemplazo atómico)"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    data["items"].append(item)
+    tmp = f"{path}.other"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_stats_see_write_from_other_worker(kind, tmp_path):
+    schema = gastos_schema(tmp_path)
+    worker = open_backend(kind, schema, tmp_path)
+    other = open_backend(kind, schema, tmp_path)
+    stats = worker.subscribe(GastosStats())
+
+    worker.insert(schema.validate({"descripcion": "cafe", "gasto": 10}))
+    other.insert(schema.validate({"descripcion": "taxi", "gasto": 90}))
+    worker.refresh(fresh=True)
+
+    totals = stats.totals()
+    assert (totals["count"], totals["total"], totals["max"]) == (2, 100.0, 90.0)
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_local_write_after_other_worker_resets_observers(kind, tmp_path):
+    schema = gastos_schema(tmp_path)
+    worker = open_backend(kind, schema, tmp_path)
+    other = open_backend(kind, schema, tmp_path)
+    stats = worker.subscribe(GastosStats())
+
+    other.insert(schema.validate({"descripcion": "taxi", "gasto": 90}))
+    # Sin refresh de por medio: la escritura propia debe notar la ajena
+    worker.insert(schema.validate({"descripcion": "cafe", "gasto": 10}))
+
+    assert stats.totals()["count"] == 2
+
+
+def test_api_stats_after_external_write(client, monkeypatch):
+    monkeypatch.setattr(collection_store, "CONFIG_RECHECK_SECONDS", 0)
+    assert client.post("/api/gastos", json={"descripcion": "cafe", "gasto": 10}).status_code == 201
+    before = client.get("/api/gastos/stats").get_json()
+
+    write_externally(flask_app.GASTOS_PATH, {"id": "ext00001", "descripcion": "taxi", "gasto": 90.0})
+
+    after = client.get("/api/gastos/stats").get_json()
+    assert after["count"] == before["count"] + 1
+    assert after["total"] == round(before["total"] + 90.0, 2)
+
+
+def personas_schema(tmp_path):
+    return CollectionSchema(
+        "personas",
+        fields=[
+            Field("nombre", required=True, search="text"),
+            Field("telefono", search="phone"),
+        ],
+        path=tmp_path / "personas.json",
+        not_found="Persona no encontrada",
+    )
+
+
+@pytest.mark.parametrize("kind", ["json", "sqlite"])
+def test_search_finds_row_from_other_worker(kind, tmp_path):
+    schema = personas_schema(tmp_path)
+    worker = open_backend(kind, schema, tmp_path)
+    other = open_backend(kind, schema, tmp_path)
+    index = worker.subscribe(flask_app.CollectionSearchIndex(schema))
+
+    other.insert(schema.validate({"nombre": "Zoraida", "telefono": "5551234"}))
+    assert index.search("zoraida") == []
+    worker.refresh(fresh=True)
+
+    assert [item["nombre"] for _, item in index.search("zoraida")] == ["Zoraida"]
+    assert [item["nombre"] for _, item in index.search("1234")] == ["Zoraida"]
+
+
+def test_api_search_after_external_write(client, monkeypatch):
+    monkeypatch.setattr(collection_store, "CONFIG_RECHECK_SECONDS", 0)
+    client.post("/api/personas", json={"nombre": "Ana", "apellido": "Paz", "telefono": "1"})
+    assert client.get("/api/personas/search?q=zoraida").get_json()["items"] == []
+
+    write_externally(flask_app.PERSONAS_PATH, {
+        "id": "ext00002", "nombre": "Zoraida", "apellido": "Quintero", "telefono": "5559876",
+    })
+
+    items = client.get("/api/personas/search?q=zoraida").get_json()["items"]
+    assert [item["id"] for item in items] == ["ext00002"]
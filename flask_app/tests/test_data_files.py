@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+import app as flask_app
+
+
+@pytest.fixture
+def sqlite_conversations(monkeypatch):
+    monkeypatch.setattr(flask_app, "CONVERSATION_BACKEND", "sqlite")
+    monkeypatch.setattr(flask_app, "_conversation_store", None)
+    store = flask_app.get_conversation_store()
+    yield store
+    store._conn().close()
+
+
+def test_public_json_files_are_served(client):
+    assert client.get("/api/personas").status_code == 200
+
+    for name in ("settings.json", "tools.json", "personas.json"):
+        response = client.get(f"/data/{name}")
+        assert response.status_code == 200, name
+        assert response.headers["ETag"]
+
+
+def test_conversation_db_is_not_served(client, sqlite_conversations):
+    sqlite_conversations.append("privada", [{"role": "user", "content": "secreto"}])
+
+    db_path = Path(flask_app.CONVERSATION_DB_PATH)
+    assert db_path.is_file()
+    assert flask_app.DATA_DIR not in db_path.parents
+    assert client.get(f"/data/{db_path.name}").status_code == 404
+
+
+@pytest.mark.parametrize("name", [
+    "conversations.sqlite3",
+    "collections.sqlite3-wal",
+    "notas.txt",
+    "otra/settings.json",
+])
+def test_private_files_in_data_dir_are_not_served(client, name):
+    # Aunque el archivo esté dentro de DATA_DIR (p. ej. una base de una versión anterior)
+    path = flask_app.DATA_DIR / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"privado")
+
+    assert client.get(f"/data/{name}").status_code == 404
@@ -0,0 +1,113 @@
+import re
+
+import pytest
+
+import app as flask_app
+from metrics import CallbackMetric, Counter, Histogram, MetricsRegistry, upstream_timer
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+
+
+def parse_samples(text):
+    """{(nombre, labels ordenados): valor} de un texto en formato Prometheus"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        name, labels, value = match.groups()
+        pairs = tuple(sorted(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or "")))
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+def sample(samples, metric, **labels):
+    return samples.get((metric, tuple(sorted(labels.items()))), 0)
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("latencia_seconds", "Latencia", ("ruta",), buckets=(0.01, 0.1, 1)))
+    for value in (0.005, 0.01, 0.05, 0.05, 3):
+        histogram.observe(value, "/a")
+    histogram.observe(0.2, "/b")
+
+    text = registry.render()
+    samples = parse_samples(text)
+
+    assert "# TYPE latencia_seconds histogram" in text.splitlines()
+    # El límite de cada bucket es inclusivo (le = menor o igual)
+    buckets = [sample(samples, "latencia_seconds_bucket", ruta="/a", le=le) for le in ("0.01", "0.1", "1.0", "+Inf")]
+    assert buckets == [2, 4, 4, 5]
+    assert sample(samples, "latencia_seconds_count", ruta="/a") == 5
+    assert sample(samples, "latencia_seconds_sum", ruta="/a") == pytest.approx(3.115)
+    assert sample(samples, "latencia_seconds_bucket", ruta="/b", le="0.1") == 0
+    assert sample(samples, "latencia_seconds_bucket", ruta="/b", le="1.0") == 1
+
+
+def test_render_escapes_labels_and_skips_broken_collectors():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("errores_total", "Errores", ("detalle",)))
+    counter.inc('dice "hola"\nchau', amount=2)
+
+    def broken():
+        raise RuntimeError("roto")
+
+    registry.register(CallbackMetric("rota", "No se puede leer", "gauge", (), broken))
+    registry.register(CallbackMetric("vivos", "Hilos vivos", "gauge", (), lambda: [((), 3)]))
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# HELP errores_total Errores",
+        "# TYPE errores_total counter",
+        'errores_total{detalle="dice \\"hola\\"\\nchau"} 2',
+        "# HELP vivos Hilos vivos",
+        "# TYPE vivos gauge",
+        "vivos 3",
+    ]
+
+
+def test_upstream_timer_counts_errors_with_their_status():
+    class Upstream503(Exception):
+        status_code = 503
+
+    before = parse_samples(flask_app.metrics.render())
+    with upstream_timer("tool", "prueba-metricas") as call:
+        call["status"] = 201
+    with pytest.raises(Upstream503):
+        with upstream_timer("tool", "prueba-metricas"):
+            raise Upstream503()
+    after = parse_samples(flask_app.metrics.render())
+
+    for status in ("201", "503"):
+        labels = dict(upstream="tool", name="prueba-metricas", status=status)
+        assert sample(after, "upstream_request_duration_seconds_count", **labels) == 1
+    errors = dict(upstream="tool", error="Upstream503")
+    assert sample(after, "upstream_errors_total", **errors) - sample(before, "upstream_errors_total", **errors) == 1
+
+
+def test_metrics_endpoint_exposes_request_histogram(client):
+    labels = dict(method="GET", route="/api/personas", status="200")
+    before = parse_samples(client.get("/metrics").get_data(as_text=True))
+
+    for _ in range(3):
+        client.get("/api/personas").close()
+    client.get("/no-existe").close()
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+    text = response.get_data(as_text=True)
+    types = [line for line in text.splitlines() if line.startswith("# TYPE ")]
+    assert "# TYPE http_request_duration_seconds histogram" in types
+    assert "# TYPE upstream_errors_total counter" in types
+    assert "# TYPE cache_hit_ratio gauge" in types
+
+    after = parse_samples(text)
+    count = sample(after, "http_request_duration_seconds_count", **labels)
+    assert count - sample(before, "http_request_duration_seconds_count", **labels) == 3
+    assert sample(after, "http_request_duration_seconds_bucket", le="+Inf", **labels) == count
+    # Las rutas inexistentes comparten una sola serie
+    assert sample(after, "http_request_duration_seconds_count", method="GET", route="unmatched", status="404") >= 1
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+import app as flask_app
+from bench.stubs import OpenAIStubHandler, start_stub, stub_url
+from test_chat_stream import use_openai
+
+
+@pytest.fixture
+def fresh_handle(monkeypatch, tmp_path):
+    """Sin cliente creado, con un .env propio que se revisa en cada llamada"""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(flask_app, "_openai_handle", None)
+    monkeypatch.setattr(flask_app, "DOTENV_PATH", str(tmp_path / ".env"))
+    monkeypatch.setattr(flask_app, "_dotenv_state", [None, 0.0])
+    monkeypatch.setattr(flask_app, "CONFIG_RECHECK_SECONDS", 0)
+    pool = flask_app.RealtimeSessionPool(0, 20, 300)
+    monkeypatch.setattr(flask_app, "realtime_session_pool", pool)
+    return tmp_path / ".env"
+
+
+def write_env(path, text):
+    path.write_text(text, encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+def pool_with_session():
+    pool = flask_app.realtime_session_pool
+    pool._sessions.append(flask_app._PooledSession(None, 0, {"id": "sess_vieja"}))
+    return pool
+
+
+def test_handle_is_reused_while_key_is_the_same(fresh_handle):
+    handle = flask_app.get_openai_handle()
+
+    assert flask_app.get_openai_handle() is handle
+    assert handle.key == ("sk-test", flask_app.OPENAI_BASE_URL)
+    assert flask_app.get_openai_client() is handle.client
+
+
+def test_new_key_in_environment_rotates_client(fresh_handle, monkeypatch):
+    old = flask_app.get_openai_handle()
+    pool = pool_with_session()
+
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-nueva")
+    new = flask_app.get_openai_handle()
+
+    assert new is not old
+    assert new.key[0] == "sk-nueva"
+    assert new.client.api_key == "sk-nueva"
+    # Las sesiones creadas con la clave anterior se descartan
+    assert pool.stats()["available"] == 0
+    assert pool.discarded == 1
+
+
+def test_key_rotated_in_dotenv_is_picked_up(fresh_handle):
+    old = flask_app.get_openai_handle()
+
+    write_env(fresh_handle, "OPENAI_API_KEY=sk-desde-env\n")
+    new = flask_app.get_openai_handle()
+    assert new is not old
+    assert new.key[0] == "sk-desde-env"
+
+    write_env(fresh_handle, "OPENAI_API_KEY=sk-otra\n")
+    assert flask_app.get_openai_handle().key[0] == "sk-otra"
+
+
+def test_chat_requests_share_one_client(client, fresh_handle, monkeypatch):
+    server = start_stub(OpenAIStubHandler)
+    try:
+        use_openai(monkeypatch, stub_url(server))
+        assert client.post("/api/chat", json={"message": "hola"}).status_code == 200
+        handle = flask_app._openai_handle
+        assert client.post("/api/chat", json={"message": "otra vez"}).status_code == 200
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert flask_app._openai_handle is handle
+    assert handle.key == ("sk-test", stub_url(server))
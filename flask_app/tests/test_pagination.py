@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+import app as flask_app
+
+
+def create(client, name, body):
+    response = client.post(f"/api/{name}", json=body)
+    assert response.status_code == 201
+    return response.get_json()["created"]
+
+
+def persona(client, nombre):
+    return create(client, "personas", {"nombre": nombre, "apellido": "Paz", "telefono": "1"})
+
+
+def gasto(client, descripcion, monto):
+    return create(client, "gastos", {"descripcion": descripcion, "gasto": monto})
+
+
+def get_page(client, name, **params):
+    response = client.get(f"/api/{name}", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response
+
+
+def read_all(client, name, between_pages=None, **params):
+    """Recorre las páginas siguiendo next_cursor; between_pages() corre después de cada una"""
+    items, cursor = [], None
+    while True:
+        extra = {"cursor": cursor} if cursor else {}
+        data = get_page(client, name, **params, **extra).get_json()
+        items += data["items"]
+        cursor = data.get("next_cursor")
+        if cursor is None:
+            return items
+        if between_pages is not None:
+            between_pages()
+            between_pages = None
+
+
+def test_sorted_paging_is_stable_across_inserts(client, collection_backend):
+    for nombre in ("Bruno", "Carla", "Diego", "Elena", "Fabio"):
+        persona(client, nombre)
+
+    def insert_during_paging():
+        persona(client, "Abel")   # antes del cursor: no se ve en esta recorrida
+        persona(client, "Zoe")    # después: aparece al final
+
+    items = read_all(client, "personas", between_pages=insert_during_paging, sort="nombre", limit=2)
+
+    assert [item["nombre"] for item in items] == ["Bruno", "Carla", "Diego", "Elena", "Fabio", "Zoe"]
+
+
+def test_insertion_order_paging_sees_new_rows_at_the_end(client, collection_backend):
+    ids = [persona(client, f"P{i}")["id"] for i in range(5)]
+
+    items = read_all(client, "personas", between_pages=lambda: ids.append(persona(client, "Nueva")["id"]), limit=2)
+
+    assert [item["id"] for item in items] == ids
+
+
+def test_descending_sort_with_ties(client, collection_backend):
+    created = [gasto(client, d, m) for d, m in [("a", 10), ("b", 30), ("c", 10), ("d", 20), ("e", 30)]]
+
+    items = read_all(client, "gastos", sort="-gasto", limit=2)
+
+    # Mayor a menor; los empates, del más nuevo al más viejo
+    expected = sorted(created, key=lambda item: (item["gasto"], created.index(item)), reverse=True)
+    assert [item["id"] for item in items] == [item["id"] for item in expected]
+    assert [item["gasto"] for item in items] == [30, 30, 20, 10, 10]
+
+
+def test_descending_insertion_order(client, collection_backend):
+    ids = [persona(client, f"P{i}")["id"] for i in range(4)]
+
+    items = read_all(client, "personas", sort="-", limit=3)
+
+    assert [item["id"] for item in items] == ids[::-1]
+
+
+def test_total_count_header(client, collection_backend):
+    for i, monto in enumerate([5, 15, 25, 35]):
+        gasto(client, f"g{i}", monto)
+
+    full = get_page(client, "gastos")
+    assert full.headers["X-Total-Count"] == "4"
+    assert "next_cursor" not in full.get_json()
+
+    page = get_page(client, "gastos", gasto_min=10, limit=2)
+    assert page.headers["X-Total-Count"] == "3"
+    assert len(page.get_json()["items"]) == 2
+    assert page.get_json()["next_cursor"]
+
+    last = get_page(client, "gastos", gasto_min=10, limit=2, cursor=page.get_json()["next_cursor"])
+    assert last.headers["X-Total-Count"] == "3"
+    assert "next_cursor" not in last.get_json()
+    assert "X-Total-Count" in last.headers["Access-Control-Expose-Headers"]
+
+
+@pytest.mark.parametrize("params, message", [
+    ({"limit": "0"}, "limit debe estar entre 1 y"),
+    ({"limit": "abc"}, "limit debe ser un entero"),
+    ({"limit": str(flask_app.COLLECTION_MAX_LIMIT + 1)}, "limit debe estar entre 1 y"),
+    ({"cursor": "no-es-un-cursor"}, "cursor inválido"),
+    ({"sort": "edad"}, "sort debe ser uno de"),
+    ({"gasto_min": "mucho"}, "gasto_min debe ser un número válido"),
+])
+def test_invalid_query_is_400(client, collection_backend, params, message):
+    response = client.get("/api/gastos", query_string=params)
+
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+
+def test_cursor_from_another_sort_is_400(client, collection_backend):
+    for i in range(3):
+        gasto(client, f"g{i}", i)
+    cursor = get_page(client, "gastos", sort="gasto", limit=1).get_json()["next_cursor"]
+
+    response = client.get("/api/gastos", query_string={"sort": "-gasto", "limit": 1, "cursor": cursor})
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "cursor no corresponde al orden solicitado"
+
+
+def test_numeric_filters_skip_text_and_missing_values(client, collection_backend, tmp_path):
+    # Filas viejas con el monto como texto o sin monto (antes de validar tipos)
+    rows = [
+        {"id": "n0000001", "descripcion": "numero", "gasto": 12.0},
+        {"id": "n0000002", "descripcion": "texto", "gasto": "50"},
+        {"id": "n0000003", "descripcion": "sin monto"},
+        {"id": "n0000004", "descripcion": "grande", "gasto": 500.0},
+    ]
+    (tmp_path / "gastos.json").write_text(json.dumps({"items": rows}), encoding="utf-8")
+
+    def descripciones(**params):
+        return [item["descripcion"] for item in get_page(client, "gastos", **params).get_json()["items"]]
+
+    assert descripciones(gasto_min=10) == ["numero", "grande"]
+    assert descripciones(gasto_max=100) == ["numero"]
+    assert descripciones(gasto_min=10, gasto_max=100) == ["numero"]
+    assert get_page(client, "gastos", gasto_max=100).headers["X-Total-Count"] == "1"
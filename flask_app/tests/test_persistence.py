@@ -0,0 +1,170 @@
+import json
+import threading
+
+import pytest
+
+import app as flask_app
+from json_store import (
+    WriteConflict,
+    commit_json_file,
+    dump_json_bytes,
+    file_lock,
+    file_stat_key,
+    load_json_file,
+)
+
+
+def write_raw(path, payload):
+    """Escribe sin pasar por commit_json_file (un archivo que otro dejó dañado)"""
+    with open(path, "wb") as f:
+        f.write(payload)
+
+
+def test_missing_file_is_created_with_defaults(tmp_path):
+    path = tmp_path / "settings.json"
+
+    data, stat_key = load_json_file(path, lambda: {"v": 0})
+
+    assert data == {"v": 0}
+    assert json.loads(path.read_bytes()) == {"v": 0}
+    assert stat_key == file_stat_key(path)
+
+
+def test_corrupt_file_is_restored_from_backup(tmp_path):
+    path = tmp_path / "settings.json"
+    commit_json_file(path, dump_json_bytes({"v": 1}))
+    commit_json_file(path, dump_json_bytes({"v": 2}))
+    write_raw(path, b'{"v": 2, "trunc')
+
+    data, _ = load_json_file(path, lambda: {"v": 0})
+
+    # La copia .bak es la versión anterior a la última escritura buena
+    assert data == {"v": 1}
+    assert json.loads(path.read_bytes()) == {"v": 1}
+    assert json.loads(path.with_name("settings.json.bak").read_bytes()) == {"v": 1}
+
+
+def test_corrupt_file_without_usable_backup_is_moved_aside(tmp_path):
+    path = tmp_path / "settings.json"
+    commit_json_file(path, dump_json_bytes({"v": 1}))
+    commit_json_file(path, dump_json_bytes({"v": 2}))
+    write_raw(path, b"{roto")
+    write_raw(path.with_name("settings.json.bak"), b"{roto tambien")
+
+    data, _ = load_json_file(path, lambda: {"v": 0})
+
+    assert data == {"v": 0}
+    assert json.loads(path.read_bytes()) == {"v": 0}
+    corrupt = list(tmp_path.glob("settings.json.corrupt-*"))
+    assert len(corrupt) == 1
+    assert corrupt[0].read_bytes() == b"{roto"
+
+
+def test_commit_with_stale_stat_key_conflicts(tmp_path):
+    path = tmp_path / "tools.json"
+    stale = commit_json_file(path, dump_json_bytes({"tools": []}))
+    commit_json_file(path, dump_json_bytes({"tools": ["otro worker"]}))
+
+    with pytest.raises(WriteConflict):
+        commit_json_file(path, dump_json_bytes({"tools": ["pisado"]}), expected=stale)
+    assert json.loads(path.read_bytes()) == {"tools": ["otro worker"]}
+
+
+def test_update_retries_after_write_from_other_worker(tmp_path):
+    path = tmp_path / "tools.json"
+    store = flask_app.ConfigStore(path, lambda: {"tools": []})
+    store.snapshot()
+    seen = []
+
+    def add_tool(data):
+        seen.append(list(data["tools"]))
+        if len(seen) == 1:
+            # Otro proceso guarda entre la lectura y el commit de este
+            commit_json_file(path, dump_json_bytes({"tools": ["ajena"]}))
+        data["tools"].append("propia")
+        return len(data["tools"])
+
+    result = store.update(add_tool)
+
+    # El primer intento choca con WriteConflict y se repite sobre lo nuevo
+    assert seen == [[], ["ajena"]]
+    assert result == 2
+    assert json.loads(path.read_bytes()) == {"tools": ["ajena", "propia"]}
+    assert store.snapshot() == {"tools": ["ajena", "propia"]}
+
+
+def test_update_with_stale_if_match_conflicts(tmp_path):
+    path = tmp_path / "tools.json"
+    store = flask_app.ConfigStore(path, lambda: {"tools": []})
+    etag = store.etag
+    store.write({"tools": ["nueva"]})
+
+    with pytest.raises(WriteConflict):
+        store.update(lambda data: data["tools"].clear(), if_match=etag)
+    assert store.snapshot() == {"tools": ["nueva"]}
+
+
+def test_file_lock_is_reentrant_and_excludes_other_threads(tmp_path):
+    path = tmp_path / "tools.json"
+    acquired = threading.Event()
+
+    def other_thread():
+        with file_lock(path):
+            acquired.set()
+
+    with file_lock(path):
+        with file_lock(path):
+            thread = threading.Thread(target=other_thread)
+            thread.start()
+            assert not acquired.wait(0.1)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def test_item_put_with_stale_if_match_is_412(client):
+    created = client.post("/api/personas", json={"nombre": "Ana", "apellido": "Paz", "telefono": "1"})
+    item_id = created.get_json()["created"]["id"]
+    etag = created.headers["ETag"]
+
+    first = client.put(f"/api/personas/{item_id}", json={"nombre": "Bea"}, headers={"If-Match": etag})
+    assert first.status_code == 200
+    stale = client.put(f"/api/personas/{item_id}", json={"nombre": "Caro"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert stale.get_json()["error"]
+    assert client.get(f"/api/personas/{item_id}").get_json()["nombre"] == "Bea"
+
+
+def test_item_delete_with_stale_if_match_is_412(client):
+    created = client.post("/api/gastos", json={"descripcion": "cafe", "gasto": 10})
+    item_id = created.get_json()["created"]["id"]
+
+    response = client.delete(f"/api/gastos/{item_id}", headers={"If-Match": '"no-es-la-etiqueta"'})
+
+    assert response.status_code == 412
+    assert client.get(f"/api/gastos/{item_id}").status_code == 200
+
+
+def test_system_post_with_stale_if_match_is_412(client):
+    form = {"system_prompt": "Uno", "model": "gpt-4o-mini", "temperature": "0.5"}
+    assert client.post("/system", data=form).status_code == 302
+    etag = client.get("/api/settings").headers["ETag"]
+    assert client.post("/system", data=dict(form, system_prompt="Dos"), headers={"If-Match": etag}).status_code == 302
+
+    response = client.post("/system", data=dict(form, system_prompt="Tres"), headers={"If-Match": etag})
+
+    assert response.status_code == 412
+    assert flask_app.settings_store.snapshot()["system_prompt"] == "Dos"
+
+
+def test_backup_lock_and_corrupt_siblings_are_not_served(client):
+    path = flask_app.SETTINGS_PATH
+    flask_app.settings_store.write(flask_app.settings_store.snapshot())
+    with file_lock(path):
+        pass
+    write_raw(path.with_name("settings.json.corrupt-1700000000"), b"{roto")
+    siblings = [path.with_name(path.name + suffix) for suffix in (".bak", ".lock", ".corrupt-1700000000")]
+    assert all(sibling.exists() for sibling in siblings)
+
+    assert client.get("/data/settings.json").status_code == 200
+    for sibling in siblings:
+        assert client.get(f"/data/{sibling.name}").status_code == 404, sibling.name
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import pytest
+
+import app as flask_app
+from bench.stubs import OpenAIStubHandler, start_stub, stub_url
+from test_chat_stream import use_openai
+
+
+@pytest.fixture
+def openai_sessions(monkeypatch):
+    """Stub de OpenAI para /realtime/sessions, en Flask y en el modo ASGI"""
+    server = start_stub(OpenAIStubHandler)
+    url = stub_url(server)
+    use_openai(monkeypatch, url)
+    monkeypatch.setattr(flask_app, "_openai_handle", None)
+    monkeypatch.setattr(flask_app, "REALTIME_SESSIONS_URL", f"{url}/realtime/sessions")
+    try:
+        import asgi
+    except ImportError:
+        pass
+    else:
+        monkeypatch.setattr(asgi, "REALTIME_SESSIONS_URL", f"{url}/realtime/sessions")
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session_pool(monkeypatch, openai_sessions):
+    pool = flask_app.RealtimeSessionPool(2, 20, 300)
+    monkeypatch.setattr(flask_app, "realtime_session_pool", pool)
+    try:
+        import asgi
+    except ImportError:
+        pass
+    else:
+        monkeypatch.setattr(asgi, "realtime_session_pool", pool)
+    yield pool
+    # El hilo de reposición queda esperando sin pedir más sesiones
+    pool.size = 0
+    pool.flush()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+def test_pool_is_disabled_by_default(client, openai_sessions):
+    assert flask_app.REALTIME_SESSION_POOL_SIZE == 0
+    stats = client.get("/api/session/pool").get_json()
+    assert (stats["size"], stats["available"]) == (0, 0)
+    assert flask_app.realtime_session_pool.take() is None
+
+    # Sin pool la sesión se crea en línea
+    response = client.get("/api/session")
+    assert response.status_code == 200
+    assert response.get_json()["client_secret"]["value"] == "ek_bench"
+    assert flask_app.realtime_session_pool.stats()["minted"] == 0
+
+
+def test_pool_refills_and_serves_sessions(client, session_pool):
+    # El primer pedido no encuentra nada y arranca el hilo que repone
+    assert client.get("/api/session").status_code == 200
+    wait_for(lambda: session_pool.stats()["available"] == 2)
+
+    response = client.get("/api/session")
+
+    assert response.status_code == 200
+    assert response.get_json()["id"] == "sess_bench"
+    stats = client.get("/api/session/pool").get_json()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+    wait_for(lambda: session_pool.stats()["minted"] == 3)
+
+
+def test_config_change_discards_pooled_sessions(client, session_pool):
+    session_pool.take()
+    wait_for(lambda: session_pool.stats()["available"] == 2)
+
+    flask_app.settings_store.write(dict(flask_app.settings_store.snapshot(), system_prompt="Otro"))
+    client.get("/api/session")
+
+    # Las dos sesiones eran de la configuración anterior
+    assert session_pool.stats()["discarded"] == 2
+
+
+def test_asgi_session_is_served_from_pool(session_pool):
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("asgiref")
+    import asgi
+
+    session_pool.take()
+    wait_for(lambda: session_pool.stats()["available"] == 2)
+
+    async def get():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.get("/api/session")
+
+    response = asyncio.run(get())
+
+    assert response.status_code == 200
+    assert response.json()["client_secret"]["value"] == "ek_bench"
+    assert session_pool.stats()["hits"] == 1
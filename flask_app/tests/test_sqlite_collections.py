@@ -0,0 +1,169 @@
+import json
+import sqlite3
+
+import pytest
+
+import app as flask_app
+from collection_store import CollectionSchema, Field, SqliteCollectionBackend
+
+
+def gastos_schema(tmp_path):
+    return CollectionSchema(
+        "gastos",
+        fields=[Field("descripcion", required=True, sortable=True), Field("gasto", type="number")],
+        path=tmp_path / "gastos.json",
+        not_found="Gasto no encontrado",
+    )
+
+
+def write_legacy_json(path, items):
+    path.write_text(json.dumps({"items": items}), encoding="utf-8")
+
+
+def stored_version(db_path, name):
+    with sqlite3.connect(str(db_path)) as conn:
+        return conn.execute(
+            "SELECT version FROM collection_versions WHERE collection = ?", (name,)
+        ).fetchone()[0]
+
+
+class Recorder:
+    """Observador que anota lo que recibe"""
+
+    def __init__(self):
+        self.calls = []
+
+    def reset(self, items):
+        self.calls.append(("reset", sorted(item.id for item in items)))
+
+    def apply(self, op, old, new):
+        self.calls.append((op, (new or old).id))
+
+
+def test_round_trip(tmp_path):
+    schema = gastos_schema(tmp_path)
+    db_path = tmp_path / "db" / "collections.sqlite3"
+    backend = SqliteCollectionBackend(schema, db_path)
+
+    cafe = backend.insert(schema.validate({"descripcion": "café ☕", "gasto": 10}))
+    taxi = backend.insert(schema.validate({"descripcion": "taxi", "gasto": 90}))
+    updated = backend.update(cafe.id, {"gasto": 12.5})
+
+    assert db_path.is_file()
+    assert updated.gasto == 12.5
+    assert backend.get(cafe.id).to_dict() == updated.to_dict()
+    assert [item.id for item in backend.list_items()] == [cafe.id, taxi.id]
+    assert [item.id for item in backend.iter_items(chunk_size=1)] == [cafe.id, taxi.id]
+    assert backend.count() == 2
+    assert backend.update("no-existe", {"gasto": 1}) is None
+
+    assert backend.delete(taxi.id) is True
+    assert backend.delete(taxi.id) is False
+    assert backend.get(taxi.id) is None
+
+    # Otra instancia (otro worker) lee lo mismo desde la base
+    reopened = SqliteCollectionBackend(schema, db_path)
+    assert [item.to_dict() for item in reopened.list_items()] == [updated.to_dict()]
+
+
+def test_every_write_bumps_collection_version(tmp_path):
+    schema = gastos_schema(tmp_path)
+    db_path = tmp_path / "collections.sqlite3"
+    backend = SqliteCollectionBackend(schema, db_path)
+    assert stored_version(db_path, "gastos") == 0
+
+    item = backend.insert(schema.validate({"descripcion": "cafe", "gasto": 10}))
+    backend.update(item.id, {"gasto": 11})
+    backend.update("no-existe", {"gasto": 1})
+    backend.delete(item.id)
+
+    # La edición de una fila inexistente no escribe nada
+    assert stored_version(db_path, "gastos") == 3
+
+
+def test_write_from_other_worker_resets_observers(tmp_path):
+    schema = gastos_schema(tmp_path)
+    db_path = tmp_path / "collections.sqlite3"
+    worker = SqliteCollectionBackend(schema, db_path)
+    other = SqliteCollectionBackend(schema, db_path)
+    recorder = worker.subscribe(Recorder())
+
+    own = worker.insert(schema.validate({"descripcion": "cafe", "gasto": 10}))
+    worker.refresh(fresh=True)
+    foreign = other.insert(schema.validate({"descripcion": "taxi", "gasto": 90}))
+    worker.refresh(fresh=True)
+    worker.refresh(fresh=True)
+
+    assert recorder.calls == [
+        ("reset", []),
+        ("insert", own.id),
+        ("reset", sorted([own.id, foreign.id])),
+    ]
+
+
+def test_migration_imports_legacy_json_once(tmp_path):
+    schema = gastos_schema(tmp_path)
+    db_path = tmp_path / "collections.sqlite3"
+    write_legacy_json(schema.path, [
+        {"id": "a0000001", "descripcion": "cafe", "gasto": 10.0},
+        {"id": "a0000002", "descripcion": "taxi", "gasto": 90.0},
+    ])
+
+    backend = SqliteCollectionBackend(schema, db_path, legacy_path=schema.path)
+    assert [item.id for item in backend.list_items()] == ["a0000001", "a0000002"]
+    assert backend.get("a0000002").gasto == 90.0
+
+    # Lo que cambie después en el .json ya no se importa solo...
+    write_legacy_json(schema.path, [{"id": "a0000003", "descripcion": "bus", "gasto": 1.0}])
+    again = SqliteCollectionBackend(schema, db_path, legacy_path=schema.path)
+    assert again.count() == 2
+    assert again.migrate_from_json(schema.path) == 0
+
+    # ...salvo con force, que reemplaza por id
+    assert again.migrate_from_json(schema.path, force=True) == 1
+    assert again.count() == 3
+
+
+def test_migration_without_legacy_file(tmp_path):
+    schema = gastos_schema(tmp_path)
+    backend = SqliteCollectionBackend(schema, tmp_path / "collections.sqlite3", legacy_path=schema.path)
+
+    assert backend.count() == 0
+    assert not schema.path.exists()
+
+
+def test_migrate_collections_command(collection_backend, tmp_path):
+    write_legacy_json(tmp_path / "gastos.json", [{"id": "b0000001", "descripcion": "cafe", "gasto": 10.0}])
+    runner = flask_app.app.test_cli_runner()
+
+    result = runner.invoke(args=["migrate-collections"])
+    assert result.exit_code == 0, result.output
+    db_path = flask_app.COLLECTION_DB_PATH
+    assert f"gastos: 1 filas importadas a {db_path}" in result.output
+    assert f"personas: 0 filas importadas a {db_path}" in result.output
+
+    # Ya migrado: no reimporta salvo con --force
+    assert "gastos: 0 filas" in runner.invoke(args=["migrate-collections"]).output
+    assert "gastos: 1 filas" in runner.invoke(args=["migrate-collections", "--force"]).output
+
+    backend = SqliteCollectionBackend(flask_app.COLLECTIONS["gastos"], db_path)
+    assert [item.descripcion for item in backend.list_items()] == ["cafe"]
+
+
+@pytest.mark.parametrize("collection_backend", ["sqlite"], indirect=True)
+def test_api_round_trip_with_sqlite_backend(client, collection_backend, tmp_path):
+    write_legacy_json(tmp_path / "gastos.json", [{"id": "c0000001", "descripcion": "viejo", "gasto": 5.0}])
+
+    # La primera request importa el .json existente
+    assert [item["id"] for item in client.get("/api/gastos").get_json()["items"]] == ["c0000001"]
+
+    created = client.post("/api/gastos", json={"descripcion": "cafe", "gasto": 10})
+    assert created.status_code == 201
+    item_id = created.get_json()["created"]["id"]
+    assert client.put(f"/api/gastos/{item_id}", json={"gasto": 12}).get_json()["updated"]["gasto"] == 12
+    assert client.get(f"/api/gastos/{item_id}").get_json()["gasto"] == 12
+    assert client.delete(f"/api/gastos/{item_id}").status_code == 200
+    assert client.get(f"/api/gastos/{item_id}").status_code == 404
+
+    assert flask_app.COLLECTION_DB_PATH.is_file()
+    assert client.get(f"/data/{flask_app.COLLECTION_DB_PATH.name}").status_code == 404
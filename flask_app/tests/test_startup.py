@@ -0,0 +1,147 @@
+import sys
+import threading
+
+import pytest
+
+import app as flask_app
+
+SIMPLE_ENV = """\
+# Comentario
+OPENAI_API_KEY=sk-simple
+export MODELO = gpt-4o-mini
+VACIA=
+CON_COMENTARIO=valor   # comentario
+CON_NUMERAL=abc#def
+SIMPLES='con espacios # y numeral'
+DOBLES="otra cosa"  # comentario
+"""
+
+
+@pytest.mark.parametrize("content", [
+    SIMPLE_ENV,
+    "URL=${BASE}/api\n",
+    'MULTI="linea 1\nlinea 2"\n',
+    'ESCAPE="a\\nb"\n',
+    "sin signo igual\n",
+])
+def test_parse_env_file_matches_dotenv_or_defers_to_it(tmp_path, content):
+    dotenv = pytest.importorskip("dotenv")
+    path = tmp_path / ".env"
+    path.write_text(content, encoding="utf-8")
+
+    values = flask_app.parse_env_file(path)
+
+    if content == SIMPLE_ENV:
+        assert values == dotenv.dotenv_values(path, interpolate=False)
+        assert values["OPENAI_API_KEY"] == "sk-simple"
+    else:
+        assert values is None
+
+
+def test_simple_env_file_is_loaded_without_dotenv(tmp_path, monkeypatch):
+    path = tmp_path / ".env"
+    path.write_text("FLASK_APP_TEST_VAR=desde-env\nFLASK_APP_TEST_KEEP=nuevo\n", encoding="utf-8")
+    monkeypatch.setenv("FLASK_APP_TEST_KEEP", "existente")
+    monkeypatch.delenv("FLASK_APP_TEST_VAR", raising=False)
+    # Con None en sys.modules cualquier import de dotenv falla
+    monkeypatch.setitem(sys.modules, "dotenv", None)
+
+    flask_app.load_env_file(path)
+    assert flask_app.os.environ["FLASK_APP_TEST_VAR"] == "desde-env"
+    assert flask_app.os.environ["FLASK_APP_TEST_KEEP"] == "existente"
+
+    flask_app.load_env_file(path, override=True)
+    assert flask_app.os.environ["FLASK_APP_TEST_KEEP"] == "nuevo"
+    monkeypatch.delenv("FLASK_APP_TEST_VAR")
+
+
+def test_complex_env_file_uses_dotenv(tmp_path, monkeypatch):
+    pytest.importorskip("dotenv")
+    path = tmp_path / ".env"
+    path.write_text("FLASK_APP_TEST_BASE=http://x\nFLASK_APP_TEST_URL=${FLASK_APP_TEST_BASE}/api\n", encoding="utf-8")
+    monkeypatch.delenv("FLASK_APP_TEST_BASE", raising=False)
+    monkeypatch.delenv("FLASK_APP_TEST_URL", raising=False)
+
+    flask_app.load_env_file(path)
+
+    assert flask_app.os.environ["FLASK_APP_TEST_URL"] == "http://x/api"
+    monkeypatch.delenv("FLASK_APP_TEST_BASE")
+    monkeypatch.delenv("FLASK_APP_TEST_URL")
+
+
+def test_warmup_runs_every_step_and_records_failures():
+    ran = []
+
+    def failing():
+        ran.append("falla")
+        raise RuntimeError("sin red")
+
+    warmup = flask_app.StartupWarmup([
+        ("uno", lambda: ran.append("uno")),
+        ("falla", failing),
+        ("dos", lambda: ran.append("dos")),
+    ])
+    warmup.start()
+    assert warmup.done.wait(5)
+    # Un segundo start() en el mismo proceso no vuelve a correrlo
+    warmup.start()
+
+    status = warmup.status()
+    assert ran == ["uno", "falla", "dos"]
+    assert status["ready"] is True
+    assert set(status["steps_ms"]) == {"uno", "falla", "dos"}
+    assert status["errors"] == {"falla": "sin red"}
+
+
+def test_warmup_restarts_in_a_forked_worker(monkeypatch):
+    runs = []
+    warmup = flask_app.StartupWarmup([("paso", lambda: runs.append(1))])
+    warmup.start()
+    assert warmup.done.wait(5)
+
+    # Como un worker de gunicorn --preload: otro pid, mismo objeto
+    monkeypatch.setattr(flask_app.os, "getpid", lambda: -1)
+    warmup.start()
+    assert warmup.done.wait(5)
+
+    assert runs == [1, 1]
+
+
+def test_health_ready_is_503_until_warmup_finishes(client, monkeypatch):
+    release = threading.Event()
+    warmup = flask_app.StartupWarmup([("lento", lambda: release.wait(5))])
+    monkeypatch.setattr(flask_app, "STARTUP_WARMUP", True)
+    monkeypatch.setattr(flask_app, "startup_warmup", warmup)
+
+    cold = client.get("/health/ready")
+    assert cold.status_code == 503
+    assert cold.get_json()["ready"] is False
+
+    release.set()
+    assert warmup.done.wait(5)
+    warm = client.get("/health/ready")
+    assert warm.status_code == 200
+    data = warm.get_json()
+    assert data["ready"] is True
+    assert "lento" in data["steps_ms"]
+    assert "imports_ms" in data["startup"]
+
+
+def test_health_ready_without_warmup(client, monkeypatch):
+    monkeypatch.setattr(flask_app, "STARTUP_WARMUP", False)
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 200
+    assert response.get_json()["ready"] is True
+
+
+def test_default_warmup_steps_succeed(monkeypatch):
+    monkeypatch.setattr(flask_app, "PAGE_CACHE_WARM", False)
+    warmup = flask_app.StartupWarmup(flask_app.startup_warmup.steps)
+
+    warmup.start()
+    assert warmup.done.wait(30)
+
+    assert [name for name, _ in warmup.steps] == ["config", "tools", "pages", "openai", "tokens"]
+    assert warmup.status()["errors"] == {}
@@ -0,0 +1,113 @@
+import os
+import re
+from collections import OrderedDict
+
+import jinja2
+import pytest
+
+import app as flask_app
+
+
+def test_static_directory_is_not_found(client):
+    assert client.get("/static/js").status_code == 404
+    assert client.get("/static/js/").status_code == 404
+
+
+def test_static_file_has_fingerprint_etag(client):
+    response = client.get("/static/js/spa.js")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+
+
+@pytest.fixture
+def page_dirs(monkeypatch, tmp_path):
+    """Plantillas y estáticos en tmp_path, con auto_reload y sin esperar entre revisiones"""
+    templates = tmp_path / "templates"
+    static = tmp_path / "static"
+    templates.mkdir()
+    static.mkdir()
+    (templates / "base.html").write_text("<main>{% block body %}{% endblock %}</main>", encoding="utf-8")
+    (templates / "page.html").write_text(
+        '{% extends "base.html" %}{% block body %}'
+        "<script src=\"{{ url_for('static', filename='app.js') }}\"></script>"
+        "{{ server_url }}{% endblock %}",
+        encoding="utf-8",
+    )
+    (static / "app.js").write_text("console.log(1)", encoding="utf-8")
+
+    env = flask_app.app.jinja_env
+    monkeypatch.setattr(env, "loader", jinja2.FileSystemLoader(str(templates)))
+    monkeypatch.setattr(env, "auto_reload", True)
+    monkeypatch.setattr(flask_app, "STATIC_DIR", static)
+    monkeypatch.setattr(flask_app, "PAGE_RECHECK_SECONDS", 0)
+    monkeypatch.setattr(flask_app, "_rendered_pages", OrderedDict())
+    return templates, static
+
+
+def render(server_url="http://test"):
+    with flask_app.app.test_request_context("/"):
+        return flask_app.render_page("page.html", server_url=server_url)
+
+
+def touch(path, text):
+    """Reescribe el archivo con un mtime distinto aunque el sistema de archivos sea de baja resolución"""
+    path.write_text(text, encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+
+
+def script_version(page):
+    return re.search(r"app\.js\?v=(\w+)", page.body.decode("utf-8")).group(1)
+
+
+def test_rendered_page_is_reused_while_nothing_changes(page_dirs):
+    first = render()
+
+    assert render() is first
+    assert script_version(first) == flask_app.static_fingerprint("app.js")
+
+
+def test_config_change_renders_again(page_dirs):
+    first = render()
+    assert render(server_url="http://otro") is not first
+
+    flask_app.settings_store.write(dict(flask_app.settings_store.snapshot(), system_prompt="Otro prompt"))
+    second = render()
+    assert second is not first
+    assert render() is second
+
+    flask_app.tools_store.write(flask_app.tools_store.snapshot())
+    assert render() is not second
+
+
+def test_template_change_renders_again(page_dirs):
+    templates, _ = page_dirs
+    first = render()
+
+    # Cambia la plantilla que page.html extiende
+    touch(templates / "base.html", "<article>{% block body %}{% endblock %}</article>")
+    page = render()
+
+    assert page is not first
+    assert page.body.decode("utf-8").startswith("<article>")
+    assert page.etag != first.etag
+
+
+def test_static_change_updates_fingerprint(page_dirs, client):
+    _, static = page_dirs
+    first = render()
+    old_version = script_version(first)
+    assert client.get(f"/static/app.js?v={old_version}").headers["Cache-Control"] == flask_app.STATIC_IMMUTABLE
+
+    touch(static / "app.js", "console.log(2)")
+    page = render()
+    new_version = script_version(page)
+
+    assert page is not first
+    assert new_version != old_version
+    assert new_version == flask_app.static_fingerprint("app.js")
+    # La URL vieja ya no se cachea como inmutable
+    assert client.get(f"/static/app.js?v={old_version}").headers["Cache-Control"] != flask_app.STATIC_IMMUTABLE
+    fresh = client.get(f"/static/app.js?v={new_version}")
+    assert fresh.headers["Cache-Control"] == flask_app.STATIC_IMMUTABLE
+    assert fresh.get_data(as_text=True) == "console.log(2)"
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+def post_batch(client, calls, **extra):
+    return client.post("/api/execute_tools", json=dict({"calls": calls}, **extra))
+
+
+def call(call_id, tool_name, **arguments):
+    return {"call_id": call_id, "tool_name": tool_name, "arguments": arguments}
+
+
+BATCH = [
+    call("c1", "fast", q="uno"),
+    call("c2", "fail"),
+    call("c3", "no_existe"),
+    call("c4", "fast", q="dos"),
+    {"call_id": "c5", "arguments": {}},
+]
+
+
+def check_batch_results(results):
+    assert [r["call_id"] for r in results] == ["c1", "c2", "c3", "c4", "c5"]
+    assert [r["status"] for r in results] == [200, 200, 404, 200, 400]
+    fast_one, fail, unknown, fast_two, missing = results
+    assert fast_one["result"]["echo"] == {"q": "uno"}
+    assert fast_two["result"]["echo"] == {"q": "dos"}
+    # Un 500 del backend no corta el lote: llega como resultado de esa llamada
+    assert fail["success"] is True and fail["status_code"] == 500
+    assert "no_existe" in unknown["error"]
+    assert missing["error"] == "tool_name is required"
+    assert all("elapsed_ms" in r for r in results)
+
+
+def test_results_keep_order_and_per_call_errors(client, tool_backend):
+    response = post_batch(client, BATCH)
+
+    assert response.status_code == 200
+    check_batch_results(response.get_json()["results"])
+
+
+def test_calls_run_in_parallel(client, tool_backend):
+    started = time.perf_counter()
+    response = post_batch(client, [call(f"s{i}", "slow", q=str(i)) for i in range(3)])
+
+    assert [r["status"] for r in response.get_json()["results"]] == [200, 200, 200]
+    assert time.perf_counter() - started < 2.5
+
+
+def test_deadline_reports_504_for_unfinished_calls(client, tool_backend):
+    started = time.perf_counter()
+    response = post_batch(client, [call("rapida", "fast"), call("lenta", "slow")], deadline_ms=300)
+
+    assert response.status_code == 200
+    fast, slow = response.get_json()["results"]
+    assert fast["status"] == 200 and fast["success"] is True
+    assert slow["status"] == 504 and slow["success"] is False
+    assert slow["error"] == "Deadline exceeded (0.3s)"
+    assert time.perf_counter() - started < 0.9
+
+
+@pytest.mark.parametrize("body, message", [
+    ({}, "calls must be a non-empty list"),
+    ({"calls": []}, "calls must be a non-empty list"),
+    ({"calls": ["fast"]}, "each call must be an object with tool_name and arguments"),
+    ({"calls": [call("c1", "fast")], "deadline_ms": "pronto"}, "deadline_ms must be a number"),
+    ({"calls": [call("c1", "fast")], "deadline_ms": 0}, "deadline_ms must be positive"),
+])
+def test_invalid_batch_is_400(client, body, message):
+    response = client.post("/api/execute_tools", json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()["error"] == message
+
+
+def test_too_many_calls_is_400(client, monkeypatch):
+    import app as flask_app
+
+    monkeypatch.setattr(flask_app, "TOOL_BATCH_MAX_CALLS", 2)
+    response = post_batch(client, [call(str(i), "fast") for i in range(3)])
+
+    assert response.status_code == 400
+    assert "max 2" in response.get_json()["error"]
+
+
+def post_asgi_batch(body):
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("asgiref")
+    import asgi
+
+    async def post():
+        # Cliente httpx propio de este loop (el del worker queda atado al loop que lo creó)
+        asgi._http_client = None
+        transport = httpx.ASGITransport(app=asgi.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await http.post("/api/execute_tools", json=body)
+        finally:
+            await asgi.get_http_client().aclose()
+            asgi._http_client = None
+
+    return asyncio.run(post())
+
+
+def test_asgi_results_keep_order_and_per_call_errors(tool_backend):
+    response = post_asgi_batch({"calls": BATCH})
+
+    assert response.status_code == 200
+    check_batch_results(response.json()["results"])
+
+
+def test_asgi_deadline_reports_504(tool_backend):
+    response = post_asgi_batch({"calls": [call("rapida", "fast"), call("lenta", "slow")], "deadline_ms": 300})
+
+    assert [r["status"] for r in response.json()["results"]] == [200, 504]
+
+
+def test_asgi_resolves_tools_outside_the_event_loop(tool_backend, monkeypatch):
+    pytest.importorskip("asgiref")
+    import asgi
+
+    threads = []
+    prepare = asgi.prepare_tool_call
+
+    def recording_prepare(tool_name, arguments):
+        threads.append(threading.current_thread())
+        return prepare(tool_name, arguments)
+
+    monkeypatch.setattr(asgi, "prepare_tool_call", recording_prepare)
+    response = post_asgi_batch({"calls": [call("c1", "fast"), call("c2", "no_existe")]})
+
+    assert [r["status"] for r in response.json()["results"]] == [200, 404]
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+import app as flask_app
+from app import ToolResponseCache
+from conftest import stub_tool
+
+
+def backend_payload(n, status_code=200):
+    return {"success": True, "status_code": status_code, "result": {"n": n}}
+
+
+def key(tool="clima", q="x"):
+    return (tool, 1, f'{{"q":"{q}"}}')
+
+
+def test_entry_expires_after_ttl():
+    cache = ToolResponseCache(10, 1 << 20)
+    cache.store(key(), backend_payload(1), ttl=0.05)
+
+    assert cache.lookup(key()) == backend_payload(1)
+    time.sleep(0.06)
+    assert cache.lookup(key()) is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_only_successful_responses_are_stored():
+    cache = ToolResponseCache(10, 1 << 20)
+    cache.store(key(), backend_payload(1, status_code=500), ttl=60)
+
+    assert cache.lookup(key()) is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ToolResponseCache(2, 1 << 20)
+    cache.store(key(q="a"), backend_payload(1), ttl=60)
+    cache.store(key(q="b"), backend_payload(2), ttl=60)
+    cache.lookup(key(q="a"))
+    cache.store(key(q="c"), backend_payload(3), ttl=60)
+
+    assert cache.lookup(key(q="b")) is None
+    assert cache.lookup(key(q="a")) is not None
+    assert cache.lookup(key(q="c")) is not None
+    assert cache.evictions == 1
+
+
+def test_lru_respects_byte_budget():
+    size = len(json.dumps(backend_payload(1), ensure_ascii=False))
+    cache = ToolResponseCache(100, size * 2)
+    for q in "abc":
+        cache.store(key(q=q), backend_payload(1), ttl=60)
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= size * 2
+    assert cache.lookup(key(q="a")) is None
+
+
+def test_concurrent_misses_share_one_load():
+    cache = ToolResponseCache(10, 1 << 20)
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return backend_payload(len(calls))
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_load(key(), 60, load)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while cache.coalesced + len(calls) < 5:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [backend_payload(1)] * 5
+    assert cache.coalesced == 4
+
+
+@pytest.mark.parametrize("invalidate", [
+    lambda cache: cache.invalidate("clima"),
+    lambda cache: cache.clear(),
+])
+def test_load_in_flight_during_invalidation_is_not_stored(invalidate):
+    cache = ToolResponseCache(10, 1 << 20)
+    started, release = threading.Event(), threading.Event()
+
+    def load():
+        started.set()
+        release.wait(5)
+        return backend_payload(1)
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_load(key(), 60, load)))
+    leader.start()
+    assert started.wait(5)
+    invalidate(cache)
+    release.set()
+    leader.join(5)
+
+    # La request en vuelo recibe su respuesta, pero no queda en caché
+    assert results == [backend_payload(1)]
+    assert cache.lookup(key()) is None
+
+
+@pytest.fixture
+def cached_tools(tool_backend):
+    """fast y slow con caché; devuelve una función para reescribir tools.json"""
+    def configure(**endpoints):
+        tools = [stub_tool(name, f"{tool_backend}/{path}", cache=60) for name, path in endpoints.items()]
+        flask_app.tools_store.write({"tools": tools})
+        flask_app.tool_response_cache.clear()
+
+    configure(fast="fast", slow="slow")
+    return configure
+
+
+def execute(client, tool_name, q="x"):
+    response = client.post("/api/execute_tool", json={"tool_name": tool_name, "arguments": {"q": q}})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_repeated_call_is_served_from_cache(client, cached_tools):
+    hits = flask_app.tool_response_cache.hits
+
+    assert execute(client, "fast") == execute(client, "fast")
+    assert flask_app.tool_response_cache.hits == hits + 1
+
+
+def test_editing_a_tool_changes_only_its_cache_key(client, cached_tools):
+    before = flask_app.get_tool_registry().by_name
+    execute(client, "fast")
+
+    # slow pasa a apuntar a /fail; fast no cambia
+    cached_tools(fast="fast", slow="fail")
+    after = flask_app.get_tool_registry().by_name
+
+    assert after["fast"] is before["fast"]
+    assert after["slow"].revision != before["slow"].revision
+    assert flask_app.tool_cache_key(after["slow"], {}) != flask_app.tool_cache_key(before["slow"], {})
+    assert execute(client, "slow")["status_code"] == 500
+
+
+def test_asgi_concurrent_misses_share_one_load(cached_tools):
+    httpx = pytest.importorskip("httpx")
+    pytest.importorskip("asgiref")
+    import asgi
+
+    cache = flask_app.tool_response_cache
+    coalesced, misses = cache.coalesced, cache.misses
+
+    async def scenario():
+        asgi._http_client = None
+        transport = httpx.ASGITransport(app=asgi.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                body = {"tool_name": "slow", "arguments": {"q": "asgi"}}
+                return await asyncio.gather(*[http.post("/api/execute_tool", json=body) for _ in range(3)])
+        finally:
+            await asgi.get_http_client().aclose()
+            asgi._http_client = None
+
+    responses = asyncio.run(scenario())
+
+    assert [r.json()["result"]["echo"] for r in responses] == [{"q": "asgi"}] * 3
+    assert cache.misses - misses == 3
+    assert cache.coalesced - coalesced == 2
+    assert cache.lookup(flask_app.tool_cache_key(flask_app.get_tool_registry().by_name["slow"], {"q": "asgi"}))